@@ -0,0 +1,223 @@
+"""
+Online outbreak detectors over daily facility reports.
+
+Every facility and every LGA keeps, per signal, an EWMA baseline (mean and
+variance) and a one-sided CUSUM of standardised excesses over it. Each
+incoming DailyReport updates its facility's and its LGA's state in O(1)
+and raises an Alert as soon as the CUSUM crosses DETECTOR_THRESHOLD, so
+unusual days surface within the week rather than at the weekly score.
+
+A day's value stays pending until a later day is reported. Same-day edits
+(and, for an LGA, further facilities reporting that day) replace or add to
+the pending value, and the alarm is tested against it provisionally. The
+pending day is folded into the baseline when the next day arrives.
+Reports older than the pending day are backfill and are not replayed.
+Days without a report are treated as missing, not as zero.
+
+State is one detector_states row per facility or LGA holding a small JSON
+list per signal, so restarts pick up where they left off.
+scripts/rebuild_detectors.py seeds the states from stored reports.
+"""
+import math
+import os
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .. import locations, models
+from ..metrics import instrument
+
+SIGNALS = ["fever_cases", "diarrhea_cases", "severe_dehydration_cases", "unexplained_deaths"]
+# EWMA smoothing of the baseline; 0.1 ~ a 10-day memory
+DETECTOR_ALPHA = float(os.getenv("PHIP_DETECTOR_ALPHA", "0.1"))
+# CUSUM slack and decision threshold, in baseline standard deviations
+DETECTOR_SLACK = float(os.getenv("PHIP_DETECTOR_SLACK", "0.5"))
+DETECTOR_THRESHOLD = float(os.getenv("PHIP_DETECTOR_THRESHOLD", "4.0"))
+# Days of baseline before a detector may alarm
+WARMUP_DAYS = int(os.getenv("PHIP_DETECTOR_WARMUP_DAYS", "14"))
+ALERT_LEVEL = "Signal"
+
+class Detector:
+    """
+    EWMA baseline + one-sided CUSUM for one signal of one facility or LGA.
+    """
+    __slots__ = ("n", "mean", "var", "cusum", "pending_date", "pending", "alerted_on")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, var: float = 0.0, cusum: float = 0.0,
+                 pending_date: Optional[date] = None, pending: float = 0.0, alerted_on: Optional[date] = None):
+        self.n = n
+        self.mean = mean
+        self.var = var
+        self.cusum = cusum
+        self.pending_date = pending_date
+        self.pending = pending
+        self.alerted_on = alerted_on
+
+    @classmethod
+    def from_list(cls, values: List[Any]) -> "Detector":
+        n, mean, var, cusum, pending_day, pending, alerted_day = values
+        return cls(n, mean, var, cusum,
+                   date.fromordinal(pending_day) if pending_day else None, pending,
+                   date.fromordinal(alerted_day) if alerted_day else None)
+
+    def to_list(self) -> List[Any]:
+        return [
+            self.n, self.mean, self.var, self.cusum,
+            self.pending_date.toordinal() if self.pending_date else 0, self.pending,
+            self.alerted_on.toordinal() if self.alerted_on else 0,
+        ]
+
+    def _sd(self) -> float:
+        # Counts are at least Poisson-noisy; the floor stops a flat history from alarming on +1
+        return max(math.sqrt(self.var), math.sqrt(max(self.mean, 0.0)), 1.0)
+
+    def _step(self, value: float) -> Tuple[float, float]:
+        """
+        (z, cusum) after adding value to the current CUSUM, without storing it.
+        """
+        z = (value - self.mean) / self._sd()
+        return z, max(0.0, self.cusum + z - DETECTOR_SLACK)
+
+    def _commit(self, value: float):
+        if self.n == 0:
+            self.mean, self.var = value, 0.0
+        else:
+            _, cusum = self._step(value)
+            # Restart the CUSUM after a crossing so one outbreak doesn't alarm forever
+            self.cusum = 0.0 if cusum > DETECTOR_THRESHOLD else cusum
+            diff = value - self.mean
+            self.mean += DETECTOR_ALPHA * diff
+            self.var = (1 - DETECTOR_ALPHA) * (self.var + DETECTOR_ALPHA * diff * diff)
+        self.n += 1
+
+    def observe(self, day: date, delta: float) -> Optional[Tuple[float, float]]:
+        """
+        Adds delta to the value of `day`. Returns (z, cusum) when the day's
+        value takes the CUSUM over the threshold for the first time, else None.
+        """
+        if self.pending_date is not None and day < self.pending_date:
+            return None
+        if self.pending_date is not None and day > self.pending_date:
+            self._commit(self.pending)
+            self.pending = 0.0
+        self.pending_date = day
+        self.pending += delta
+        if self.n < WARMUP_DAYS or self.alerted_on == day:
+            return None
+        z, cusum = self._step(self.pending)
+        if cusum <= DETECTOR_THRESHOLD:
+            return None
+        self.alerted_on = day
+        return z, cusum
+
+def _value(report: models.DailyReport, signal: str) -> float:
+    return float(getattr(report, signal) or 0)
+
+def _load_states(db: Session, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], models.DetectorState]:
+    S = models.DetectorState
+    rows = (
+        db.query(S)
+        .filter(S.scope.in_({k[0] for k in keys}), S.key.in_({k[1] for k in keys}))
+        .with_for_update()
+        .all()
+    )
+    found = {(r.scope, r.key): r for r in rows}
+    for scope, key in keys:
+        if (scope, key) not in found:
+            found[(scope, key)] = S(scope=scope, key=key, state={})
+            db.add(found[(scope, key)])
+    return found
+
+def _signal_alert(db: Session, location_id: int, day: date, signal: str, where: str, z: float, cusum: float):
+    label = signal.replace("_cases", "").replace("_", " ")
+    db.add(models.Alert(
+        location_id=location_id,
+        created_at_week=day,
+        disease=signal.replace("_cases", ""),
+        level=ALERT_LEVEL,
+        message=f"Unusual {label} count at {where} on {day} ({z:+.1f} SD above baseline, CUSUM {cusum:.1f})",
+        risk_score=None,
+    ))
+
+@instrument("observe_report")
+def observe_report(db: Session, facility: models.Facility, report: models.DailyReport,
+                   previous: Optional[Dict[str, float]] = None) -> int:
+    """
+    Feeds one committed report to its facility and LGA detectors and adds an
+    Alert per signal that crosses the threshold. `previous` holds the
+    report's counts before an edit, so the LGA total changes by the
+    difference. Returns the number of alerts raised.
+    """
+    for _ in range(2):
+        raised = _observe(db, facility, report, previous)
+        try:
+            db.commit()
+            return raised
+        except IntegrityError:
+            # Another worker created one of the state rows first. It exists
+            # now, so the retry loads and locks it instead of inserting.
+            db.rollback()
+    print(f"Detector update for report {report.id} skipped after repeated state conflicts")
+    return 0
+
+def _observe(db: Session, facility: models.Facility, report: models.DailyReport,
+             previous: Optional[Dict[str, float]]) -> int:
+    lga_key = f"{facility.state}|{facility.lga}"
+    states = _load_states(db, [("facility", facility.id), ("lga", lga_key)])
+    location_id = None
+    raised = 0
+    for scope, where in (("facility", facility.name), ("lga", f"{facility.lga} LGA")):
+        row = states[(scope, facility.id if scope == "facility" else lga_key)]
+        state = dict(row.state or {})
+        for signal in SIGNALS:
+            detector = Detector.from_list(state[signal]) if signal in state else Detector()
+            value = _value(report, signal)
+            if scope == "facility":
+                # A facility's day is its single report, so an edit replaces it
+                delta = value - detector.pending if detector.pending_date == report.report_date else value
+            else:
+                delta = value - (previous or {}).get(signal, 0.0)
+            hit = detector.observe(report.report_date, delta)
+            state[signal] = detector.to_list()
+            if hit:
+                if location_id is None:
+                    location_id = _location_id(db, facility)
+                if location_id is not None:
+                    _signal_alert(db, location_id, report.report_date, signal, where, *hit)
+                    raised += 1
+        # Reassigned so the JSON column is marked dirty
+        row.state = state
+    return raised
+
+def _location_id(db: Session, facility: models.Facility) -> Optional[int]:
+    return locations.lookup(db, facility.state, facility.lga)
+
+def report_counts(report: models.DailyReport) -> Dict[str, float]:
+    """
+    Snapshot of a report's signal counts, taken before it is edited.
+    """
+    return {signal: _value(report, signal) for signal in SIGNALS}
+
+def rebuild_states(db: Session, reports: Iterable[Tuple[models.Facility, models.DailyReport]]) -> Dict[str, int]:
+    """
+    Replays (facility, report) pairs in report_date order into fresh states.
+    Alerts are not raised for the replayed days.
+    """
+    db.query(models.DetectorState).delete(synchronize_session=False)
+    states: Dict[Tuple[str, str], Dict[str, Detector]] = {}
+    count = 0
+    for facility, report in reports:
+        for scope, key in (("facility", facility.id), ("lga", f"{facility.state}|{facility.lga}")):
+            detectors = states.setdefault((scope, key), {s: Detector() for s in SIGNALS})
+            for signal in SIGNALS:
+                d = detectors[signal]
+                d.observe(report.report_date, _value(report, signal))
+                # Past crossings are history; don't suppress a fresh alert on the same day
+                d.alerted_on = None
+        count += 1
+    db.add_all(
+        models.DetectorState(scope=scope, key=key, state={s: d.to_list() for s, d in detectors.items()})
+        for (scope, key), detectors in states.items()
+    )
+    db.commit()
+    return {"reports": count, "states": len(states)}
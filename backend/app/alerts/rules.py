@@ -1,7 +1,9 @@
 from sqlalchemy.orm import Session
 from datetime import date
 from .. import models
+from ..metrics import instrument
 
+@instrument("evaluate_alerts")
 def evaluate_alerts(db: Session, location_id: int, disease: str, base_week: date, risk_score: float):
     if risk_score > 0.7:
         level = "High"
@@ -26,16 +28,21 @@ def evaluate_alerts(db: Session, location_id: int, disease: str, base_week: date
         .limit(2)
         .all()
     )
-    comms = (
-        db.query(models.CommunitySignal)
-        .filter(models.CommunitySignal.location_id == location_id)
-        .order_by(models.CommunitySignal.week_start.desc())
-        .limit(2)
-        .all()
-    )
+    # Community fever signals now come from the facility weekly aggregates
+    loc = db.query(models.Location).filter(models.Location.id == location_id).first()
+    comms = []
+    if loc:
+        comms = (
+            db.query(models.LGAWeeklyAggregate)
+            .filter(models.LGAWeeklyAggregate.state == loc.state)
+            .filter(models.LGAWeeklyAggregate.lga == loc.lga)
+            .order_by(models.LGAWeeklyAggregate.week_start_date.desc())
+            .limit(2)
+            .all()
+        )
     if len(envs) == 2 and len(comms) == 2:
         rainfall_spike = (envs[0].rainfall_mm or 0) > (envs[1].rainfall_mm or 0) * 1.3
-        fever_spike = (comms[0].fever_reports or 0) > (comms[1].fever_reports or 0) * 1.5
+        fever_spike = (comms[0].total_fever_cases or 0) > (comms[1].total_fever_cases or 0) * 1.5
         if rainfall_spike and fever_spike:
             alert = models.Alert(
                 location_id=location_id,
@@ -1,7 +1,9 @@
+import itertools
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
+from .cache import TTLCache
 
 load_dotenv()
 
@@ -11,23 +13,30 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "phip")
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+def _normalize_url(url: str) -> str:
+    url = url.strip()
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+psycopg2://", 1)
+    elif url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg2://", 1)
+    return url
+
+def _create_engine(url: str):
+    connect_args = {}
+    if "sqlite" in url:
+        connect_args = {"check_same_thread": False}
+    return create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+
 if DATABASE_URL:
-    DATABASE_URL = DATABASE_URL.strip()
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
-    elif DATABASE_URL.startswith("postgresql://"):
-        DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
+    DATABASE_URL = _normalize_url(DATABASE_URL)
 if not DATABASE_URL:
     DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     # Fallback to SQLite for local dev if Postgres is unavailable
     if DB_HOST == "localhost":
         DATABASE_URL = os.getenv("SQLITE_URL", "sqlite:///./phip.db")
 
-connect_args = {}
-if "sqlite" in DATABASE_URL:
-    connect_args = {"check_same_thread": False}
-
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, connect_args=connect_args)
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -37,3 +46,107 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- Read replicas ---
+# Comma-separated; dashboard reads (map, feedback, trends, exports) are spread
+# over them round-robin. Without any, reads use the primary as before.
+REPLICA_URLS = [_normalize_url(u) for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# How far replicas may trail the primary. For this long after a write, reads
+# about the written LGA (or the map) go to the primary so the writer sees it.
+REPLICA_LAG_SECONDS = float(os.getenv("PHIP_REPLICA_LAG_SECONDS", "10"))
+# Where the write markers are shared between workers (needs the redis
+# package). Without it they are per-worker, and a read served by another
+# worker than the write can still hit a lagging replica; that only holds
+# read-your-writes with a single worker.
+REPLICA_GUARD_REDIS_URL = os.getenv("PHIP_REPLICA_GUARD_REDIS_URL", os.getenv("PHIP_RATE_LIMIT_REDIS_URL"))
+
+class ReadOnlySession(Session):
+    pass
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_flush(session, flush_context, instances):
+    raise RuntimeError("Replica sessions are read-only; use get_db for writes")
+
+replica_engines = [_create_engine(url) for url in REPLICA_URLS]
+_replica_sessions = [
+    sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False, bind=e) for e in replica_engines
+]
+_next_replica = itertools.count()
+# Keys written in this worker within REPLICA_LAG_SECONDS
+_recent_writes = TTLCache(ttl_seconds=REPLICA_LAG_SECONDS, max_entries=50_000)
+
+class RedisWriteMarkers:
+    """
+    Write markers in Redis, expiring after REPLICA_LAG_SECONDS, so a write
+    in one worker keeps the guarded reads of every worker on the primary.
+    Fails safe: if Redis is unreachable, guarded reads use the primary.
+    """
+    def __init__(self, url: str, ttl_seconds: float):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PHIP_REPLICA_GUARD_REDIS_URL requires the redis package to be installed")
+        self.ttl_ms = max(1, int(ttl_seconds * 1000))
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+
+    @staticmethod
+    def _name(key: tuple) -> str:
+        return "phip:written:" + "|".join(str(k) for k in key)
+
+    def set(self, key: tuple):
+        try:
+            self._client.set(self._name(key), 1, px=self.ttl_ms)
+        except Exception as e:
+            print(f"Replica guard backend unavailable, write marker not shared: {e}")
+
+    def any(self, keys) -> bool:
+        try:
+            return self._client.exists(*[self._name(k) for k in keys]) > 0
+        except Exception as e:
+            print(f"Replica guard backend unavailable, reading from the primary: {e}")
+            return True
+
+_shared_writes = (
+    RedisWriteMarkers(REPLICA_GUARD_REDIS_URL, REPLICA_LAG_SECONDS)
+    if _replica_sessions and REPLICA_GUARD_REDIS_URL else None
+)
+
+def ReadSessionLocal() -> Session:
+    """
+    Session on the next replica, or on the primary when none is configured.
+    """
+    if not _replica_sessions:
+        return SessionLocal()
+    return _replica_sessions[next(_next_replica) % len(_replica_sessions)]()
+
+def mark_written(key: tuple):
+    """
+    Records a write to key, e.g. ("lga", state, lga) or ("map",), so
+    guarded reads of it stay on the primary while replicas catch up.
+    """
+    if _replica_sessions:
+        _recent_writes.set(key, True)
+        if _shared_writes is not None:
+            _shared_writes.set(key)
+
+def recently_written(*keys: tuple) -> bool:
+    if not _replica_sessions or not keys:
+        return False
+    if any(_recent_writes.get(k) for k in keys):
+        return True
+    return _shared_writes is not None and _shared_writes.any(keys)
+
+def read_db(*guard_keys: tuple):
+    """
+    Dependency factory for read-only endpoints: a replica session, or the
+    primary while any of guard_keys was written within REPLICA_LAG_SECONDS.
+    """
+    def dependency():
+        db = SessionLocal() if recently_written(*guard_keys) else ReadSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    return dependency
+
+get_read_db = read_db()
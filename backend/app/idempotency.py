@@ -0,0 +1,130 @@
+"""
+Dedupe of inbound webhook messages by provider message id.
+
+Twilio retries a webhook when the response is slow, with the same
+MessageSid. begin() claims the id before any other DB work. A retry gets
+the first delivery's response back and skips the facility lookup, the
+report upsert and the aggregation.
+
+Recently seen ids sit in a per-worker LRU (TTLCache), so retries landing
+on the same worker cost no queries. The processed_messages table makes the
+dedupe hold across workers and restarts. Its primary key also settles
+concurrent deliveries: only one INSERT wins. Rows older than
+DEDUPE_TTL_HOURS are treated as new and purged periodically.
+
+A claim is held without a response while the first delivery is processed.
+If that worker dies the claim would block every retry, so an unanswered
+claim older than DEDUPE_LEASE_SECONDS can be taken over by the next one.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+from .cache import TTLCache
+
+DEDUPE_TTL_HOURS = float(os.getenv("PHIP_DEDUPE_TTL_HOURS", "48"))
+# An SMS is processed in well under this; older unanswered claims were abandoned
+DEDUPE_LEASE_SECONDS = float(os.getenv("PHIP_DEDUPE_LEASE_SECONDS", "60"))
+PURGE_INTERVAL_SECONDS = 600
+# Answer to a retry that arrives while the first delivery is still being processed
+IN_PROGRESS = ""
+# Retry-After for retries that arrive while the first delivery is in progress
+IN_PROGRESS_RETRY_SECONDS = 5
+
+# (provider, message_id) -> stored response
+recent = TTLCache(ttl_seconds=DEDUPE_TTL_HOURS * 3600, max_entries=20_000)
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+def _cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(hours=DEDUPE_TTL_HOURS)
+
+def purge_expired(db: Session, force: bool = False) -> int:
+    """
+    Deletes rows past the TTL, at most once per PURGE_INTERVAL_SECONDS per
+    worker unless forced.
+    """
+    global _last_purge
+    with _purge_lock:
+        if not force and time.monotonic() - _last_purge < PURGE_INTERVAL_SECONDS:
+            return 0
+        _last_purge = time.monotonic()
+    M = models.ProcessedMessage
+    deleted = db.query(M).filter(M.created_at < _cutoff()).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def begin(db: Session, provider: str, message_id: Optional[str]) -> Optional[str]:
+    """
+    Claims message_id for this delivery. Returns None when the caller
+    should process the message, else the response to send for the
+    duplicate (IN_PROGRESS if the first delivery hasn't finished within
+    its lease). Messages without an id are always processed.
+    """
+    if not message_id:
+        return None
+    key = (provider, message_id)
+    hit = recent.get(key)
+    if hit is not None:
+        return hit
+
+    purge_expired(db)
+    try:
+        db.add(models.ProcessedMessage(provider=provider, message_id=message_id))
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+
+    row = db.get(models.ProcessedMessage, key)
+    if row is None:
+        # Purged between the INSERT and this read
+        return begin(db, provider, message_id)
+    if row.response is not None and row.created_at >= _cutoff():
+        recent.set(key, row.response)
+        return row.response
+    if row.response is None and row.created_at >= datetime.utcnow() - timedelta(seconds=DEDUPE_LEASE_SECONDS):
+        return IN_PROGRESS
+    # Expired but not purged yet, or a claim whose worker never finished:
+    # it counts as a new message. The UPDATE only matches the row as read,
+    # so one of several concurrent retries takes it over.
+    M = models.ProcessedMessage
+    claimed = db.query(M).filter(
+        M.provider == provider,
+        M.message_id == message_id,
+        M.created_at == row.created_at,
+    ).update({"created_at": datetime.utcnow(), "response": None}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        return begin(db, provider, message_id)
+    return None
+
+def finish(db: Session, provider: str, message_id: Optional[str], response: str):
+    """
+    Stores the response for retries of a processed message.
+    """
+    if not message_id:
+        return
+    db.query(models.ProcessedMessage).filter(
+        models.ProcessedMessage.provider == provider,
+        models.ProcessedMessage.message_id == message_id,
+    ).update({"response": response}, synchronize_session=False)
+    db.commit()
+    recent.set((provider, message_id), response)
+
+def abandon(db: Session, provider: str, message_id: Optional[str]):
+    """
+    Releases the claim after an unexpected failure so a retry is processed.
+    """
+    if not message_id:
+        return
+    db.rollback()
+    db.query(models.ProcessedMessage).filter(
+        models.ProcessedMessage.provider == provider,
+        models.ProcessedMessage.message_id == message_id,
+    ).delete(synchronize_session=False)
+    db.commit()
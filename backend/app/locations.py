@@ -0,0 +1,155 @@
+"""
+(state, lga) -> locations.id resolution shared by the upload endpoints,
+registration, report scoring and seeding.
+
+Locations are only ever added, so each worker keeps a map of every one it
+has seen, loaded once (at warm-up or on first use). Hits don't touch the
+database. Misses are inserted with INSERT ... ON CONFLICT (state, lga) DO
+NOTHING RETURNING in one statement per batch. Keys another worker created
+in the meantime come back empty and are picked up by a single SELECT, so
+concurrent uploads for a new LGA no longer collide on uq_state_lga.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models, spatial
+
+Key = Tuple[str, str]
+# Rows per INSERT; keeps SQLite under its bound-parameter limit
+INSERT_CHUNK = 1000
+
+class LocationResolver:
+    def __init__(self):
+        self.ids: Dict[Key, int] = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def warm(self, db: Session) -> int:
+        L = models.Location
+        rows = db.query(L.id, L.state, L.lga).all()
+        with self._lock:
+            self.ids.update({(state, lga): id_ for id_, state, lga in rows})
+            self.loaded = True
+        return len(rows)
+
+    def lookup(self, db: Session, state: str, lga: str) -> Optional[int]:
+        """
+        Id of an existing location, or None. Never creates one.
+        """
+        if not self.loaded:
+            self.warm(db)
+        key = (state, lga)
+        if key not in self.ids:
+            # Created by another worker since we loaded
+            self._remember(self._select(db, [key]))
+        return self.ids.get(key)
+
+    def resolve_many(self, db: Session, keys: Iterable[Key],
+                     coords: Optional[Dict[Key, Tuple[Optional[float], Optional[float]]]] = None) -> Dict[Key, int]:
+        """
+        Ids for every key, creating the missing locations (with coords, if
+        given). New rows are committed before their ids are cached.
+        """
+        if not self.loaded:
+            self.warm(db)
+        wanted = set(keys)
+        result = {k: self.ids[k] for k in wanted if k in self.ids}
+        missing = sorted(wanted - result.keys())
+        if not missing:
+            return result
+
+        created = self._insert(db, missing, coords or {})
+        result.update({k: loc.id for k, loc in created.items()})
+        lost = [k for k in missing if k not in created]
+        if lost:
+            result.update(self._select(db, lost))
+        self._remember(result)
+        if created:
+            self._announce(db, list(created.values()))
+        return result
+
+    def resolve(self, db: Session, state: str, lga: str, lat: Optional[float] = None, lon: Optional[float] = None) -> int:
+        key = (state, lga)
+        return self.resolve_many(db, [key], {key: (lat, lon)})[key]
+
+    def _remember(self, ids: Dict[Key, int]):
+        with self._lock:
+            self.ids.update(ids)
+
+    def _select(self, db: Session, keys: List[Key]) -> Dict[Key, int]:
+        L = models.Location
+        wanted = set(keys)
+        rows = (
+            db.query(L.id, L.state, L.lga)
+            .filter(L.state.in_({k[0] for k in keys}), L.lga.in_({k[1] for k in keys}))
+            .all()
+        )
+        return {(state, lga): id_ for id_, state, lga in rows if (state, lga) in wanted}
+
+    def _insert(self, db: Session, keys: List[Key], coords: Dict[Key, tuple]) -> Dict[Key, models.Location]:
+        """
+        Inserts the keys, skipping any that exist, and commits. Returns the
+        rows this call created, as detached Location objects.
+        """
+        rows = [
+            {"state": state, "lga": lga,
+             "latitude": coords.get((state, lga), (None, None))[0],
+             "longitude": coords.get((state, lga), (None, None))[1]}
+            for state, lga in keys
+        ]
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return self._insert_each(db, rows)
+
+        L = models.Location
+        created = {}
+        for start in range(0, len(rows), INSERT_CHUNK):
+            stmt = (
+                insert(L.__table__)
+                .values(rows[start:start + INSERT_CHUNK])
+                .on_conflict_do_nothing(index_elements=["state", "lga"])
+                .returning(L.id, L.state, L.lga, L.latitude, L.longitude)
+            )
+            for id_, state, lga, lat, lon in db.execute(stmt):
+                created[(state, lga)] = L(id=id_, state=state, lga=lga, latitude=lat, longitude=lon)
+        db.commit()
+        return created
+
+    def _insert_each(self, db: Session, rows: List[dict]) -> Dict[Key, models.Location]:
+        # Dialects without ON CONFLICT: one savepoint per row
+        created = {}
+        for row in rows:
+            loc = models.Location(**row)
+            try:
+                with db.begin_nested():
+                    db.add(loc)
+            except IntegrityError:
+                continue
+            created[(loc.state, loc.lga)] = loc
+        db.commit()
+        return created
+
+    def _announce(self, db: Session, created: List[models.Location]):
+        from .ml import feature_store
+        spatial.invalidate_index()
+        for loc in created:
+            feature_store.store.sync_location(db, loc)
+
+resolver = LocationResolver()
+
+def warm(db: Session) -> int:
+    return resolver.warm(db)
+
+def lookup(db: Session, state: str, lga: str) -> Optional[int]:
+    return resolver.lookup(db, state, lga)
+
+def resolve(db: Session, state: str, lga: str, lat: Optional[float] = None, lon: Optional[float] = None) -> int:
+    return resolver.resolve(db, state, lga, lat, lon)
+
+def resolve_many(db: Session, keys: Iterable[Key], coords=None) -> Dict[Key, int]:
+    return resolver.resolve_many(db, keys, coords)
@@ -1,11 +1,36 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from .db import Base, engine, get_db
-from .routers import data, predictions, auth, reports, sms
+from .db import engine, replica_engines, get_db
+from . import metrics, sql_profiler, startup
+from .routers import data, predictions, auth, reports, sms, trends, admin
 
-app = FastAPI(title="Predictive Health Intelligence Platform (PHIP)", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In-process sweep scheduler; off unless PHIP_SWEEP_INTERVAL_MINUTES is set
+    scheduler = None
+
+    def start_scheduler():
+        nonlocal scheduler
+        from .ml import sweep
+        if sweep.SWEEP_INTERVAL_MINUTES > 0:
+            scheduler = sweep.SweepScheduler(predictions.run_sweep_job, sweep.SWEEP_INTERVAL_MINUTES * 60)
+            scheduler.start()
+
+    # Schema, then the model warm-up (see app/startup.py for PHIP_WARMUP).
+    # The env is peeked at so a disabled scheduler doesn't import the ML stack.
+    startup.start(
+        predictions.get_model, predictions.DISEASES,
+        after_warmup=start_scheduler if os.getenv("PHIP_SWEEP_INTERVAL_MINUTES") else None,
+    )
+    yield
+    if scheduler:
+        scheduler.stop()
+
+app = FastAPI(title="Predictive Health Intelligence Platform (PHIP)", version="0.1.0", lifespan=lifespan)
 
 # Get allowed origins from environment variable or default to local
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173")
@@ -21,16 +46,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
+app.add_middleware(metrics.MetricsMiddleware)
+for _engine in [engine] + replica_engines:
+    metrics.install_db_instrumentation(_engine)
+if sql_profiler.ENABLED:
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+    for _engine in [engine] + replica_engines:
+        sql_profiler.install(_engine)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """
+    200 once every disease model is loaded in this worker, else 503.
+    """
+    body = startup.readiness(predictions._models_cache, predictions.DISEASES)
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    # Prometheus text exposition; empty histograms unless PHIP_METRICS=1
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(data.router, prefix="/data", tags=["data"])
 app.include_router(predictions.router, prefix="/predictions", tags=["predictions"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(reports.router, prefix="/reports", tags=["reports"])
 app.include_router(sms.router, prefix="/sms", tags=["sms"])
+app.include_router(trends.router, prefix="/trends", tags=["trends"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,188 @@
+"""
+Lightweight Prometheus-style metrics for PHIP.
+
+Enabled with PHIP_METRICS=1. When disabled, timed()/instrument() cost one
+flag check and the SQLAlchemy hook is never installed. Metrics are kept per
+process, so under gunicorn each worker exposes its own /metrics.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Tuple, Sequence, Optional
+from sqlalchemy import event
+
+ENABLED = os.getenv("PHIP_METRICS", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return "\n".join(lines)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return "\n".join(lines)
+
+_registry = []
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help_text, labelnames)
+    _registry.append(metric)
+    return metric
+
+def histogram(name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+STAGE_SECONDS = histogram("phip_stage_duration_seconds", "Time spent in instrumented pipeline stages", ["stage"])
+STAGE_ERRORS = counter("phip_stage_errors_total", "Instrumented stages that raised", ["stage"])
+ROWS_LOADED = counter("phip_rows_loaded_total", "Rows loaded from the database by pipeline stages", ["source"])
+REQUEST_SECONDS = histogram("phip_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+REQUEST_QUERIES = histogram("phip_http_request_db_queries", "Database statements issued per HTTP request", ["route"], COUNT_BUCKETS)
+DB_QUERIES = counter("phip_db_queries_total", "Database statements executed")
+
+# --- Stage timing ---
+
+@contextmanager
+def timed(stage: str):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(stage, value=time.perf_counter() - start)
+
+def instrument(stage: str):
+    """
+    Decorator form of timed(); checks the flag per call so it can be toggled.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_rows(source: str, count: int):
+    if ENABLED:
+        ROWS_LOADED.inc(source, amount=count)
+
+# --- Per-request DB query counting ---
+
+# Holds a one-element list per request; sync endpoints run in a threadpool that
+# copies the context, so they increment the same list the middleware reads.
+_request_queries: ContextVar[Optional[list]] = ContextVar("phip_request_queries", default=None)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    counter_ref = _request_queries.get()
+    if counter_ref is not None:
+        counter_ref[0] += 1
+
+_installed_engines = set()
+
+def install_db_instrumentation(engine):
+    if not ENABLED or id(engine) in _installed_engines:
+        return
+    event.listen(engine, "before_cursor_execute", _count_query)
+    _installed_engines.add(id(engine))
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency and DB statement count per route.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(scope["method"], route, str(status[0]), value=time.perf_counter() - start)
+            REQUEST_QUERIES.observe(route, value=queries[0])
@@ -1,18 +1,27 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from .. import models
+from ..metrics import instrument, record_rows
+from ..trends.cubes import refresh_lga_week
 from datetime import timedelta
 
-def aggregate_facility_reports(db: Session, state: str, lga: str, report_date):
+def get_week_start(report_date):
     """
-    Aggregates all daily reports for a given location and week,
-    and updates the LGAWeeklyAggregate table.
+    Returns the Sunday that starts the reporting week containing report_date.
     """
-    # Determine week start (Sunday)
-    week_start = report_date - timedelta(days=report_date.weekday() + 1)
     if report_date.weekday() == 6: # If Sunday, it is the start
-        week_start = report_date
-        
+        return report_date
+    return report_date - timedelta(days=report_date.weekday() + 1)
+
+@instrument("aggregate_facility_reports")
+def aggregate_facility_reports(db: Session, state: str, lga: str, report_date, refresh_rollups: bool = True):
+    """
+    Aggregates all daily reports for a given location and week,
+    and updates the LGAWeeklyAggregate table. refresh_rollups=False leaves
+    the trend cubes to the caller (the report routes refresh them once,
+    after re-scoring).
+    """
+    week_start = get_week_start(report_date)
     week_end = week_start + timedelta(days=6)
     
     # Fetch all reports for this location in this week
@@ -26,6 +35,7 @@ def aggregate_facility_reports(db: Session, state: str, lga: str, report_date):
         .all()
     )
     
+    record_rows("daily_reports", len(reports))
     if not reports:
         return
 
@@ -66,3 +76,9 @@ def aggregate_facility_reports(db: Session, state: str, lga: str, report_date):
     agg.low_stock_alerts = low_stock_count
     
     db.commit()
+    from . import feature_store
+    feature_store.store.record_aggregate(state, lga, week_start, agg)
+    
+    # Keep the trends cubes in step with the new weekly totals
+    if refresh_rollups:
+        refresh_lga_week(db, state, lga, week_start)
@@ -0,0 +1,214 @@
+"""
+Rolling-origin backtests for the risk models.
+
+History is replayed week by week. At each origin week t a model per
+horizon h is trained only on rows whose outcome (week + h) was observable
+by t, every LGA is scored for week t in one batch, and the score is
+compared with the outbreak flag at t + h. The feature matrix is engineered
+once from the cached training snapshot and sliced per origin. The model is
+refreshed every `retrain_every` origins, by warm-starting extra trees for
+gbc or a refit for hgb, so the replay costs a handful of full fits rather
+than one per week.
+
+Reports are written as JSON under BACKTEST_DIR and served by
+GET /predictions/backtest/{disease}.
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import roc_auc_score
+from sqlalchemy.orm import Session
+from .. import models
+from .model import RiskModel, HORIZONS, MODEL_DIR, MAX_ESTIMATORS
+
+BACKTEST_DIR = os.getenv("PHIP_BACKTEST_DIR", os.path.join(MODEL_DIR, "backtests"))
+# Score at which a replayed prediction counts as an alert
+ALERT_THRESHOLD = 0.5
+
+def _fit_or_extend(model: RiskModel, pipeline, X: np.ndarray, y: np.ndarray, warm_trees: int):
+    """
+    Fresh fit for the first origin, for the hgb backend (see
+    RiskModel.train_incremental) and once the ensemble is at the cap,
+    otherwise adds warm_trees trees fitted on the grown training window.
+    """
+    if (pipeline is None
+            or isinstance(pipeline.named_steps['classifier'], HistGradientBoostingClassifier)
+            or RiskModel._n_trees(pipeline) + warm_trees > MAX_ESTIMATORS):
+        pipeline = model._build_pipeline()
+        pipeline.fit(X, y)
+        return pipeline
+    clf = pipeline.named_steps['classifier']
+    clf.set_params(warm_start=True, n_estimators=clf.n_estimators + warm_trees)
+    clf.fit(RiskModel._transform(pipeline, X), y)
+    return pipeline
+
+def replay(df: pd.DataFrame, model: RiskModel, horizons: List[int], origins: np.ndarray,
+           retrain_every: int = 4, warm_trees: int = 20) -> pd.DataFrame:
+    """
+    Returns one row per (location, origin week, horizon) with the replayed
+    score and the observed outcome.
+    """
+    features = model._feature_columns(df)
+    X = df[features].to_numpy(dtype=np.float64, na_value=np.nan)
+    weeks = df['week_start'].to_numpy()
+    location_ids = df['location_id'].to_numpy()
+
+    frames = []
+    for h in horizons:
+        target = df[f"target_h{h}"].to_numpy()
+        labelled = ~np.isnan(target)
+        # A row's label is known once its target week (week + h) has been observed
+        label_known_at = weeks + np.timedelta64(7 * h, 'D')
+        pipeline = None
+        for i, origin in enumerate(origins):
+            if pipeline is None or i % retrain_every == 0:
+                train = labelled & (label_known_at <= origin)
+                if len(np.unique(target[train])) < 2:
+                    continue
+                pipeline = _fit_or_extend(model, pipeline, X[train], target[train], warm_trees)
+            score = labelled & (weeks == origin)
+            if not score.any():
+                continue
+            frames.append(pd.DataFrame({
+                "location_id": location_ids[score],
+                "origin": origin,
+                "horizon": h,
+                "score": pipeline.predict_proba(X[score])[:, 1],
+                "outcome": target[score].astype(int),
+            }))
+    if not frames:
+        return pd.DataFrame(columns=["location_id", "origin", "horizon", "score", "outcome"])
+    return pd.concat(frames, ignore_index=True)
+
+def _auc(outcome: np.ndarray, score: np.ndarray) -> Optional[float]:
+    return float(roc_auc_score(outcome, score)) if len(np.unique(outcome)) > 1 else None
+
+def _alert_stats(group: pd.DataFrame, threshold: float) -> Dict[str, Any]:
+    alert = group['score'].to_numpy() >= threshold
+    outcome = group['outcome'].to_numpy() == 1
+    tp, fp = int((alert & outcome).sum()), int((alert & ~outcome).sum())
+    fn, tn = int((~alert & outcome).sum()), int((~alert & ~outcome).sum())
+    return {
+        "auc": _auc(group['outcome'].to_numpy(), group['score'].to_numpy()),
+        "precision": tp / (tp + fp) if tp + fp else None,
+        "recall": tp / (tp + fn) if tp + fn else None,
+        # Share of non-outbreak weeks that still raised an alert
+        "false_alarm_rate": fp / (fp + tn) if fp + tn else None,
+        "alerts": tp + fp,
+        "predictions": len(group),
+    }
+
+def lead_times(df: pd.DataFrame, preds: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """
+    One row per outbreak onset (first outbreak week after a quiet one) that the
+    replay covered, with the longest horizon that alerted for it (0 = missed).
+    """
+    flags = df[['location_id', 'week_start', 'is_outbreak']].sort_values(['location_id', 'week_start'])
+    previous = flags.groupby('location_id')['is_outbreak'].shift(1)
+    onsets = flags.loc[(flags['is_outbreak'] == 1) & (previous == 0), ['location_id', 'week_start']]
+
+    targeted = preds.assign(target_week=preds['origin'] + pd.to_timedelta(7 * preds['horizon'], unit='D'))
+    covered = targeted[['location_id', 'target_week']].drop_duplicates()
+    onsets = onsets.merge(covered, left_on=['location_id', 'week_start'], right_on=['location_id', 'target_week'])
+
+    alerted = targeted[targeted['score'] >= threshold]
+    lead = (
+        alerted.groupby(['location_id', 'target_week'])['horizon'].max()
+        .rename('lead_weeks').reset_index()
+    )
+    onsets = onsets.merge(lead, on=['location_id', 'target_week'], how='left')
+    onsets['lead_weeks'] = onsets['lead_weeks'].fillna(0).astype(int)
+    return onsets[['location_id', 'week_start', 'lead_weeks']]
+
+def _lead_summary(onsets: pd.DataFrame) -> Dict[str, Any]:
+    detected = onsets[onsets['lead_weeks'] > 0]
+    return {
+        "onsets": len(onsets),
+        "detected": len(detected),
+        "detection_rate": len(detected) / len(onsets) if len(onsets) else None,
+        "mean_lead_weeks": float(detected['lead_weeks'].mean()) if len(detected) else None,
+    }
+
+def build_report(df: pd.DataFrame, preds: pd.DataFrame, locations: Dict[int, tuple], threshold: float) -> Dict[str, Any]:
+    onsets = lead_times(df, preds, threshold)
+    report = {
+        "horizons": {int(h): _alert_stats(g, threshold) for h, g in preds.groupby('horizon')},
+        "lead_time": _lead_summary(onsets),
+        "lgas": [],
+    }
+    onsets_by_loc = dict(tuple(onsets.groupby('location_id')))
+    for location_id, group in preds.groupby('location_id'):
+        state, lga = locations.get(int(location_id), ("", ""))
+        by_h = {int(h): _alert_stats(g, threshold) for h, g in group.groupby('horizon')}
+        report["lgas"].append({
+            "state": state,
+            "lga": lga,
+            "auc": {h: s["auc"] for h, s in by_h.items()},
+            "false_alarm_rate": {h: s["false_alarm_rate"] for h, s in by_h.items()},
+            **_lead_summary(onsets_by_loc.get(location_id, onsets.iloc[0:0])),
+        })
+    return report
+
+def run_backtest(db: Session, disease: str, horizons: Optional[List[int]] = None,
+                 start: Optional[str] = None, end: Optional[str] = None,
+                 min_train_weeks: int = 52, retrain_every: int = 4, warm_trees: int = 20,
+                 threshold: float = ALERT_THRESHOLD, backend: Optional[str] = None) -> Dict[str, Any]:
+    started = time.perf_counter()
+    horizons = horizons or HORIZONS
+    model = RiskModel(disease, backend=backend)
+    raw_df = model._load_training_frame(db)
+    if raw_df.empty:
+        raise ValueError("No data to backtest")
+    df = model._feature_engineering(raw_df)
+
+    # Origins start once there is min_train_weeks of history to learn from
+    origins = np.unique(df['week_start'].to_numpy())[min_train_weeks:]
+    if start:
+        origins = origins[origins >= np.datetime64(start)]
+    if end:
+        origins = origins[origins <= np.datetime64(end)]
+    if not len(origins):
+        raise ValueError("No origin weeks in range")
+
+    preds = replay(df, model, horizons, origins, retrain_every=retrain_every, warm_trees=warm_trees)
+    locations = {l.id: (l.state, l.lga) for l in db.query(models.Location.id, models.Location.state, models.Location.lga)}
+    report = build_report(df, preds, locations, threshold) if len(preds) else {"horizons": {}, "lead_time": {}, "lgas": []}
+    report.update({
+        "disease": disease,
+        "backend": model.backend,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "threshold": threshold,
+        "retrain_every": retrain_every,
+        "origins": {
+            "first": str(pd.Timestamp(origins[0]).date()),
+            "last": str(pd.Timestamp(origins[-1]).date()),
+            "count": len(origins),
+        },
+        "seconds": time.perf_counter() - started,
+    })
+    save_report(report)
+    return report
+
+def report_path(disease: str) -> str:
+    return os.path.join(BACKTEST_DIR, f"{disease}.json")
+
+def save_report(report: Dict[str, Any]) -> str:
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    path = report_path(report["disease"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+def load_report(disease: str) -> Optional[Dict[str, Any]]:
+    path = report_path(disease)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
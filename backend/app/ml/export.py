@@ -0,0 +1,258 @@
+import hashlib
+import io
+import os
+import tempfile
+from typing import Iterator, Optional
+from sqlalchemy import func, select, Integer, Float, Date, DateTime
+from sqlalchemy.orm import Session
+from .. import models
+
+EXPORT_TABLES = {
+    "env_metrics": models.EnvMetric,
+    "disease_history": models.DiseaseHistory,
+    "lga_weekly_aggregates": models.LGAWeeklyAggregate,
+}
+DATASETS = list(EXPORT_TABLES) + ["features"]
+FORMATS = ["parquet", "arrow"]
+DEFAULT_BATCH_SIZE = 50_000
+LOCATIONS_PER_FEATURE_BATCH = 50
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise RuntimeError("Arrow/Parquet export requires pyarrow to be installed")
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def iter_table_batches(db: Session, dataset: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator:
+    """
+    Streams a raw table as Arrow record batches. Rows are fetched with a
+    server-side cursor, so only one batch is held in memory at a time.
+    """
+    pa = _require_pyarrow()
+    table = EXPORT_TABLES[dataset].__table__
+    columns = list(table.columns)
+    schema = pa.schema([(c.name, _arrow_type(pa, c)) for c in columns])
+
+    result = db.execute(
+        select(*columns).order_by(table.c.id).execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        arrays = [pa.array([r[i] for r in rows], type=field.type) for i, field in enumerate(schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def iter_feature_batches(db: Session, disease: str) -> Iterator:
+    """
+    Streams the engineered training frame for a disease. Feature engineering
+    only looks within a location and at its neighbours, so locations are
+    processed in groups loaded together with their neighbours.
+    """
+    pa = _require_pyarrow()
+    from .model import RiskModel
+    from .neighbours import get_neighbour_index
+
+    rm = RiskModel(disease=disease)
+    location_ids = [lid for (lid,) in db.query(models.Location.id).order_by(models.Location.id)]
+    schema = None
+    neighbours = get_neighbour_index(db)
+    for i in range(0, len(location_ids), LOCATIONS_PER_FEATURE_BATCH):
+        batch = location_ids[i:i + LOCATIONS_PER_FEATURE_BATCH]
+        raw = rm._load_raw_data(db, location_ids=sorted(set(batch) | neighbours.neighbours_of(batch)))
+        if raw.empty:
+            continue
+        df = rm._feature_engineering(raw, neighbours)
+        df = df[df['location_id'].isin(batch)]
+        if df.empty:
+            continue
+        if schema is None:
+            batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+            schema = batch.schema
+        else:
+            batch = pa.RecordBatch.from_pandas(df.reindex(columns=schema.names), schema=schema, preserve_index=False)
+        yield batch
+
+def iter_dataset_batches(db: Session, dataset: str, disease: str = "cholera", batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator:
+    if dataset == "features":
+        return iter_feature_batches(db, disease)
+    return iter_table_batches(db, dataset, batch_size)
+
+def write_batches(batches: Iterator, sink, fmt: str) -> int:
+    """
+    Writes record batches to a path or file object as Parquet or an Arrow
+    IPC stream. Returns the number of rows written.
+    """
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                if fmt == "parquet":
+                    writer = pq.ParquetWriter(sink, batch.schema)
+                else:
+                    writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+class _ChunkBuffer(io.RawIOBase):
+    # Write-only sink that hands back whatever was written since the last drain
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_arrow_ipc(batches: Iterator) -> Iterator[bytes]:
+    """
+    Yields an Arrow IPC stream batch by batch for HTTP streaming responses.
+    """
+    pa = _require_pyarrow()
+    sink = _ChunkBuffer()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+def parquet_tempfile(batches: Iterator, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Parquet needs its footer written last, so the file is spooled to disk
+    in batches and then streamed back in fixed-size chunks.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        write_batches(batches, tmp, "parquet")
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+# --- Training input cache ---
+
+CACHE_DIR = os.getenv("PHIP_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache"))
+
+def data_watermark(db: Session) -> str:
+    """
+    Cheap fingerprint of the training inputs: row counts, latest week and
+    the sum of every loaded column per table. Changes whenever rows are
+    added or edited.
+    """
+    parts = [db.query(func.count(models.Location.id)).scalar()]
+    parts += db.query(
+        func.count(models.EnvMetric.id),
+        func.max(models.EnvMetric.week_start),
+        func.sum(models.EnvMetric.rainfall_mm),
+        func.sum(models.EnvMetric.temperature_c),
+        func.sum(models.EnvMetric.humidity_pct),
+        func.sum(models.EnvMetric.flood_risk),
+    ).one()
+    parts += db.query(
+        func.count(models.DiseaseHistory.id),
+        func.max(models.DiseaseHistory.week_start),
+        func.sum(models.DiseaseHistory.cholera_cases),
+        func.sum(models.DiseaseHistory.malaria_cases),
+        func.sum(models.DiseaseHistory.lassa_cases),
+        func.sum(models.DiseaseHistory.meningitis_cases),
+    ).one()
+    parts += db.query(
+        func.count(models.LGAWeeklyAggregate.id),
+        func.max(models.LGAWeeklyAggregate.week_start_date),
+        func.sum(models.LGAWeeklyAggregate.total_fever_cases),
+        func.sum(models.LGAWeeklyAggregate.total_diarrhea_cases),
+        func.sum(models.LGAWeeklyAggregate.total_respiratory_cases),
+        func.sum(models.LGAWeeklyAggregate.total_admissions),
+        func.sum(models.LGAWeeklyAggregate.avg_bed_occupancy),
+    ).one()
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+def load_snapshot(watermark: str):
+    """
+    Returns the cached raw training frame for this watermark, or None.
+    """
+    path = os.path.join(CACHE_DIR, f"raw_{watermark}.parquet")
+    if not os.path.exists(path):
+        return None
+    try:
+        import pandas as pd
+        return pd.read_parquet(path)
+    except ImportError:
+        return None
+
+def save_snapshot(watermark: str, df) -> Optional[str]:
+    """
+    Stores the raw training frame and drops snapshots for older watermarks.
+    Skipped silently when pyarrow is not installed.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"raw_{watermark}.parquet")
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith("raw_") and name.endswith(".parquet") and name != os.path.basename(path):
+            os.remove(os.path.join(CACHE_DIR, name))
+    return path
+
+def _training_matrix_path(disease: str) -> str:
+    return os.path.join(CACHE_DIR, f"train_{disease}.parquet")
+
+def load_training_matrix(disease: str):
+    """
+    Returns the engineered training rows the current model was fitted on, or
+    None when there is no cached matrix (or pyarrow is missing).
+    """
+    path = _training_matrix_path(disease)
+    if not os.path.exists(path):
+        return None
+    try:
+        import pandas as pd
+        return pd.read_parquet(path)
+    except ImportError:
+        return None
+
+def save_training_matrix(disease: str, df) -> Optional[str]:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _training_matrix_path(disease)
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
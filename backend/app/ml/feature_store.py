@@ -0,0 +1,330 @@
+"""
+In-memory rolling store of the weekly signals that serving-time features read.
+
+The last STORE_WEEKS reporting weeks of every signal are kept per LGA in one
+preallocated float64 array (locations x weeks x signals). The week axis is a
+ring buffer indexed by week number, so a new week overwrites the oldest
+slot instead of growing the array. Memory is fixed by the number of LGAs:
+774 LGAs x 52 weeks x 13 signals is about 4 MB. Values keep the database's
+precision, so a feature read from here and one read from the DB fallback
+land on the same side of every split.
+
+build_feature_vectors reads its windows from here with array slicing
+instead of querying EnvMetric, DiseaseHistory and LGAWeeklyAggregate. The
+store is loaded at startup (or on first use) and the write paths update it
+in place via record() and record_aggregate(). Each process has its own
+copy and only sees its own writes, so it is reloaded every
+PHIP_FEATURE_STORE_TTL seconds to pick up other workers' writes. window() returns None when it
+cannot answer exactly, and the caller falls back to the database. This
+happens for weeks older than the buffer, unknown LGAs, and LGAs with rows
+dated off the Sunday week grid.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .. import models
+
+ENABLED = os.getenv("PHIP_FEATURE_STORE", "1") == "1"
+STORE_WEEKS = int(os.getenv("PHIP_FEATURE_STORE_WEEKS", "52"))
+# Bounds how long a worker misses writes made by other workers; 0 = never
+# reload (only safe with a single worker)
+RELOAD_TTL_SECONDS = float(os.getenv("PHIP_FEATURE_STORE_TTL", "60"))
+
+ENV_COLUMNS = ["rainfall_mm", "temperature_c", "humidity_pct", "flood_risk"]
+DISEASE_COLUMNS = ["cholera_cases", "malaria_cases", "lassa_cases", "meningitis_cases"]
+# Feature name -> LGAWeeklyAggregate column
+AGGREGATE_COLUMNS = {
+    "fever_reports": "total_fever_cases",
+    "cough_reports": "total_respiratory_cases",
+    "diarrhea_reports": "total_diarrhea_cases",
+    "admissions": "total_admissions",
+    "bed_occupancy": "avg_bed_occupancy",
+}
+TABLES = {
+    "env": ENV_COLUMNS,
+    "disease": DISEASE_COLUMNS,
+    "aggregate": list(AGGREGATE_COLUMNS),
+}
+SIGNALS = [c for cols in TABLES.values() for c in cols]
+
+# Reporting weeks start on Sunday (see aggregation.get_week_start)
+_SUNDAY = date(1970, 1, 4).toordinal()
+
+def week_number(d: date) -> Tuple[int, bool]:
+    """
+    Index of the Sunday week containing d, and whether d is that Sunday.
+    """
+    n, offset = divmod(d.toordinal() - _SUNDAY, 7)
+    return n, offset == 0
+
+def week_date(n: int) -> date:
+    return date.fromordinal(_SUNDAY + 7 * n)
+
+class FeatureStore:
+    def __init__(self, weeks: int = STORE_WEEKS):
+        self.weeks = weeks
+        self.signal_index = {s: i for i, s in enumerate(SIGNALS)}
+        self.table_index = {t: i for i, t in enumerate(TABLES)}
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        self.values = np.full((capacity, self.weeks, len(SIGNALS)), np.nan, dtype=np.float64)
+        # Whether each table had a row for (location, week); a row can exist with NULL values
+        self.present = np.zeros((capacity, self.weeks, len(TABLES)), dtype=bool)
+        self.row: Dict[int, int] = {}
+        self.locations: Dict[int, Tuple[str, str, Optional[float], Optional[float]]] = {}
+        self.by_name: Dict[Tuple[str, str], int] = {}
+        # Latest DiseaseHistory week per LGA over all history, not just the buffer
+        self.latest_history: Dict[int, date] = {}
+        # LGAs with rows off the Sunday grid; their windows are read from the DB
+        self.irregular = set()
+        self.newest: Optional[int] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.present.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": ENABLED,
+            "ready": self.ready,
+            "locations": len(self.row),
+            "weeks": self.weeks,
+            "signals": len(SIGNALS),
+            "dtype": str(self.values.dtype),
+            "bytes": self.nbytes,
+            "newest_week": str(week_date(self.newest)) if self.newest is not None else None,
+            "irregular_locations": len(self.irregular),
+            "age_seconds": time.monotonic() - self.loaded_at if self.ready else None,
+        }
+
+    # --- Loading ---
+
+    def load(self, db: Session):
+        started = time.perf_counter()
+        locations = db.query(models.Location.id, models.Location.state, models.Location.lga,
+                             models.Location.latitude, models.Location.longitude).all()
+        newest = max(
+            (d for d in (
+                db.query(func.max(models.EnvMetric.week_start)).scalar(),
+                db.query(func.max(models.DiseaseHistory.week_start)).scalar(),
+                db.query(func.max(models.LGAWeeklyAggregate.week_start_date)).scalar(),
+            ) if d is not None),
+            default=None,
+        )
+        latest_history = dict(
+            db.query(models.DiseaseHistory.location_id, func.max(models.DiseaseHistory.week_start))
+            .group_by(models.DiseaseHistory.location_id)
+        )
+        rows = {}
+        if newest is not None:
+            since = week_date(week_number(newest)[0] - self.weeks + 1)
+            rows = self._fetch(db, since)
+
+        with self._lock:
+            # Headroom so LGAs created later don't reallocate straight away
+            self._reset(max(16, len(locations) + len(locations) // 8))
+            for l in locations:
+                self._add_location(l.id, l.state, l.lga, l.latitude, l.longitude)
+            self.latest_history = latest_history
+            if newest is not None:
+                self.newest = week_number(newest)[0]
+            self._apply(rows)
+            self.loaded_at = time.monotonic()
+        print(
+            f"Feature store loaded {len(self.row)} LGAs x {self.weeks} weeks x {len(SIGNALS)} signals "
+            f"({self.nbytes / 1e6:.1f} MB) in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _fetch(self, db: Session, since: date, location_id: Optional[int] = None) -> Dict[str, List[tuple]]:
+        rows = {}
+        for table, model in (("env", models.EnvMetric), ("disease", models.DiseaseHistory)):
+            q = db.query(model.location_id, model.week_start, *[getattr(model, c) for c in TABLES[table]]).filter(
+                model.week_start >= since
+            )
+            if location_id is not None:
+                q = q.filter(model.location_id == location_id)
+            rows[table] = [(r[0], r[1], r[2:]) for r in q]
+
+        A = models.LGAWeeklyAggregate
+        q = db.query(A.state, A.lga, A.week_start_date, *[getattr(A, c) for c in AGGREGATE_COLUMNS.values()]).filter(
+            A.week_start_date >= since
+        )
+        if location_id is not None:
+            state, lga = self.locations[location_id][:2]
+            q = q.filter(A.state == state, A.lga == lga)
+        # Keyed by (state, lga) until _apply maps them to location ids
+        rows["aggregate"] = [((r[0], r[1]), r[2], r[3:]) for r in q]
+        return rows
+
+    def _apply(self, rows: Dict[str, List[tuple]]):
+        for table, table_rows in rows.items():
+            for key, week_start, values in table_rows:
+                location_id = self.by_name.get(key) if table == "aggregate" else key
+                self._record(table, location_id, week_start, values)
+
+    def sync_location(self, db: Session, location: models.Location):
+        """
+        Picks up an LGA created or moved after the load. New LGAs come with
+        whatever rows they already have.
+        """
+        if not self.ready:
+            return
+        with self._lock:
+            if location.id in self.row:
+                self.locations[location.id] = (location.state, location.lga, location.latitude, location.longitude)
+                return
+            self._add_location(location.id, location.state, location.lga, location.latitude, location.longitude)
+        if self.newest is None:
+            return
+        rows = self._fetch(db, week_date(self.newest - self.weeks + 1), location_id=location.id)
+        with self._lock:
+            self._apply(rows)
+
+    def _add_location(self, location_id: int, state: str, lga: str, lat, lon):
+        if len(self.row) == len(self.values):
+            grow = max(16, len(self.values) // 2)
+            self.values = np.concatenate([self.values, np.full((grow,) + self.values.shape[1:], np.nan, dtype=np.float64)])
+            self.present = np.concatenate([self.present, np.zeros((grow,) + self.present.shape[1:], dtype=bool)])
+        self.row[location_id] = len(self.row)
+        self.locations[location_id] = (state, lga, lat, lon)
+        self.by_name[(state, lga)] = location_id
+
+    # --- Writes ---
+
+    def record(self, table: str, location_id: int, week_start: date, values: Dict[str, Any]):
+        """
+        Stores one row of `table` ("env", "disease" or "aggregate"), keyed by
+        feature name. Call after the row is committed.
+        """
+        if not self.ready:
+            return
+        with self._lock:
+            self._record(table, location_id, week_start, [values.get(c) for c in TABLES[table]])
+
+    def record_aggregate(self, state: str, lga: str, week_start: date, agg: models.LGAWeeklyAggregate):
+        if not self.ready:
+            return
+        with self._lock:
+            self._record("aggregate", self.by_name.get((state, lga)), week_start,
+                         [getattr(agg, c) for c in AGGREGATE_COLUMNS.values()])
+
+    def _record(self, table: str, location_id: Optional[int], week_start: date, values):
+        i = self.row.get(location_id)
+        if i is None:
+            return
+        if table == "disease" and week_start > self.latest_history.get(location_id, date.min):
+            self.latest_history[location_id] = week_start
+        n, on_grid = week_number(week_start)
+        if not on_grid:
+            self.irregular.add(location_id)
+            return
+        if self.newest is None or n > self.newest:
+            self._advance(n)
+        if n <= self.newest - self.weeks:
+            return
+        slot = n % self.weeks
+        cols = [self.signal_index[c] for c in TABLES[table]]
+        self.values[i, slot, cols] = [np.nan if v is None else v for v in values]
+        self.present[i, slot, self.table_index[table]] = True
+
+    def _advance(self, n: int):
+        # Clear the slots of the weeks that fall out of the buffer
+        start = n - self.weeks + 1 if self.newest is None else max(self.newest + 1, n - self.weeks + 1)
+        for week in range(start, n + 1):
+            self.values[:, week % self.weeks, :] = np.nan
+            self.present[:, week % self.weeks, :] = False
+        self.newest = n
+
+    # --- Reads ---
+
+    def covers(self, week_start: date, window_weeks: int) -> bool:
+        if self.newest is None:
+            return True
+        first, on_grid = week_number(week_start - timedelta(weeks=window_weeks))
+        # An off-grid start excludes its own week's Sunday
+        return first + (0 if on_grid else 1) > self.newest - self.weeks
+
+    def window(self, week_start: date, location_ids: List[int], window_weeks: int) -> Optional[pd.DataFrame]:
+        """
+        Same frame as model._load_feature_window, or None when the store
+        cannot answer it exactly.
+        """
+        with self._lock:
+            if not self.ready or not self.covers(week_start, window_weeks):
+                return None
+            if any(lid not in self.row or lid in self.irregular for lid in location_ids):
+                return None
+            if self.newest is None:
+                return pd.DataFrame()
+            first, on_grid = week_number(week_start - timedelta(weeks=window_weeks))
+            first += 0 if on_grid else 1
+            last = min(week_number(week_start)[0], self.newest)
+            if last < first:
+                return pd.DataFrame()
+            ids = np.asarray(location_ids, dtype=np.int64)
+            rows = np.array([self.row[lid] for lid in location_ids], dtype=np.intp)
+            weeks = np.arange(first, last + 1)
+            slots = weeks % self.weeks
+            present = self.present[rows][:, slots, :]
+            values = self.values[rows][:, slots, :]
+
+        has_row = present.any(axis=2)
+        li, wi = np.nonzero(has_row)
+        if not len(li):
+            return pd.DataFrame()
+        df = pd.DataFrame({
+            "location_id": ids[li],
+            "week_start": [week_date(int(n)) for n in weeks[wi]],
+        })
+        for table, cols in TABLES.items():
+            t = self.table_index[table]
+            # As in the DB path, a table contributes columns only if it has rows in the window
+            if not present[:, :, t].any():
+                continue
+            missing = ~present[li, wi, t]
+            for col in cols:
+                col_values = values[li, wi, self.signal_index[col]]
+                col_values[missing] = np.nan
+                df[col] = col_values
+            if table == "aggregate":
+                df["vomiting_reports"] = np.where(missing, np.nan, 0.0)
+        return df
+
+    def latest_week(self, location_id: int) -> Optional[date]:
+        return self.latest_history.get(location_id)
+
+store = FeatureStore()
+_load_lock = threading.Lock()
+
+def get_store(db: Session) -> Optional[FeatureStore]:
+    """
+    The process store, loaded on first use and reloaded after
+    RELOAD_TTL_SECONDS or invalidate(); None when disabled.
+    """
+    if not ENABLED:
+        return None
+    with _load_lock:
+        if not store.ready or (RELOAD_TTL_SECONDS > 0 and time.monotonic() - store.loaded_at > RELOAD_TTL_SECONDS):
+            store.load(db)
+    return store
+
+def invalidate():
+    """
+    Drops the store after bulk writes that bypass record(); the next
+    get_store() reloads it.
+    """
+    with store._lock:
+        store.loaded_at = None
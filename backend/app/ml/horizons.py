@@ -0,0 +1,5 @@
+# Forecast horizons in weeks; one model each, trained on a shared feature matrix.
+# DEFAULT_HORIZON is what single-score callers (heatmap, alerts, reports) use.
+# Kept apart from model.py so routers can read them without importing the ML stack.
+HORIZONS = [1, 2, 3, 4]
+DEFAULT_HORIZON = 2
@@ -1,42 +1,180 @@
+import json
+import uuid
+from collections import defaultdict
 from datetime import timedelta, date
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
-from sklearn.ensemble import GradientBoostingClassifier
+import time
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import roc_auc_score, precision_score, recall_score, f1_score
 from .. import models
+from .attributions import compile_ensemble, path_attributions, row_hashes, attribution_cache, format_factors, split_cached
+from .neighbours import NeighbourIndex, get_neighbour_index, index_for
+from .feature_store import DISEASE_COLUMNS, ENV_COLUMNS, get_store
+from .horizons import HORIZONS, DEFAULT_HORIZON
+from .export import data_watermark, load_snapshot, save_snapshot, load_training_matrix, save_training_matrix
+from ..metrics import instrument, record_rows
 import joblib
 import os
 
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "saved_models")
+MODEL_DIR = os.getenv("PHIP_MODEL_DIR", os.path.join(os.path.dirname(__file__), "saved_models"))
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# "gbc": imputer -> scaler -> GradientBoostingClassifier (exact splits)
+# "hgb": HistGradientBoostingClassifier alone (binned, multithreaded, native NaN)
+MODEL_BACKENDS = ["gbc", "hgb"]
+MODEL_BACKEND = os.getenv("PHIP_MODEL_BACKEND", "hgb")
+
+# Incremental retraining: trees added per warm-start round, the ensemble size
+# that forces a full refit, and how many incremental rounds run between full ones
+WARM_START_ESTIMATORS = int(os.getenv("PHIP_WARM_START_ESTIMATORS", "20"))
+MAX_ESTIMATORS = int(os.getenv("PHIP_MAX_ESTIMATORS", "300"))
+FULL_RETRAIN_EVERY = int(os.getenv("PHIP_FULL_RETRAIN_EVERY", "8"))
+# History loaded ahead of the new weeks: covers the 26-week outbreak threshold and lags
+CONTEXT_WEEKS = 30
+
+# Tuned hyperparameters per disease and backend, written by scripts/tune_models.py
+REGISTRY_PATH = os.path.join(MODEL_DIR, "registry.json")
+# Parameters that grow with warm starts and are not compared against the registry
+BUDGET_PARAMS = {"gbc": "n_estimators", "hgb": "max_iter"}
+
+def load_registry() -> Dict[str, Any]:
+    if not os.path.exists(REGISTRY_PATH):
+        return {}
+    with open(REGISTRY_PATH) as f:
+        return json.load(f)
+
+def tuned_params(disease: str, backend: str) -> Dict[str, Any]:
+    return load_registry().get(disease, {}).get(backend, {}).get("params", {})
+
+def save_tuned_params(disease: str, backend: str, params: Dict[str, Any], metrics: Dict[str, Any]):
+    registry = load_registry()
+    registry.setdefault(disease, {})[backend] = {
+        "params": params,
+        "metrics": metrics,
+        "tuned_at": date.today().isoformat(),
+    }
+    tmp_path = REGISTRY_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, REGISTRY_PATH)
+
+TARGET_COLUMNS = [f"target_h{h}" for h in HORIZONS]
+
 class RiskModel:
-    def __init__(self, disease: str):
+    def __init__(self, disease: str, backend: Optional[str] = None):
         self.disease = disease
+        self.backend = backend or MODEL_BACKEND
+        if self.backend not in MODEL_BACKENDS:
+            raise ValueError(f"Unknown model backend {self.backend!r}; expected one of {MODEL_BACKENDS}")
+        # horizon (weeks ahead) -> fitted pipeline
+        self.models: Dict[int, Pipeline] = {}
+        self.is_trained = False
+        self.feature_names = []
+        # Metrics of the default horizon (returned by predict_full) and of every horizon
+        self.metrics = {}
+        self.horizon_metrics: Dict[int, Dict[str, float]] = {}
+        # Last labelled week_start per horizon, and warm-start rounds since the last full fit
+        self.trained_through: Dict[int, date] = {}
+        self.incremental_rounds = 0
+        # Changes whenever the fitted trees do; part of the attribution cache key
+        self.version: Optional[str] = None
+        self._compiled = {}
+        # Neighbour index of the last data load, used by _feature_engineering
+        self.neighbours: Optional[NeighbourIndex] = None
+
+    def _build_pipeline(self, params: Optional[Dict[str, Any]] = None) -> Pipeline:
+        """
+        Fresh pipeline for this backend. Classifier settings come from, in
+        order of precedence: `params`, the tuning registry, the defaults below.
+        """
+        pipeline = self._default_pipeline()
+        overrides = tuned_params(self.disease, self.backend) if params is None else params
+        if overrides:
+            pipeline.named_steps['classifier'].set_params(**overrides)
+        return pipeline
+
+    def _default_pipeline(self) -> Pipeline:
+        if self.backend == "hgb":
+            # No imputer/scaler: trees are scale-invariant and NaN gets its own split direction
+            return Pipeline([
+                ('classifier', HistGradientBoostingClassifier(
+                    max_iter=300, learning_rate=0.1, max_leaf_nodes=15,
+                    early_stopping=True, validation_fraction=0.1, n_iter_no_change=10,
+                    random_state=42,
+                ))
+            ])
         # Advanced model: Gradient Boosting Pipeline
-        self.model = Pipeline([
+        return Pipeline([
             ('imputer', SimpleImputer(strategy='median')),
             ('scaler', StandardScaler()),
             ('classifier', GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42))
         ])
-        self.is_trained = False
-        self.feature_names = []
-        self.metrics = {}
 
-    def _load_raw_data(self, db: Session) -> pd.DataFrame:
+    @property
+    def model_path(self) -> str:
+        return os.path.join(MODEL_DIR, f"{self.disease}_model.joblib")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(MODEL_DIR, f"{self.disease}_model.json")
+
+    def _load_raw_data(self, db: Session, location_ids: Optional[List[int]] = None, since: Optional[date] = None) -> pd.DataFrame:
+        self.neighbours = get_neighbour_index(db)
         # Fetch Locations to map state/lga <-> id
-        locs = db.query(models.Location).all()
-        rev_loc_map = {(l.state, l.lga): l.id for l in locs}
+        loc_q = db.query(models.Location.id, models.Location.state, models.Location.lga)
+        if location_ids is not None:
+            loc_q = loc_q.filter(models.Location.id.in_(location_ids))
+        rev_loc_map = {(l.state, l.lga): l.id for l in loc_q}
+        
+        # Select plain columns rather than ORM objects to keep large loads cheap
+        env_q = db.query(
+            models.EnvMetric.location_id,
+            models.EnvMetric.week_start,
+            models.EnvMetric.rainfall_mm,
+            models.EnvMetric.temperature_c,
+            models.EnvMetric.humidity_pct,
+            models.EnvMetric.flood_risk,
+        )
+        dis_q = db.query(
+            models.DiseaseHistory.location_id,
+            models.DiseaseHistory.week_start,
+            models.DiseaseHistory.cholera_cases,
+            models.DiseaseHistory.malaria_cases,
+            models.DiseaseHistory.lassa_cases,
+            models.DiseaseHistory.meningitis_cases,
+        )
+        agg_q = db.query(
+            models.LGAWeeklyAggregate.state,
+            models.LGAWeeklyAggregate.lga,
+            models.LGAWeeklyAggregate.week_start_date,
+            models.LGAWeeklyAggregate.total_fever_cases,
+            models.LGAWeeklyAggregate.total_respiratory_cases,
+            models.LGAWeeklyAggregate.total_diarrhea_cases,
+            models.LGAWeeklyAggregate.total_admissions,
+            models.LGAWeeklyAggregate.avg_bed_occupancy,
+        )
+        if location_ids is not None:
+            env_q = env_q.filter(models.EnvMetric.location_id.in_(location_ids))
+            dis_q = dis_q.filter(models.DiseaseHistory.location_id.in_(location_ids))
+            agg_q = agg_q.filter(models.LGAWeeklyAggregate.lga.in_({lga for _, lga in rev_loc_map}))
+        if since is not None:
+            env_q = env_q.filter(models.EnvMetric.week_start >= since)
+            dis_q = dis_q.filter(models.DiseaseHistory.week_start >= since)
+            agg_q = agg_q.filter(models.LGAWeeklyAggregate.week_start_date >= since)
         
-        env = db.query(models.EnvMetric).all()
-        dis = db.query(models.DiseaseHistory).all()
-        agg = db.query(models.LGAWeeklyAggregate).all()
+        env = env_q.all()
+        dis = dis_q.all()
+        agg = agg_q.all()
+        record_rows("env_metrics", len(env))
+        record_rows("disease_history", len(dis))
+        record_rows("lga_weekly_aggregates", len(agg))
 
         if not env or not agg or not dis:
             return pd.DataFrame()
@@ -95,7 +233,27 @@ class RiskModel:
         df = df.sort_values(['location_id', 'week_start']).reset_index(drop=True)
         return df
 
-    def _feature_engineering(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _load_training_frame(self, db: Session) -> pd.DataFrame:
+        # Reuse the local Parquet snapshot while the source tables are unchanged
+        watermark = data_watermark(db)
+        df = load_snapshot(watermark)
+        if df is not None:
+            self.neighbours = get_neighbour_index(db)
+            return df
+        df = self._load_raw_data(db)
+        if not df.empty:
+            save_snapshot(watermark, df)
+        return df
+
+    def _feature_engineering(self, df: pd.DataFrame, neighbours: Optional[NeighbourIndex] = None) -> pd.DataFrame:
+        """
+        neighbours defaults to the index captured by the last
+        _load_raw_data/_load_training_frame call on this model.
+        """
+        neighbours = neighbours or self.neighbours
+        if neighbours is None:
+            raise ValueError("No neighbour index; load data through this model or pass neighbours")
+
         # 1. Handle missing values
         df = df.sort_values(['location_id', 'week_start'])
         
@@ -124,6 +282,10 @@ class RiskModel:
                 for lag in lags:
                     df[f'{col}_lag{lag}'] = df.groupby('location_id')[col].shift(lag)
 
+        # 3b. Spatial lags: neighbouring LGAs' cases and fever reports last week
+        spatial_cols = [c for c in (disease_col, 'fever_reports') if c in df.columns]
+        df = pd.concat([df, neighbours.lagged_means(df, spatial_cols)], axis=1)
+
         # 4. Create Rolling Features (4-week average)
         df[f'{disease_col}_rolling_4w'] = df.groupby('location_id')[disease_col].transform(
             lambda x: x.shift(1).rolling(window=4).mean()
@@ -133,108 +295,344 @@ class RiskModel:
         df[f'{disease_col}_growth'] = df.groupby('location_id')[disease_col].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
         df['fever_growth'] = df.groupby('location_id')['fever_reports'].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
 
-        # 6. Target Variable: Outbreak in 2 weeks (t+2)
+        # 6. Outbreak flag for the current week: cases above the LGA's rolling 75th percentile
         df['threshold'] = df.groupby('location_id')[disease_col].transform(
             lambda x: x.rolling(window=26, min_periods=5).quantile(0.75)
         )
         df['threshold'] = df['threshold'].clip(lower=5)
         df['is_outbreak'] = (df[disease_col] > df['threshold']).astype(int)
-        df['target'] = df.groupby('location_id')['is_outbreak'].shift(-2)
+
+        # 7. Targets: outbreak h weeks ahead, all horizons from one grouping.
+        # Rows keep NaN for horizons whose future week has not been observed yet.
+        outbreak = df.groupby('location_id')['is_outbreak']
+        targets = pd.DataFrame({col: outbreak.shift(-h) for h, col in zip(HORIZONS, TARGET_COLUMNS)}, index=df.index)
+        df = pd.concat([df, targets], axis=1)
         
-        df = df.dropna(subset=['target'])
+        df = df.dropna(subset=TARGET_COLUMNS, how='all')
         
         return df
 
-    def train(self, db: Session):
-        raw_df = self._load_raw_data(db)
-        if raw_df.empty:
-            print("No data to train")
-            return
+    def _feature_columns(self, df: pd.DataFrame) -> List[str]:
+        exclude_cols = ['location_id', 'week_start', 'threshold', 'is_outbreak'] + TARGET_COLUMNS
+        return [c for c in df.columns if c not in exclude_cols and df[c].dtype in [np.float64, np.int64]]
 
-        df = self._feature_engineering(raw_df)
-        
-        exclude_cols = ['location_id', 'week_start', 'threshold', 'is_outbreak', 'target']
-        feature_cols = [c for c in df.columns if c not in exclude_cols and df[c].dtype in [np.float64, np.int64]]
-        self.feature_names = feature_cols
+    def _score(self, pipeline: Pipeline, X: np.ndarray, y: np.ndarray) -> Dict[str, float]:
+        y_pred = pipeline.predict(X)
+        y_prob = pipeline.predict_proba(X)[:, 1]
+        return {
+            "auc": roc_auc_score(y, y_prob) if len(np.unique(y)) > 1 else 0.0,
+            "precision": precision_score(y, y_pred, zero_division=0),
+            "recall": recall_score(y, y_pred, zero_division=0),
+            "f1": f1_score(y, y_pred, zero_division=0)
+        }
 
-        X = df[feature_cols].values
-        y = df['target'].values
+    @staticmethod
+    def _n_trees(pipeline: Pipeline) -> int:
+        clf = pipeline.named_steps['classifier']
+        return clf.n_iter_ if isinstance(clf, HistGradientBoostingClassifier) else clf.n_estimators
 
-        if len(np.unique(y)) < 2:
-            print("Not enough classes to train")
-            return
+    @staticmethod
+    def _transform(pipeline: Pipeline, X: np.ndarray) -> np.ndarray:
+        # Input to the classifier step; the hgb pipeline has no preprocessing
+        return pipeline[:-1].transform(X) if len(pipeline.steps) > 1 else X
 
-        tscv = TimeSeriesSplit(n_splits=3)
+    def cross_validate(self, X: np.ndarray, y: np.ndarray, n_splits: int = 3,
+                       params: Optional[Dict[str, Any]] = None) -> List[Dict[str, float]]:
+        """
+        Fits a fresh pipeline on each TimeSeriesSplit fold and scores the
+        following block. Returns per-fold metrics (with fit time).
+        """
+        folds = []
+        pipeline = self._build_pipeline(params)
+        tscv = TimeSeriesSplit(n_splits=n_splits)
         for train_index, test_index in tscv.split(X):
             X_train, X_test = X[train_index], X[test_index]
             y_train, y_test = y[train_index], y[test_index]
-            self.model.fit(X_train, y_train)
-            y_pred = self.model.predict(X_test)
-            y_prob = self.model.predict_proba(X_test)[:, 1]
-            self.metrics = {
-                "auc": roc_auc_score(y_test, y_prob) if len(np.unique(y_test)) > 1 else 0.0,
-                "precision": precision_score(y_test, y_pred, zero_division=0),
-                "recall": recall_score(y_test, y_pred, zero_division=0),
-                "f1": f1_score(y_test, y_pred, zero_division=0)
-            }
+            started = time.perf_counter()
+            pipeline.fit(X_train, y_train)
+            fold = self._score(pipeline, X_test, y_test)
+            fold["fit_seconds"] = time.perf_counter() - started
+            folds.append(fold)
+        return folds
+
+    @instrument("risk_model.train")
+    def train(self, db: Session) -> Dict[str, Any]:
+        raw_df = self._load_training_frame(db)
+        if raw_df.empty:
+            print("No data to train")
+            return {"mode": "full", "status": "no_data"}
+
+        df = self._feature_engineering(raw_df)
+        feature_cols = self._feature_columns(df)
+        X_all = df[feature_cols].values
+
+        fitted, horizon_metrics, trained_through = {}, {}, {}
+        for h, col in zip(HORIZONS, TARGET_COLUMNS):
+            labelled = df[col].notna().values
+            X, y = X_all[labelled], df[col].values[labelled]
+            if len(np.unique(y)) < 2:
+                print(f"Not enough classes to train the t+{h} model")
+                continue
+
+            folds = self.cross_validate(X, y)
+            horizon_metrics[h] = {k: v for k, v in folds[-1].items() if k != "fit_seconds"}
 
-        self.model.fit(X, y)
+            pipeline = self._build_pipeline()
+            pipeline.fit(X, y)
+            fitted[h] = pipeline
+            trained_through[h] = df.loc[labelled, 'week_start'].max().date()
+
+        if not fitted:
+            return {"mode": "full", "status": "single_class"}
+
+        self.models = fitted
+        self.feature_names = feature_cols
+        self.horizon_metrics = horizon_metrics
+        self.metrics = horizon_metrics.get(DEFAULT_HORIZON, {})
+        self.trained_through = trained_through
+        self.incremental_rounds = 0
         self.is_trained = True
-        
-        model_path = os.path.join(MODEL_DIR, f"{self.disease}_model.joblib")
-        joblib.dump(self.model, model_path)
-        print(f"Model trained and saved to {model_path}. Metrics: {self.metrics}")
+        self._mark_changed()
 
-    def load(self):
-        model_path = os.path.join(MODEL_DIR, f"{self.disease}_model.joblib")
-        if os.path.exists(model_path):
-            self.model = joblib.load(model_path)
-            self.is_trained = True
-            
-    def predict_full(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        self._save()
+        save_training_matrix(self.disease, df[['location_id', 'week_start'] + feature_cols + TARGET_COLUMNS])
+        print(f"Model trained and saved to {self.model_path}. Metrics: {self.metrics}")
+        return {"mode": "full", "status": "trained", "rows": len(df), "horizons": sorted(fitted)}
+
+    def _full_retrain_reason(self, matrix: Optional[pd.DataFrame]) -> Optional[str]:
+        if not self.is_trained or not self.trained_through or not self.feature_names:
+            return "no_trained_model"
+        if matrix is None:
+            return "no_cached_matrix"
+        if list(matrix.columns) != ['location_id', 'week_start'] + self.feature_names + TARGET_COLUMNS:
+            return "schema_changed"
+        if self.backend != self._saved_backend():
+            return "backend_changed"
+        if self._params_changed():
+            return "params_changed"
+        if self.incremental_rounds >= FULL_RETRAIN_EVERY:
+            return "periodic"
+        # hgb is refitted each round (see train_incremental), so only gbc ensembles grow
+        if self.backend == "gbc" and any(self._n_trees(p) + WARM_START_ESTIMATORS > MAX_ESTIMATORS for p in self.models.values()):
+            return "estimator_cap"
+        return None
+
+    @instrument("risk_model.train_incremental")
+    def train_incremental(self, db: Session) -> Dict[str, Any]:
+        """
+        Adds WARM_START_ESTIMATORS trees per horizon (gbc), fitted on the
+        cached training matrix plus the rows labelled since the last fit; hgb
+        models are refitted on that matrix, as HGB can't be warm-started on new
+        data. Only recent weeks (and CONTEXT_WEEKS of history for their lags
+        and thresholds) are loaded and engineered. Preprocessing stays frozen so
+        existing trees keep seeing the same inputs. Falls back to train() when
+        there is no usable state, the feature set changed, or a periodic full
+        refit is due.
+        """
         if not self.is_trained:
             self.load()
-            if not self.is_trained:
-                return {"risk_score": 0.0, "risk_level": "Low", "top_factors": ["Model not trained"]}
+        matrix = load_training_matrix(self.disease)
+        reason = self._full_retrain_reason(matrix)
+        if reason:
+            return {**self.train(db), "reason": reason}
+
+        # Rows after the least-advanced horizon may have gained longer-horizon
+        # labels since the last fit, so they are re-engineered and replaced
+        cutoff = min(self.trained_through.values())
+        raw_df = self._load_raw_data(db, since=cutoff - timedelta(weeks=CONTEXT_WEEKS))
+        if raw_df.empty:
+            return {"mode": "incremental", "status": "up_to_date", "new_rows": {}}
+        df = self._feature_engineering(raw_df)
+        if self._feature_columns(df) != self.feature_names:
+            return {**self.train(db), "reason": "schema_changed"}
+
+        refreshed = df[df['week_start'] > pd.Timestamp(cutoff)]
+        combined = pd.concat(
+            [matrix[matrix['week_start'] <= pd.Timestamp(cutoff)], refreshed[list(matrix.columns)]],
+            ignore_index=True,
+        )
+        X_all = combined[self.feature_names].values
+
+        new_rows = {}
+        for h, pipeline in list(self.models.items()):
+            target = combined[f"target_h{h}"]
+            labelled = target.notna().values
+            fresh = labelled & (combined['week_start'] > pd.Timestamp(self.trained_through[h])).values
+            y = target.values[labelled]
+            if not fresh.any() or len(np.unique(y)) < 2:
+                continue
+
+            # Forward evaluation: the current model has never seen these rows
+            y_new = target.values[fresh]
+            if len(np.unique(y_new)) > 1:
+                self.horizon_metrics[h] = self._score(pipeline, X_all[fresh], y_new)
+
+            clf = pipeline.named_steps['classifier']
+            if isinstance(clf, HistGradientBoostingClassifier):
+                # HGB re-bins its inputs on every fit, which would move the split
+                # thresholds under the existing trees, and early stopping would cap
+                # the added ones; it is refitted on the combined matrix instead
+                pipeline = self._build_pipeline()
+                pipeline.fit(X_all[labelled], y)
+                self.models[h] = pipeline
+            else:
+                clf.set_params(warm_start=True, n_estimators=clf.n_estimators + WARM_START_ESTIMATORS)
+                clf.fit(self._transform(pipeline, X_all[labelled]), y)
+
+            self.trained_through[h] = combined.loc[labelled, 'week_start'].max().date()
+            new_rows[h] = int(fresh.sum())
+
+        if not new_rows:
+            return {"mode": "incremental", "status": "up_to_date", "new_rows": {}}
+
+        self.metrics = self.horizon_metrics.get(DEFAULT_HORIZON, self.metrics)
+        self.incremental_rounds += 1
+        self._mark_changed()
+        self._save()
+        save_training_matrix(self.disease, combined)
+        trees = {h: self._n_trees(p) for h, p in self.models.items()}
+        print(f"Model updated with {new_rows} new rows per horizon ({trees} trees). Metrics: {self.metrics}")
+        return {"mode": "incremental", "status": "trained", "new_rows": new_rows, "n_estimators": trees}
+
+    def _params_changed(self) -> bool:
+        tuned = tuned_params(self.disease, self.backend)
+        budget = BUDGET_PARAMS[self.backend]
+        for pipeline in self.models.values():
+            current = pipeline.named_steps['classifier'].get_params()
+            if any(current.get(k) != v for k, v in tuned.items() if k != budget):
+                return True
+        return False
+
+    def _mark_changed(self):
+        self.version = uuid.uuid4().hex[:12]
+        self._compiled = {}
+
+    def _saved_backend(self) -> str:
+        clf = next(iter(self.models.values())).named_steps['classifier']
+        return "hgb" if isinstance(clf, HistGradientBoostingClassifier) else "gbc"
+
+    def _save(self):
+        joblib.dump(self.models, self.model_path)
+        with open(self.state_path, "w") as f:
+            json.dump({
+                "backend": self.backend,
+                "feature_names": self.feature_names,
+                "metrics": self.metrics,
+                "horizon_metrics": self.horizon_metrics,
+                "trained_through": {h: d.isoformat() for h, d in self.trained_through.items()},
+                "incremental_rounds": self.incremental_rounds,
+                "version": self.version,
+            }, f)
+
+    def load(self):
+        if os.path.exists(self.model_path):
+            saved = joblib.load(self.model_path)
+            # Files from before multi-horizon models hold a single t+2 pipeline
+            self.models = saved if isinstance(saved, dict) else {DEFAULT_HORIZON: saved}
+            self.is_trained = True
+            self.version = f"mtime-{os.path.getmtime(self.model_path):.0f}"
+            self._compiled = {}
+        # Models saved before the state file existed still load; they just retrain in full
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.feature_names = state.get("feature_names", [])
+            self.metrics = state.get("metrics", {})
+            self.horizon_metrics = self._by_horizon(state.get("horizon_metrics")) or {DEFAULT_HORIZON: self.metrics}
+            self.trained_through = {
+                h: date.fromisoformat(d) for h, d in self._by_horizon(state.get("trained_through")).items()
+            }
+            self.incremental_rounds = state.get("incremental_rounds", 0)
+            self.version = state.get("version") or self.version
+
+    @staticmethod
+    def _by_horizon(value) -> Dict[int, Any]:
+        # JSON object keys come back as strings; single-horizon state is the t+2 model's
+        if not value:
+            return {}
+        if isinstance(value, dict):
+            return {int(h): v for h, v in value.items()}
+        return {DEFAULT_HORIZON: value}
 
-        input_df = pd.DataFrame([features])
+    def _feature_matrix(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        input_df = pd.DataFrame(rows)
         for col in self.feature_names:
             if col not in input_df.columns:
                 input_df[col] = 0.0
-                
-        X_pred = input_df[self.feature_names].values
-        risk_score = self.model.predict_proba(X_pred)[0][1]
-        
-        if risk_score >= 0.7:
-            level = "High"
-        elif risk_score >= 0.3:
-            level = "Medium"
-        else:
-            level = "Low"
-            
-        clf = self.model.named_steps['classifier']
-        importances = clf.feature_importances_
-        indices = np.argsort(importances)[::-1]
-        
-        top_factors = []
-        for i in range(min(3, len(indices))):
-            idx = indices[i]
-            feat_name = self.feature_names[idx]
-            importance = importances[idx]
-            if importance > 0.01:
-                readable = feat_name.replace("_", " ").title()
-                val = features.get(feat_name, 0)
-                top_factors.append(f"{readable} ({val:.1f})")
-                
+        return input_df[self.feature_names].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def explain_batch(self, X: np.ndarray, horizon: int, k: int = 3) -> List[List[str]]:
+        """
+        Top-k risk drivers for every row of a raw feature matrix, from per-row
+        path attributions. Rows already explained under this model version
+        come from the attribution cache; the rest are walked in one batch.
+        """
+        keys = [(self.disease, self.version, horizon, h) for h in row_hashes(X)]
+        contributions, misses = split_cached(keys)
+        if misses:
+            pipeline = self.models[horizon]
+            ensemble = self._compiled.get(horizon)
+            if ensemble is None:
+                ensemble = self._compiled[horizon] = compile_ensemble(pipeline)
+            computed = path_attributions(ensemble, self._transform(pipeline, X[misses]))
+            for i, row in zip(misses, computed):
+                attribution_cache.set(keys[i], row)
+                contributions[i] = row
+        return [format_factors(contributions[i], self.feature_names, X[i], k) for i in range(len(X))]
+
+    def _ensure_loaded(self) -> bool:
+        if not self.is_trained:
+            self.load()
+        return self.is_trained
+
+    def predict_batch(self, rows: List[Dict[str, Any]], horizons: Optional[List[int]] = None) -> Dict[int, np.ndarray]:
+        """
+        Scores many feature vectors for several horizons. The feature matrix is
+        built once and shared; returns horizon -> risk scores aligned with rows.
+        """
+        if not rows or not self._ensure_loaded():
+            return {}
+        X = self._feature_matrix(rows)
+        return {
+            h: self.models[h].predict_proba(X)[:, 1]
+            for h in (horizons or sorted(self.models)) if h in self.models
+        }
+
+    def score_batch(self, rows: List[Dict[str, Any]], horizons: Optional[List[int]] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        predict_batch plus risk level and drivers per row: horizon -> one
+        {"risk_score", "risk_level", "top_factors"} dict per row.
+        """
+        if not rows or not self._ensure_loaded():
+            return {}
+        X = self._feature_matrix(rows)
+        results = {}
+        for h in (horizons or sorted(self.models)):
+            if h not in self.models:
+                continue
+            scores = self.models[h].predict_proba(X)[:, 1]
+            results[h] = [
+                {"risk_score": float(score), "risk_level": risk_category(score), "top_factors": factors}
+                for score, factors in zip(scores, self.explain_batch(X, h))
+            ]
+        return results
+
+    def predict_horizons(self, features: Dict[str, Any], horizons: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
         return {
-            "risk_score": float(risk_score),
-            "risk_level": level,
-            "top_factors": top_factors,
-            "metrics": self.metrics
+            h: {**scored[0], "metrics": self.horizon_metrics.get(h, {})}
+            for h, scored in self.score_batch([features], horizons).items()
         }
 
-    def predict_score(self, features: Dict[str, float]) -> float:
-        res = self.predict_full(features)
+    @instrument("risk_model.predict_full")
+    def predict_full(self, features: Dict[str, Any], weeks_ahead: int = DEFAULT_HORIZON) -> Dict[str, Any]:
+        if not self._ensure_loaded():
+            return {"risk_score": 0.0, "risk_level": "Low", "top_factors": ["Model not trained"]}
+        if weeks_ahead not in self.models:
+            raise ValueError(f"No t+{weeks_ahead} model; trained horizons are {sorted(self.models)}")
+        return self.predict_horizons(features, [weeks_ahead])[weeks_ahead]
+
+    def predict_score(self, features: Dict[str, float], weeks_ahead: int = DEFAULT_HORIZON) -> float:
+        res = self.predict_full(features, weeks_ahead)
         return res["risk_score"]
 
 def risk_category(score: float) -> str:
@@ -244,68 +642,113 @@ def risk_category(score: float) -> str:
         return "Medium"
     return "Low"
 
-def build_feature_vector(db: Session, location_id: int, week_start: date) -> Dict[str, float]:
-    start_date = week_start - timedelta(weeks=5)
-    
-    # Resolve location
-    loc = db.query(models.Location).filter(models.Location.id == location_id).first()
-    if not loc:
-        return {}
+# Weeks of history before the base week that the lag and rolling features read
+FEATURE_WINDOW_WEEKS = 5
+# Above this many LGAs a window query scans the whole week range instead of an IN list
+WINDOW_IN_FILTER_MAX = 500
 
-    def fetch_window(model):
-        return db.query(model).filter(
-            model.location_id == location_id,
+def _load_feature_window(db: Session, week_start: date, location_ids: List[int], locations: Dict[int, Tuple[str, str]]) -> pd.DataFrame:
+    """
+    One row per (location, week) in the window ending at week_start, with the
+    env, disease and facility-aggregate columns merged side by side.
+    """
+    start_date = week_start - timedelta(weeks=FEATURE_WINDOW_WEEKS)
+    ids = set(location_ids)
+    narrow = len(ids) <= WINDOW_IN_FILTER_MAX
+
+    def fetch_window(model, columns):
+        q = db.query(model.location_id, model.week_start, *[getattr(model, c) for c in columns]).filter(
             model.week_start >= start_date,
             model.week_start <= week_start
-        ).all()
-    
-    def fetch_agg_window():
-        return db.query(models.LGAWeeklyAggregate).filter(
-            models.LGAWeeklyAggregate.state == loc.state,
-            models.LGAWeeklyAggregate.lga == loc.lga,
-            models.LGAWeeklyAggregate.week_start_date >= start_date,
-            models.LGAWeeklyAggregate.week_start_date <= week_start
-        ).all()
-        
-    env = fetch_window(models.EnvMetric)
-    dis = fetch_window(models.DiseaseHistory)
-    agg = fetch_agg_window()
-    
-    data = []
-    dates = set()
-    for l in [env, dis]:
-        for i in l:
-            dates.add(i.week_start)
-    for a in agg:
-        dates.add(a.week_start_date)
-    
-    sorted_dates = sorted(list(dates))
-    if not sorted_dates:
+        )
+        if narrow:
+            q = q.filter(model.location_id.in_(ids))
+        return pd.DataFrame(q.all(), columns=["location_id", "week_start"] + columns)
+
+    env = fetch_window(models.EnvMetric, ENV_COLUMNS)
+    dis = fetch_window(models.DiseaseHistory, DISEASE_COLUMNS)
+
+    A = models.LGAWeeklyAggregate
+    q = db.query(
+        A.state, A.lga, A.week_start_date, A.total_fever_cases, A.total_respiratory_cases,
+        A.total_diarrhea_cases, A.total_admissions, A.avg_bed_occupancy
+    ).filter(A.week_start_date >= start_date, A.week_start_date <= week_start)
+    if narrow:
+        q = q.filter(A.lga.in_({locations[i][1] for i in ids}))
+    by_name = {locations[i]: i for i in ids}
+    agg = pd.DataFrame([
+        {
+            "location_id": by_name[(a.state, a.lga)],
+            "week_start": a.week_start_date,
+            "fever_reports": a.total_fever_cases,
+            "cough_reports": a.total_respiratory_cases,
+            "diarrhea_reports": a.total_diarrhea_cases,
+            "vomiting_reports": 0, # Defaulted to 0
+            "admissions": a.total_admissions,
+            "bed_occupancy": a.avg_bed_occupancy,
+        }
+        for a in q.all() if (a.state, a.lga) in by_name
+    ])
+    record_rows("feature_window", len(env) + len(dis) + len(agg))
+
+    frames = [f[f["location_id"].isin(ids)] for f in (env, dis, agg) if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = frames[0]
+    for f in frames[1:]:
+        df = df.merge(f, on=["location_id", "week_start"], how="outer")
+    return df
+
+@instrument("build_feature_vectors")
+def build_feature_vectors(db: Session, base_weeks: Dict[int, date]) -> Dict[int, Dict[str, float]]:
+    """
+    Feature vectors for many LGAs at once, each as of its own base week
+    (location_id -> week_start). Windows are loaded with three queries per
+    distinct base week and the lags are computed per LGA in one frame, so
+    scoring every LGA costs a handful of queries rather than four per LGA.
+    Each window also covers the LGAs' neighbours for the spatial lags.
+    Windows come from the in-memory feature store when it holds them, so
+    the usual request runs no queries here at all.
+    """
+    if not base_weeks:
         return {}
-    
-    records = []
-    for d in sorted_dates:
-        rec = {"location_id": location_id, "week_start": d}
-        e = next((x for x in env if x.week_start == d), None)
-        c = next((x for x in agg if x.week_start_date == d), None)
-        dh = next((x for x in dis if x.week_start == d), None)
-        
-        if e:
-            rec.update({k: getattr(e, k) for k in ["rainfall_mm", "temperature_c", "humidity_pct", "flood_risk"] if getattr(e, k) is not None})
-        if c:
-            rec.update({
-                "fever_reports": c.total_fever_cases,
-                "cough_reports": c.total_respiratory_cases,
-                "diarrhea_reports": c.total_diarrhea_cases,
-                "vomiting_reports": 0, # Defaulted to 0
-                "admissions": c.total_admissions,
-                "bed_occupancy": c.avg_bed_occupancy
-            })
-        if dh:
-            rec.update({k: getattr(dh, k) for k in ["cholera_cases", "malaria_cases", "lassa_cases", "meningitis_cases"] if getattr(dh, k) is not None})
-        records.append(rec)
-        
-    df = pd.DataFrame(records).fillna(0)
+    store = get_store(db)
+    if store is not None:
+        rows = [(lid, *loc) for lid, loc in store.locations.items()]
+    else:
+        # All coordinates are needed for the neighbour index anyway
+        rows = db.query(models.Location.id, models.Location.state, models.Location.lga,
+                        models.Location.latitude, models.Location.longitude).all()
+    locations = {lid: (state, lga) for lid, state, lga, _, _ in rows}
+    neighbours = index_for((lid, lat, lon) for lid, _, _, lat, lon in rows)
+
+    by_week = defaultdict(list)
+    for location_id, week_start in base_weeks.items():
+        if location_id in locations:
+            by_week[week_start].append(location_id)
+    frames = []
+    for week, ids in by_week.items():
+        window_ids = list(set(ids) | neighbours.neighbours_of(ids))
+        window = store.window(week, window_ids, FEATURE_WINDOW_WEEKS) if store is not None else None
+        if window is None:
+            window = _load_feature_window(db, week, window_ids, locations)
+        if window.empty:
+            continue
+        window = window.fillna(0)
+        # Same spatial lags as RiskModel._feature_engineering, for every disease
+        for col in DISEASE_COLUMNS + ['fever_reports']:
+            if col not in window.columns:
+                window[col] = 0
+        window = pd.concat([window, neighbours.lagged_means(window, DISEASE_COLUMNS + ['fever_reports'])], axis=1)
+        frames.append(window[window['location_id'].isin(ids)])
+    if not frames:
+        return {}
+
+    df = pd.concat(frames, ignore_index=True)
+    # Windows may differ in columns; spatial lags stay NaN where no neighbour reported
+    raw_cols = [c for c in df.columns if not c.startswith("nbr_")]
+    df[raw_cols] = df[raw_cols].fillna(0)
+    df = df.sort_values(["location_id", "week_start"], kind="stable").reset_index(drop=True)
     
     # Feature Engineering
     df['week_start'] = pd.to_datetime(df['week_start'])
@@ -313,29 +756,31 @@ def build_feature_vector(db: Session, location_id: int, week_start: date) -> Dic
     df['month'] = df['week_start'].dt.month
     df['is_rainy_season'] = df['month'].between(4, 10).astype(int)
     
-    diseases = ["cholera_cases", "malaria_cases", "lassa_cases", "meningitis_cases"]
-    cols_to_lag = diseases + ['rainfall_mm', 'fever_reports']
+    cols_to_lag = DISEASE_COLUMNS + ['rainfall_mm', 'fever_reports']
     if 'admissions' in df.columns:
         cols_to_lag.append('admissions')
     
     for col in cols_to_lag:
         if col not in df.columns:
             df[col] = 0
-            
+    
+    by_loc = df.groupby('location_id', sort=False)
     for col in cols_to_lag:
-        if col in df.columns:
-            for lag in [1, 2, 3]:
-                df[f'{col}_lag{lag}'] = df[col].shift(lag)
+        for lag in [1, 2, 3]:
+            df[f'{col}_lag{lag}'] = by_loc[col].shift(lag)
             
-    for d_col in diseases:
-        df[f'{d_col}_rolling_4w'] = df[d_col].shift(1).rolling(window=4).mean()
-        df[f'{d_col}_growth'] = df[d_col].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
+    for d_col in DISEASE_COLUMNS:
+        # lag1 is NaN on each LGA's first week, so a 4-row window that reaches
+        # into the previous LGA is NaN, as it would be for that LGA alone
+        df[f'{d_col}_rolling_4w'] = df[f'{d_col}_lag1'].rolling(window=4).mean()
+        df[f'{d_col}_growth'] = by_loc[d_col].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
         
-    df['fever_growth'] = df['fever_reports'].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
+    df['fever_growth'] = by_loc['fever_reports'].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
     
-    # Extract last row
-    if df.empty:
-        return {}
-        
-    last_row = df.iloc[-1]
-    return last_row.to_dict()
+    # Last row per LGA is its base week
+    last_rows = df.groupby('location_id', sort=False).tail(1)
+    return {int(row['location_id']): row for row in last_rows.to_dict('records')}
+
+@instrument("build_feature_vector")
+def build_feature_vector(db: Session, location_id: int, week_start: date) -> Dict[str, float]:
+    return build_feature_vectors(db, {location_id: week_start}).get(location_id, {})
@@ -0,0 +1,129 @@
+"""
+Neighbouring-LGA index for spatial-lag features.
+
+Each Location is linked to its k nearest LGAs (great-circle distance,
+BallTree with the haversine metric) that lie within a radius. Links are
+weighted by inverse distance, and each row is normalised so the weights
+sum to one. The weights form a sparse n x n matrix W. The weighted
+neighbour mean of a column for every LGA and week is then one sparse
+product, W @ values, with no per-location queries.
+
+The index is rebuilt whenever the Location coordinates change. Every
+lookup hashes the (id, lat, lon) rows it was given and reuses the index
+only while that fingerprint is unchanged.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.neighbors import BallTree
+from sqlalchemy.orm import Session
+from .. import models
+
+NEIGHBOUR_K = int(os.getenv("PHIP_NEIGHBOUR_K", "5"))
+NEIGHBOUR_RADIUS_KM = float(os.getenv("PHIP_NEIGHBOUR_RADIUS_KM", "100"))
+EARTH_RADIUS_KM = 6371.0
+# Closer neighbours than this get the same weight, so co-located LGAs don't dominate
+MIN_DISTANCE_KM = 1.0
+
+def neighbour_column(col: str, lag: int = 1) -> str:
+    return f"nbr_{col}_lag{lag}"
+
+class NeighbourIndex:
+    def __init__(self, location_ids: List[int], lats: List[float], lons: List[float],
+                 k: int = NEIGHBOUR_K, radius_km: float = NEIGHBOUR_RADIUS_KM):
+        self.location_ids = np.asarray(location_ids, dtype=np.int64)
+        self.position = {int(lid): i for i, lid in enumerate(self.location_ids)}
+        n = len(self.location_ids)
+        rows, cols, weights = [], [], []
+        if n > 1 and k > 0:
+            coords = np.radians(np.column_stack([lats, lons]).astype(np.float64))
+            # k + 1 because each point is its own nearest neighbour
+            dist, ind = BallTree(coords, metric="haversine").query(coords, k=min(k + 1, n))
+            dist_km = dist * EARTH_RADIUS_KM
+            for i in range(n):
+                keep = (ind[i] != i) & (dist_km[i] <= radius_km)
+                nbrs, d = ind[i][keep][:k], dist_km[i][keep][:k]
+                rows += [i] * len(nbrs)
+                cols += nbrs.tolist()
+                weights += (1.0 / np.maximum(d, MIN_DISTANCE_KM)).tolist()
+        W = sparse.csr_matrix((weights, (rows, cols)), shape=(n, n))
+        totals = np.asarray(W.sum(axis=1)).ravel()
+        # Row-normalise; LGAs with no neighbour in range keep an empty row
+        self.weights = sparse.diags(np.divide(1.0, totals, out=np.zeros(n), where=totals > 0)) @ W
+        self.weights = self.weights.tocsr()
+
+    def neighbours_of(self, location_ids: Iterable[int]) -> Set[int]:
+        out = set()
+        for lid in location_ids:
+            i = self.position.get(int(lid))
+            if i is None:
+                continue
+            row = self.weights.indices[self.weights.indptr[i]:self.weights.indptr[i + 1]]
+            out.update(int(self.location_ids[j]) for j in row)
+        return out
+
+    def lagged_means(self, df: pd.DataFrame, columns: List[str], lag: int = 1) -> pd.DataFrame:
+        """
+        Weighted mean of each column over every row's neighbours, `lag` weeks
+        before the row's week_start, as nbr_{col}_lag{lag} columns aligned with
+        df. Neighbours without a row that week are left out of the mean; NaN
+        when none has one (or the LGA has no neighbours in the index).
+        """
+        n = len(self.location_ids)
+        pos = df['location_id'].map(self.position).to_numpy(dtype=np.float64, na_value=np.nan)
+        known = ~np.isnan(pos)
+        pos = np.where(known, pos, 0).astype(np.intp)
+
+        week_values = pd.to_datetime(df['week_start']).to_numpy()
+        weeks, week_idx = np.unique(week_values, return_inverse=True)
+        # Column of the week `lag` weeks earlier, or -1 when it isn't in the frame
+        prior = week_values - np.timedelta64(7 * lag, 'D')
+        prior_idx = np.searchsorted(weeks, prior)
+        found = (prior_idx < len(weeks)) & (weeks[np.minimum(prior_idx, len(weeks) - 1)] == prior)
+
+        out = {}
+        for col in columns:
+            # locations x weeks, NaN where an LGA has no row that week
+            values = np.full((n, len(weeks)), np.nan)
+            values[pos[known], week_idx[known]] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[known]
+            present = ~np.isnan(values)
+            numerator = self.weights @ np.where(present, values, 0.0)
+            denominator = self.weights @ present.astype(np.float64)
+            means = np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator > 0)
+            result = np.full(len(df), np.nan)
+            ok = known & found
+            result[ok] = means[pos[ok], prior_idx[ok]]
+            out[neighbour_column(col, lag)] = result
+        return pd.DataFrame(out, index=df.index)
+
+_cache_lock = threading.Lock()
+_cached: Dict[str, NeighbourIndex] = {}
+
+def _fingerprint(rows) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for lid, lat, lon in rows:
+        h.update(f"{lid}:{lat!r}:{lon!r};".encode())
+    return h.hexdigest()
+
+def index_for(rows) -> NeighbourIndex:
+    """
+    Index over (location_id, latitude, longitude) rows; rows without
+    coordinates are left out. Reused while the rows are unchanged.
+    """
+    rows = sorted((int(lid), lat, lon) for lid, lat, lon in rows if lat is not None and lon is not None)
+    key = _fingerprint(rows)
+    with _cache_lock:
+        index = _cached.get(key)
+        if index is None:
+            index = NeighbourIndex([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+            # Only the current layout is worth keeping
+            _cached.clear()
+            _cached[key] = index
+        return index
+
+def get_neighbour_index(db: Session) -> NeighbourIndex:
+    return index_for(db.query(models.Location.id, models.Location.latitude, models.Location.longitude))
@@ -0,0 +1,192 @@
+"""
+Full-sweep scoring job that precomputes the stored risk predictions.
+
+Every Location is scored for every disease and horizon as of its latest
+history week. Features for all LGAs come from build_feature_vectors, each
+model scores the whole matrix once per horizon, and the rows are written
+with one executemany per chunk. A sweep replaces the predictions stored
+for the same (LGA, disease, horizon, week), so reruns do not pile up rows.
+Read endpoints such as /predictions/heatmap-data only read what it wrote.
+
+Run it from cron with scripts/run_sweep.py, or in-process by setting
+PHIP_SWEEP_INTERVAL_MINUTES: the API then sweeps on startup and every N
+minutes. Under several workers use cron, or set the interval on one only.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.orm import Session
+from .. import models, spatial
+from ..cache import feedback_cache
+from ..alerts.rules import evaluate_alerts
+from ..trends.cubes import DISEASES, refresh_lga_week
+from .aggregation import get_week_start
+from .model import RiskModel, build_feature_vectors, DEFAULT_HORIZON
+
+# 0 disables the in-process scheduler (use cron + scripts/run_sweep.py instead)
+SWEEP_INTERVAL_MINUTES = float(os.getenv("PHIP_SWEEP_INTERVAL_MINUTES", "0"))
+INSERT_CHUNK_SIZE = 1000
+# Keys per DELETE ... WHERE (state, lga, prediction_date) IN (...)
+DELETE_CHUNK_SIZE = 300
+
+class SweepBusy(Exception):
+    pass
+
+_sweep_lock = threading.Lock()
+# Stats of the last finished sweep in this process, served by GET /predictions/sweep
+last_sweep: Optional[Dict[str, Any]] = None
+
+def is_running() -> bool:
+    return _sweep_lock.locked()
+
+def latest_history_weeks(db: Session) -> Dict[int, date]:
+    return dict(
+        db.query(models.DiseaseHistory.location_id, func.max(models.DiseaseHistory.week_start))
+        .group_by(models.DiseaseHistory.location_id)
+        .all()
+    )
+
+def _replace_predictions(db: Session, disease: str, horizons: List[int], records: List[Dict[str, Any]]):
+    keys = sorted({(r["state"], r["lga"], r["prediction_date"]) for r in records})
+    P = models.RiskPrediction
+    for i in range(0, len(keys), DELETE_CHUNK_SIZE):
+        db.query(P).filter(
+            P.disease == disease,
+            P.weeks_ahead.in_(horizons),
+            tuple_(P.state, P.lga, P.prediction_date).in_(keys[i:i + DELETE_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    for i in range(0, len(records), INSERT_CHUNK_SIZE):
+        db.execute(insert(P), records[i:i + INSERT_CHUNK_SIZE])
+    db.commit()
+
+def run_sweep(db: Session, get_model: Callable[[str, Session], RiskModel],
+              diseases: Optional[List[str]] = None, horizons: Optional[List[int]] = None,
+              alerts: bool = False, refresh_rollups: bool = True) -> Dict[str, Any]:
+    """
+    Scores every LGA and stores the predictions. get_model(disease, db)
+    supplies the fitted models (the API passes its shared cache). alerts
+    runs the alert rules on the default horizon; refresh_rollups updates the
+    trend cube cells of the swept weeks. Returns the sweep's stats.
+    """
+    global last_sweep
+    if not _sweep_lock.acquire(blocking=False):
+        raise SweepBusy("A sweep is already running in this process")
+    try:
+        stats = _sweep(db, get_model, diseases or DISEASES, horizons, alerts, refresh_rollups)
+    finally:
+        _sweep_lock.release()
+    last_sweep = stats
+    return stats
+
+def _sweep(db: Session, get_model, diseases: List[str], horizons: Optional[List[int]],
+           alerts: bool, refresh_rollups: bool) -> Dict[str, Any]:
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+
+    locations = db.query(models.Location.id, models.Location.state, models.Location.lga).order_by(models.Location.id).all()
+    latest = latest_history_weeks(db)
+    # LGAs without history are scored as of today, as the on-demand path does
+    today = date.today()
+    base_weeks = {l.id: latest.get(l.id, today) for l in locations}
+    features = build_feature_vectors(db, base_weeks)
+    rows = [features.get(l.id, {}) for l in locations]
+    feature_seconds = time.perf_counter() - started
+
+    by_disease = {}
+    rows_written = 0
+    for disease in diseases:
+        t = time.perf_counter()
+        try:
+            model = get_model(disease, db)
+            scored = model.score_batch(rows, horizons)
+            if not scored:
+                raise ValueError("Model not trained")
+            records = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "state": loc.state,
+                    "lga": loc.lga,
+                    "disease": disease,
+                    "prediction_date": base_weeks[loc.id],
+                    "weeks_ahead": h,
+                    "risk_score": result["risk_score"],
+                    "risk_level": result["risk_level"],
+                    "top_factors": result["top_factors"],
+                    "created_at": started_at,
+                }
+                for h, results in scored.items()
+                for loc, result in zip(locations, results)
+            ]
+            _replace_predictions(db, disease, sorted(scored), records)
+        except Exception as e:
+            db.rollback()
+            print(f"Sweep failed for {disease}: {e}")
+            by_disease[disease] = {"error": str(e)}
+            continue
+
+        if alerts and DEFAULT_HORIZON in scored:
+            for loc, result in zip(locations, scored[DEFAULT_HORIZON]):
+                evaluate_alerts(db, loc.id, disease, base_weeks[loc.id], result["risk_score"])
+
+        rows_written += len(records)
+        by_disease[disease] = {
+            "rows": len(records),
+            "horizons": sorted(scored),
+            "seconds": time.perf_counter() - t,
+        }
+
+    feedback_cache.clear()
+    spatial.invalidate_risk()
+    rollup_seconds = 0.0
+    if refresh_rollups and rows_written:
+        t = time.perf_counter()
+        for loc in locations:
+            refresh_lga_week(db, loc.state, loc.lga, get_week_start(base_weeks[loc.id]))
+        rollup_seconds = time.perf_counter() - t
+
+    stats = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "locations": len(locations),
+        "rows_written": rows_written,
+        "seconds": time.perf_counter() - started,
+        "feature_seconds": feature_seconds,
+        "rollup_seconds": rollup_seconds,
+        "diseases": by_disease,
+    }
+    print(f"Sweep scored {len(locations)} LGAs: {rows_written} predictions in {stats['seconds']:.1f}s")
+    return stats
+
+class SweepScheduler:
+    """
+    Daemon thread that runs `job` once at start and then every
+    interval_seconds until stopped. A failing sweep is logged and retried
+    at the next tick.
+    """
+    def __init__(self, job: Callable[[], Any], interval_seconds: float):
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.job()
+            except SweepBusy:
+                pass
+            except Exception as e:
+                print(f"Scheduled sweep failed: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="phip-sweep-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
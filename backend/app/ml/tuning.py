@@ -0,0 +1,150 @@
+"""
+Offline hyperparameter search for the risk models.
+
+Candidates are scored by mean AUC over TimeSeriesSplit folds, fanned out
+over a process pool. X/y must be in week order (scripts/tune_models.py
+sorts them), so each fold trains on earlier weeks and tests on the weeks
+that follow. The training frame is sorted by location, and splitting it as
+is would score candidates across locations instead of forward in time.
+The feature matrix is written once as .npy and memory-mapped by the
+workers. TimeSeriesSplit folds are contiguous row ranges, so each worker
+slices views out of the map instead of receiving pickled copies. Successive halving evaluates
+every candidate on a small tree budget first and only promotes the best
+1/eta to larger budgets, so bad configurations are dropped early.
+"""
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import TimeSeriesSplit
+from .model import RiskModel, BUDGET_PARAMS
+
+SEARCH_SPACES = {
+    "hgb": {
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "max_leaf_nodes": [7, 15, 31, 63],
+        "min_samples_leaf": [10, 20, 50, 100],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    },
+    "gbc": {
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 4, 5],
+        "min_samples_leaf": [1, 10, 50],
+        "subsample": [0.7, 0.85, 1.0],
+    },
+}
+
+def sample_candidates(backend: str, n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    space = SEARCH_SPACES[backend]
+    grid_size = math.prod(len(v) for v in space.values())
+    rng = random.Random(seed)
+    seen, candidates = set(), []
+    while len(candidates) < min(n, grid_size):
+        params = {k: rng.choice(v) for k, v in space.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+def prepare_folds(X: np.ndarray, y: np.ndarray, workdir: str, n_splits: int = 3) -> Dict[str, Any]:
+    """
+    Writes X/y (rows in week order) as .npy once and returns the paths plus
+    each fold's (train_end, test_start, test_end) row bounds.
+    """
+    x_path, y_path = os.path.join(workdir, "X.npy"), os.path.join(workdir, "y.npy")
+    np.save(x_path, np.ascontiguousarray(X, dtype=np.float64))
+    np.save(y_path, np.asarray(y, dtype=np.int8))
+    bounds = []
+    for train_index, test_index in TimeSeriesSplit(n_splits=n_splits).split(X):
+        # TimeSeriesSplit yields a prefix for training and the next block for testing
+        bounds.append((int(train_index[-1]) + 1, int(test_index[0]), int(test_index[-1]) + 1))
+    return {"x_path": x_path, "y_path": y_path, "bounds": bounds}
+
+def _build_pipeline(backend: str, params: Dict[str, Any], budget: Optional[int]):
+    # Same pipeline RiskModel would build; explicit params bypass the registry
+    if budget is not None:
+        params = {**params, BUDGET_PARAMS[backend]: budget}
+    return RiskModel("tuning", backend=backend)._build_pipeline(params)
+
+def evaluate_candidate(task: Tuple[Dict[str, Any], str, Dict[str, Any], Optional[int]]) -> Dict[str, Any]:
+    """
+    Worker entry point: mean fold AUC of one candidate at one tree budget
+    (None keeps the backend's default size).
+    """
+    folds, backend, params, budget = task
+    X = np.load(folds["x_path"], mmap_mode="r")
+    y = np.load(folds["y_path"], mmap_mode="r")
+    started = time.perf_counter()
+    aucs = []
+    for train_end, test_start, test_end in folds["bounds"]:
+        y_train, y_test = y[:train_end], y[test_start:test_end]
+        if len(np.unique(y_train)) < 2 or len(np.unique(y_test)) < 2:
+            continue
+        pipeline = _build_pipeline(backend, params, budget)
+        pipeline.fit(X[:train_end], y_train)
+        aucs.append(roc_auc_score(y_test, pipeline.predict_proba(X[test_start:test_end])[:, 1]))
+    return {
+        "params": params,
+        "budget": budget,
+        "auc": float(np.mean(aucs)) if aucs else 0.0,
+        "folds_scored": len(aucs),
+        "seconds": time.perf_counter() - started,
+    }
+
+def successive_halving(folds: Dict[str, Any], backend: str, candidates: List[Dict[str, Any]],
+                       min_budget: int = 25, max_budget: int = 400, eta: int = 3,
+                       n_jobs: Optional[int] = None) -> Dict[str, Any]:
+    rungs = []
+    survivors = list(candidates)
+    budget = min_budget
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        while True:
+            results = list(pool.map(evaluate_candidate, [(folds, backend, p, budget) for p in survivors]))
+            results.sort(key=lambda r: r["auc"], reverse=True)
+            rungs.append({"budget": budget, "results": results})
+            if len(results) <= 1 or budget >= max_budget:
+                break
+            survivors = [r["params"] for r in results[:max(1, len(results) // eta)]]
+            budget = min(budget * eta, max_budget)
+    best = rungs[-1]["results"][0]
+    return {
+        "params": {**best["params"], BUDGET_PARAMS[backend]: best["budget"]},
+        "auc": best["auc"],
+        "rungs": [
+            {"budget": r["budget"], "candidates": len(r["results"]), "best_auc": r["results"][0]["auc"]}
+            for r in rungs
+        ],
+    }
+
+def tune(X: np.ndarray, y: np.ndarray, backend: str, n_candidates: int = 27, n_splits: int = 3,
+         min_budget: int = 25, max_budget: int = 400, eta: int = 3, n_jobs: Optional[int] = None,
+         seed: int = 42) -> Dict[str, Any]:
+    """
+    Runs the search for one training matrix and returns the winning params,
+    its AUC, the untuned default config's AUC and per-rung summaries.
+    """
+    with tempfile.TemporaryDirectory(prefix="phip-tune-") as workdir:
+        folds = prepare_folds(X, y, workdir, n_splits=n_splits)
+        started = time.perf_counter()
+        result = successive_halving(
+            folds, backend, sample_candidates(backend, n_candidates, seed),
+            min_budget=min_budget, max_budget=max_budget, eta=eta, n_jobs=n_jobs,
+        )
+        baseline = evaluate_candidate((folds, backend, {}, None))
+    result["baseline_auc"] = baseline["auc"]
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def format_summary(disease: str, result: Dict[str, Any]) -> str:
+    rungs = ", ".join(f"{r['candidates']}@{r['budget']}" for r in result["rungs"])
+    return (
+        f"{disease}: auc {result['auc']:.4f} (default {result['baseline_auc']:.4f}) "
+        f"in {result['seconds']:.1f}s [{rungs}] -> {json.dumps(result['params'], sort_keys=True)}"
+    )
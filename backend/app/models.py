@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, UniqueConstraint, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, UniqueConstraint, Index, JSON, Text
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -44,7 +44,7 @@ class Alert(Base):
     location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
     created_at_week = Column(Date, nullable=False)
     disease = Column(String, nullable=False)
-    level = Column(String, nullable=False)  # Low/Medium/High/EarlyWarning
+    level = Column(String, nullable=False)  # Low/Medium/High/EarlyWarning/Signal
     message = Column(String, nullable=False)
     risk_score = Column(Float, nullable=True)
     location = relationship("Location")
@@ -101,6 +101,33 @@ class DailyReport(Base):
     facility = relationship("Facility", back_populates="reports")
     __table_args__ = (UniqueConstraint("facility_id", "report_date", name="uq_facility_date"),)
 
+class ReportSyncKey(Base):
+    # Idempotency keys generated by the offline client for queued reports
+    __tablename__ = "report_sync_keys"
+    facility_id = Column(String, ForeignKey("facilities.id"), primary_key=True)
+    client_id = Column(String, primary_key=True)
+    report_id = Column(String, ForeignKey("daily_reports.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DetectorState(Base):
+    # Online outbreak detector state (app/alerts/detectors.py), one row per facility or LGA
+    __tablename__ = "detector_states"
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False) # facility / lga
+    key = Column(String, nullable=False) # facility id, or "state|lga"
+    # signal -> [n, mean, var, cusum, pending day ordinal, pending value, alerted day ordinal]
+    state = Column(JSON, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_detector_scope_key"),)
+
+class ProcessedMessage(Base):
+    # Provider message ids already ingested (app/idempotency.py), so webhook retries are answered without reprocessing
+    __tablename__ = "processed_messages"
+    provider = Column(String, primary_key=True) # twilio / generic
+    message_id = Column(String, primary_key=True)
+    response = Column(Text, nullable=True) # null while the first delivery is still being processed
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class LGAWeeklyAggregate(Base):
     __tablename__ = "lga_weekly_aggregates"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -132,3 +159,42 @@ class RiskPrediction(Base):
     top_factors = Column(JSON, nullable=True) # JSONB in Postgres
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_risk_lga_date", "state", "lga", "prediction_date"),)
+
+class TrendRollup(Base):
+    # Pre-rolled cube cells behind the /trends API.
+    # grain: lga_week / state_week / state_month; lga is "" for state-level cells
+    __tablename__ = "trend_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    grain = Column(String, nullable=False)
+    state = Column(String, nullable=False)
+    lga = Column(String, nullable=False, default="")
+    period_start = Column(Date, nullable=False)
+    
+    fever_cases = Column(Integer, default=0)
+    diarrhea_cases = Column(Integer, default=0)
+    respiratory_cases = Column(Integer, default=0)
+    admissions = Column(Integer, default=0)
+    cholera_cases = Column(Integer, default=0)
+    malaria_cases = Column(Integer, default=0)
+    lassa_cases = Column(Integer, default=0)
+    meningitis_cases = Column(Integer, default=0)
+    
+    # Env signals are stored as sums so cells can be rolled up; divide by env_weeks
+    rainfall_sum = Column(Float, default=0.0)
+    temperature_sum = Column(Float, default=0.0)
+    humidity_sum = Column(Float, default=0.0)
+    flood_risk_sum = Column(Float, default=0.0)
+    env_weeks = Column(Integer, default=0)
+    
+    # Highest risk score seen in the period
+    cholera_risk = Column(Float, nullable=True)
+    malaria_risk = Column(Float, nullable=True)
+    lassa_risk = Column(Float, nullable=True)
+    meningitis_risk = Column(Float, nullable=True)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("grain", "state", "lga", "period_start", name="uq_rollup_cell"),
+        Index("ix_rollup_grain_period", "grain", "period_start"),
+    )
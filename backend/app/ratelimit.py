@@ -0,0 +1,194 @@
+"""
+Admission control for the ingestion endpoints (/reports/, /reports/sync,
+/sms/ingest, /sms/twilio).
+
+Two checks run before the report is processed:
+- a token bucket per facility or SMS sender: PHIP_INGEST_BURST requests
+  at once, refilled at PHIP_INGEST_RATE_PER_MINUTE. An empty bucket gets
+  429 with Retry-After. The SMS endpoints check it after the webhook
+  dedupe (app/idempotency.py), so provider retries don't use up tokens.
+- a per-worker cap of PHIP_MAX_CONCURRENT_WRITES write requests in flight.
+  Past it, requests are shed with 503 and Retry-After rather than queued
+  behind the threadpool, so the dashboard reads on the same workers stay
+  responsive.
+
+Buckets live in process memory, so under gunicorn each worker enforces the
+rate separately. Set PHIP_RATE_LIMIT_REDIS_URL (needs the redis package)
+to share them across workers. Shed requests are counted in
+phip_requests_shed_total on /metrics. PHIP_RATE_LIMIT=0 turns it all off.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+from . import auth_utils, metrics
+
+ENABLED = os.getenv("PHIP_RATE_LIMIT", "1") == "1"
+RATE_PER_MINUTE = float(os.getenv("PHIP_INGEST_RATE_PER_MINUTE", "30"))
+BURST = float(os.getenv("PHIP_INGEST_BURST", "60"))
+MAX_CONCURRENT_WRITES = int(os.getenv("PHIP_MAX_CONCURRENT_WRITES", "8"))
+REDIS_URL = os.getenv("PHIP_RATE_LIMIT_REDIS_URL")
+# Retry-After for shed (503) requests; in-flight writes finish in well under this
+SHED_RETRY_SECONDS = 1
+# Senders tracked in memory; the least recently seen are dropped first
+MAX_BUCKETS = 50_000
+
+SHED = metrics.counter("phip_requests_shed_total", "Requests rejected by admission control", ["route", "reason"])
+
+class TokenBuckets:
+    """
+    In-process token buckets keyed by sender.
+    """
+    def __init__(self, rate_per_second: float, burst: float, max_keys: int = MAX_BUCKETS):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """
+        Takes one token. Returns 0 when allowed, else seconds until a token
+        is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+class RedisTokenBuckets:
+    """
+    The same buckets in Redis, shared by every worker. The refill and take
+    happen in one script, timed by the Redis server clock. Fails open: if
+    Redis is unreachable the request is allowed.
+    """
+    SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(b[1]) or burst
+    local ts = tonumber(b[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, rate_per_second: float, burst: float):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PHIP_RATE_LIMIT_REDIS_URL requires the redis package to be installed")
+        self.rate = rate_per_second
+        self.burst = burst
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str) -> float:
+        try:
+            return float(self._script(keys=[f"phip:ratelimit:{key}"], args=[self.rate, self.burst]))
+        except Exception as e:
+            print(f"Rate limiter backend unavailable, allowing request: {e}")
+            return 0.0
+
+def _make_buckets():
+    if not ENABLED or RATE_PER_MINUTE <= 0:
+        return None
+    if REDIS_URL:
+        return RedisTokenBuckets(REDIS_URL, RATE_PER_MINUTE / 60.0, BURST)
+    return TokenBuckets(RATE_PER_MINUTE / 60.0, BURST)
+
+buckets = _make_buckets()
+# Write requests in flight in this worker. Only touched from the event loop
+# (async dependencies), so no lock is needed.
+_in_flight = 0
+
+def _route(request: Request) -> str:
+    return getattr(request.scope.get("route"), "path", request.url.path)
+
+def _shed(route: str, reason: str):
+    if metrics.ENABLED:
+        SHED.inc(route, reason)
+
+def check_rate(key: Optional[str], route: str):
+    """
+    Raises 429 when key (a facility username or SMS sender) has no tokens left.
+    """
+    if buckets is None or not key:
+        return
+    wait = buckets.take(key)
+    if wait > 0:
+        _shed(route, "rate_limited")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many submissions, slow down",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+def sms_sender(text: str, from_number: Optional[str] = None) -> Optional[str]:
+    """
+    Rate-limit key for an SMS: the sender's number when the provider gives
+    one, else the facility username the message names. The number can't be
+    changed by editing the text, so a sender can't dodge its bucket or
+    drain another facility's.
+    """
+    if from_number:
+        return from_number
+    username = text.split("#", 1)[0].strip() if text else ""
+    return username or None
+
+async def facility_rate_limit(request: Request):
+    """
+    Route dependency for authenticated writes. The key is the token's
+    subject, read without touching the DB. Bad tokens aren't limited here;
+    get_current_facility rejects them.
+    """
+    if buckets is None:
+        return
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return
+    try:
+        subject = jwt.decode(token, auth_utils.SECRET_KEY, algorithms=[auth_utils.ALGORITHM]).get("sub")
+    except JWTError:
+        return
+    check_rate(subject, _route(request))
+
+async def write_slot(request: Request):
+    """
+    Route dependency holding one of MAX_CONCURRENT_WRITES slots for the
+    request. When none is free the request is shed with 503.
+    """
+    global _in_flight
+    if not ENABLED or MAX_CONCURRENT_WRITES <= 0:
+        yield
+        return
+    if _in_flight >= MAX_CONCURRENT_WRITES:
+        _shed(_route(request), "overloaded")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, retry shortly",
+            headers={"Retry-After": str(SHED_RETRY_SECONDS)},
+        )
+    _in_flight += 1
+    try:
+        yield
+    finally:
+        _in_flight -= 1
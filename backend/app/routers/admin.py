@@ -0,0 +1,28 @@
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from .. import schemas, auth_utils, sampling_profiler
+
+router = APIRouter()
+
+@router.post("/profile", response_class=PlainTextResponse)
+def capture_profile(payload: schemas.ProfileRequest, request: Request):
+    """
+    Samples this worker's stacks for `seconds` and returns collapsed stacks
+    (one "frame;frame;... count" line each) rooted at the executing route.
+    Pipe the body into flamegraph.pl or load it in speedscope.
+    """
+    auth_utils.verify_admin_secret(payload.admin_secret)
+    try:
+        profiler = sampling_profiler.capture(
+            payload.seconds,
+            interval=payload.interval_ms / 1000.0,
+            include_idle=payload.include_idle,
+            app=request.app,
+        )
+    except sampling_profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"X-Profile-Samples": str(profiler.samples), "X-Profile-Pid": str(os.getpid())},
+    )
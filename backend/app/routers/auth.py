@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from .. import models, schemas, auth_utils
+from .. import models, schemas, auth_utils, locations, spatial
 from ..db import get_db
 
 router = APIRouter()
@@ -30,27 +31,22 @@ def register(facility: schemas.FacilityCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(new_facility)
     
-    # Check if this Location exists in locations table (for heatmap)
-    # If not, create it using facility coordinates
-    existing_loc = db.query(models.Location).filter(
-        models.Location.state == facility.state, 
-        models.Location.lga == facility.lga
-    ).first()
-    
-    if not existing_loc:
-        new_loc = models.Location(
-            state=facility.state,
-            lga=facility.lga,
-            latitude=lat or 9.0820, # Default to Nigeria center if missing
-            longitude=lon or 8.6753
-        )
-        db.add(new_loc)
-        db.commit()
-    elif lat and lon and (not existing_loc.latitude or existing_loc.latitude == 0):
-        # Update existing location with valid coords from facility
-        existing_loc.latitude = lat
-        existing_loc.longitude = lon
-        db.commit()
+    # Make sure the LGA exists in locations (for heatmap), placed at the facility's coordinates
+    location_id = locations.resolve(
+        db, facility.state, facility.lga,
+        lat or 9.0820, # Default to Nigeria center if missing
+        lon or 8.6753
+    )
+    if lat and lon:
+        # Give an existing location without coords the facility's
+        placed = db.query(models.Location).filter(
+            models.Location.id == location_id,
+            or_(models.Location.latitude.is_(None), models.Location.latitude == 0)
+        ).update({"latitude": lat, "longitude": lon}, synchronize_session=False)
+        if placed:
+            db.commit()
+            from ..ml import feature_store
+            feature_store.store.sync_location(db, db.get(models.Location, location_id))
     
     # Create User
     hashed_password = auth_utils.get_password_hash(facility.password)
@@ -61,6 +57,8 @@ def register(facility: schemas.FacilityCreate, db: Session = Depends(get_db)):
     )
     db.add(new_user)
     db.commit()
+    # New facility (and possibly LGA) coordinates for the map
+    spatial.invalidate_index()
     
     return new_facility
 
@@ -82,10 +80,8 @@ def reset_password_admin(
     payload: schemas.PasswordReset,
     db: Session = Depends(get_db)
 ):
-    # Simple admin protection via shared secret in request body
     # In production, use proper admin roles or API keys
-    if payload.admin_secret != "phip_admin_secret_2026":
-        raise HTTPException(status_code=403, detail="Invalid admin secret")
+    auth_utils.verify_admin_secret(payload.admin_secret)
         
     user = db.query(models.FacilityUser).filter(models.FacilityUser.username == payload.username).first()
     if not user:
@@ -102,14 +98,18 @@ def clear_facilities_admin(
     payload: schemas.AdminAction,
     db: Session = Depends(get_db)
 ):
-    if payload.admin_secret != "phip_admin_secret_2026":
-        raise HTTPException(status_code=403, detail="Invalid admin secret")
+    auth_utils.verify_admin_secret(payload.admin_secret)
         
     try:
+        # Sync keys reference both facilities and reports
+        db.query(models.ReportSyncKey).delete()
+        # Detector baselines are built from these facilities' reports, per facility and per LGA
+        db.query(models.DetectorState).delete()
         db.query(models.FacilityUser).delete()
         db.query(models.DailyReport).delete()
         db.query(models.Facility).delete()
         db.commit()
+        spatial.invalidate_index()
         return {"status": "success", "message": "All facilities cleared"}
     except Exception as e:
         db.rollback()
@@ -1,27 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import date
-from ..db import get_db
-from .. import models, schemas
+from ..db import get_db, ReadSessionLocal
+from .. import models, schemas, auth_utils, locations
+from ..ml import export
+from ..trends.cubes import refresh_lga_week
 
 router = APIRouter()
 
-def get_or_create_location(db: Session, state: str, lga: str, lat=None, lon=None):
-    loc = db.query(models.Location).filter(models.Location.state == state, models.Location.lga == lga).first()
-    if loc:
-        return loc
-    loc = models.Location(state=state, lga=lga, latitude=lat, longitude=lon)
-    db.add(loc)
-    db.commit()
-    db.refresh(loc)
-    return loc
-
 @router.post("/environment")
 def upload_environment(payload: schemas.EnvMetricIn, db: Session = Depends(get_db)):
-    loc = get_or_create_location(db, payload.state, payload.lga)
+    location_id = locations.resolve(db, payload.state, payload.lga)
     existing = (
         db.query(models.EnvMetric)
-        .filter(models.EnvMetric.location_id == loc.id, models.EnvMetric.week_start == payload.week_start)
+        .filter(models.EnvMetric.location_id == location_id, models.EnvMetric.week_start == payload.week_start)
         .first()
     )
     if existing:
@@ -31,7 +24,7 @@ def upload_environment(payload: schemas.EnvMetricIn, db: Session = Depends(get_d
         existing.flood_risk = payload.flood_risk
     else:
         rec = models.EnvMetric(
-            location_id=loc.id,
+            location_id=location_id,
             week_start=payload.week_start,
             rainfall_mm=payload.rainfall_mm,
             temperature_c=payload.temperature_c,
@@ -40,12 +33,56 @@ def upload_environment(payload: schemas.EnvMetricIn, db: Session = Depends(get_d
         )
         db.add(rec)
     db.commit()
+    from ..ml import feature_store
+    feature_store.store.record("env", location_id, payload.week_start, payload.model_dump())
+    refresh_lga_week(db, payload.state, payload.lga, payload.week_start)
     return {"status": "ok"}
 
+@router.get("/feature-store")
+def feature_store_stats():
+    """
+    Size and freshness of this worker's in-memory feature store.
+    """
+    from ..ml import feature_store
+    return feature_store.store.stats()
+
+def _dataset_batches(dataset: str, disease: str):
+    # The body is streamed after the endpoint's dependencies have been
+    # closed, so the export reads on a session it owns for the whole stream
+    db = ReadSessionLocal()
+    try:
+        yield from export.iter_dataset_batches(db, dataset, disease=disease)
+    finally:
+        db.close()
+
+@router.get("/export/{dataset}")
+def export_dataset(dataset: str, format: str = "parquet", disease: str = "cholera"):
+    """
+    Streams a raw table or the engineered feature frame as Parquet or an
+    Arrow IPC stream, reading the source in record batches.
+    """
+    if dataset not in export.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset. Use one of {export.DATASETS}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {export.FORMATS}")
+    try:
+        export._require_pyarrow()
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    batches = _dataset_batches(dataset, disease)
+    if format == "arrow":
+        body = export.stream_arrow_ipc(batches)
+        media_type = "application/vnd.apache.arrow.stream"
+    else:
+        body = export.parquet_tempfile(batches)
+        media_type = "application/vnd.apache.parquet"
+    filename = f"{dataset}.{'arrows' if format == 'arrow' else 'parquet'}"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
+
 @router.post("/seed")
 def seed_data(payload: schemas.AdminAction, db: Session = Depends(get_db)):
-    if payload.admin_secret != "phip_admin_secret_2026":
-        raise HTTPException(status_code=403, detail="Invalid admin secret")
+    auth_utils.verify_admin_secret(payload.admin_secret)
     
     # Absolute import since 'app' is a package
     from app.db import engine, SessionLocal
@@ -77,10 +114,10 @@ def seed_data(payload: schemas.AdminAction, db: Session = Depends(get_db)):
 
 @router.post("/community")
 def upload_community(payload: schemas.CommunitySignalIn, db: Session = Depends(get_db)):
-    loc = get_or_create_location(db, payload.state, payload.lga)
+    location_id = locations.resolve(db, payload.state, payload.lga)
     existing = (
         db.query(models.CommunitySignal)
-        .filter(models.CommunitySignal.location_id == loc.id, models.CommunitySignal.week_start == payload.week_start)
+        .filter(models.CommunitySignal.location_id == location_id, models.CommunitySignal.week_start == payload.week_start)
         .first()
     )
     if existing:
@@ -94,7 +131,7 @@ def upload_community(payload: schemas.CommunitySignalIn, db: Session = Depends(g
         existing.absenteeism_rate = payload.absenteeism_rate
     else:
         rec = models.CommunitySignal(
-            location_id=loc.id,
+            location_id=location_id,
             week_start=payload.week_start,
             fever_reports=payload.fever_reports,
             cough_reports=payload.cough_reports,
@@ -111,10 +148,10 @@ def upload_community(payload: schemas.CommunitySignalIn, db: Session = Depends(g
 
 @router.post("/disease-history")
 def upload_disease_history(payload: schemas.DiseaseHistoryIn, db: Session = Depends(get_db)):
-    loc = get_or_create_location(db, payload.state, payload.lga)
+    location_id = locations.resolve(db, payload.state, payload.lga)
     existing = (
         db.query(models.DiseaseHistory)
-        .filter(models.DiseaseHistory.location_id == loc.id, models.DiseaseHistory.week_start == payload.week_start)
+        .filter(models.DiseaseHistory.location_id == location_id, models.DiseaseHistory.week_start == payload.week_start)
         .first()
     )
     if existing:
@@ -124,7 +161,7 @@ def upload_disease_history(payload: schemas.DiseaseHistoryIn, db: Session = Depe
         existing.meningitis_cases = payload.meningitis_cases
     else:
         rec = models.DiseaseHistory(
-            location_id=loc.id,
+            location_id=location_id,
             week_start=payload.week_start,
             cholera_cases=payload.cholera_cases,
             malaria_cases=payload.malaria_cases,
@@ -133,5 +170,8 @@ def upload_disease_history(payload: schemas.DiseaseHistoryIn, db: Session = Depe
         )
         db.add(rec)
     db.commit()
+    from ..ml import feature_store
+    feature_store.store.record("disease", location_id, payload.week_start, payload.model_dump())
+    refresh_lga_week(db, payload.state, payload.lga, payload.week_start)
     return {"status": "ok"}
 
@@ -1,51 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 from datetime import date, timedelta
-from typing import List
-from ..db import get_db
-from .. import models, schemas
-from ..ml.model import RiskModel, build_feature_vector, risk_category
+import threading
+from typing import List, TYPE_CHECKING
+from ..db import get_db, read_db, mark_written, SessionLocal
+from .. import models, schemas, auth_utils, spatial
+from ..cache import feedback_cache
+from ..ml.horizons import HORIZONS, DEFAULT_HORIZON
 from ..alerts.rules import evaluate_alerts
 
+# The ML stack (pandas, sklearn) is imported inside the handlers that need
+# it, so importing the app stays fast; see app/startup.py for the warm-up.
+if TYPE_CHECKING:
+    from ..ml.model import RiskModel
+
 router = APIRouter()
 
+# Map reads go to a replica, or the primary right after the map changed
+get_map_db = read_db(spatial.MAP_KEY)
+
 _models_cache = {}
+# Serialises first-use training, so the warm-up and a request don't both fit a model
+_models_lock = threading.Lock()
+DISEASES = ["cholera", "malaria", "lassa", "meningitis"]
 
-def get_model(disease: str, db: Session) -> RiskModel:
+def get_model(disease: str, db: Session) -> "RiskModel":
     model = _models_cache.get(disease)
-    if not model:
-        model = RiskModel(disease=disease)
-        model.train(db)
-        _models_cache[disease] = model
+    if model:
+        return model
+    from ..ml.model import RiskModel
+    with _models_lock:
+        model = _models_cache.get(disease)
+        if not model:
+            model = RiskModel(disease=disease)
+            model.train(db)
+            _models_cache[disease] = model
     return model
 
 @router.post("/retrain")
-def retrain_models(db: Session = Depends(get_db)):
-    for disease in ["cholera", "malaria", "lassa", "meningitis"]:
-        model = RiskModel(disease=disease)
-        model.train(db)
+def retrain_models(full: bool = False, db: Session = Depends(get_db)):
+    """
+    Updates each model with the weeks labelled since its last fit (warm
+    start); full=true, or missing/stale training state, refits from scratch.
+    """
+    from ..ml.model import RiskModel
+    results = {}
+    for disease in DISEASES:
+        model = _models_cache.get(disease) or RiskModel(disease=disease)
+        results[disease] = model.train(db) if full else model.train_incremental(db)
         _models_cache[disease] = model
-    return {"status": "ok"}
+    return {"status": "ok", "models": results}
 
-@router.get("/{state}/{lga}")
-def get_predictions(state: str, lga: str, weeks_ahead: int = 2, disease: str = "cholera", db: Session = Depends(get_db)):
+def _run_backtests(diseases: List[str], retrain_every: int, min_train_weeks: int):
+    from ..ml import backtest
+    # Runs after the response, so it needs its own session
+    db = SessionLocal()
+    try:
+        for disease in diseases:
+            try:
+                backtest.run_backtest(db, disease, retrain_every=retrain_every, min_train_weeks=min_train_weeks)
+            except Exception as e:
+                print(f"Backtest failed for {disease}: {e}")
+    finally:
+        db.close()
+
+@router.post("/backtest")
+def start_backtest(payload: schemas.BacktestRequest, background_tasks: BackgroundTasks):
+    """
+    Replays history for one or all diseases in the background; results
+    replace the reports served by GET /predictions/backtest/{disease}.
+    """
+    auth_utils.verify_admin_secret(payload.admin_secret)
+    if payload.disease and payload.disease not in DISEASES:
+        raise HTTPException(status_code=400, detail=f"disease must be one of {DISEASES}")
+    diseases = [payload.disease] if payload.disease else DISEASES
+    background_tasks.add_task(_run_backtests, diseases, payload.retrain_every, payload.min_train_weeks)
+    return {"status": "started", "diseases": diseases}
+
+def run_sweep_job():
+    """
+    Scores every LGA with the shared model cache; used by the scheduler and
+    POST /predictions/sweep, outside any request session.
+    """
+    from ..ml import sweep
+    db = SessionLocal()
+    try:
+        return sweep.run_sweep(db, get_model)
+    finally:
+        db.close()
+
+def _run_sweep_quietly():
+    from ..ml import sweep
+    try:
+        run_sweep_job()
+    except sweep.SweepBusy:
+        pass
+    except Exception as e:
+        print(f"Sweep failed: {e}")
+
+@router.post("/sweep")
+def start_sweep(payload: schemas.AdminAction, background_tasks: BackgroundTasks):
+    """
+    Re-scores every LGA for every disease and horizon in the background.
+    """
+    auth_utils.verify_admin_secret(payload.admin_secret)
+    from ..ml import sweep
+    if sweep.is_running():
+        raise HTTPException(status_code=409, detail="A sweep is already running")
+    background_tasks.add_task(_run_sweep_quietly)
+    return {"status": "started"}
+
+@router.get("/sweep")
+def get_sweep_status():
+    from ..ml import sweep
+    return {"running": sweep.is_running(), "last_sweep": sweep.last_sweep}
+
+# Declared before /{state}/{lga} so "backtest" is not taken for a state
+@router.get("/backtest/{disease}")
+def get_backtest(disease: str):
+    from ..ml import backtest
+    report = backtest.load_report(disease)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No backtest report for this disease; POST /predictions/backtest first")
+    return report
+
+def _latest_features(db: Session, state: str, lga: str):
+    from ..ml import feature_store
+    from ..ml.model import build_feature_vector
     loc = db.query(models.Location).filter(models.Location.state == state, models.Location.lga == lga).first()
     if not loc:
         raise HTTPException(status_code=404, detail="Location not found")
-    model = get_model(disease, db)
     # Use latest available week in datasets
-    latest_week = (
-        db.query(models.DiseaseHistory.week_start)
-        .filter(models.DiseaseHistory.location_id == loc.id)
-        .order_by(models.DiseaseHistory.week_start.desc())
-        .first()
-    )
-    base_week = latest_week[0] if latest_week else date.today()
-    # target_week = base_week + timedelta(days=7 * weeks_ahead)
-    features = build_feature_vector(db, loc.id, base_week)
+    store = feature_store.get_store(db)
+    if store is not None:
+        latest_week = store.latest_week(loc.id)
+    else:
+        latest_week = (
+            db.query(func.max(models.DiseaseHistory.week_start))
+            .filter(models.DiseaseHistory.location_id == loc.id)
+            .scalar()
+        )
+    base_week = latest_week or date.today()
+    return loc, base_week, build_feature_vector(db, loc.id, base_week)
+
+def _check_horizon(weeks_ahead: int):
+    if weeks_ahead not in HORIZONS:
+        raise HTTPException(status_code=400, detail=f"weeks_ahead must be one of {HORIZONS}")
+
+@router.get("/{state}/{lga}")
+def get_predictions(state: str, lga: str, weeks_ahead: int = DEFAULT_HORIZON, disease: str = "cholera", db: Session = Depends(get_db)):
+    _check_horizon(weeks_ahead)
+    loc, base_week, features = _latest_features(db, state, lga)
+    model = get_model(disease, db)
     
     # New full prediction
-    result = model.predict_full(features)
+    try:
+        result = model.predict_full(features, weeks_ahead)
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     score = result["risk_score"]
     category = result["risk_level"]
     factors = result["top_factors"]
@@ -63,6 +176,9 @@ def get_predictions(state: str, lga: str, weeks_ahead: int = 2, disease: str = "
     )
     db.add(pred)
     db.commit()
+    feedback_cache.invalidate_prefix((loc.state, loc.lga))
+    mark_written(("lga", loc.state, loc.lga))
+    spatial.invalidate_risk(disease, weeks_ahead)
     evaluate_alerts(db, loc.id, disease, base_week, score)
     
     return schemas.PredictionOut(
@@ -76,69 +192,141 @@ def get_predictions(state: str, lga: str, weeks_ahead: int = 2, disease: str = "
         top_factors=factors
     )
 
+@router.get("/{state}/{lga}/trajectory", response_model=schemas.TrajectoryOut)
+def get_trajectory(state: str, lga: str, disease: str = "cholera", db: Session = Depends(get_db)):
+    """
+    Risk for every forecast horizon from one feature vector, scored in a
+    single batched pass. Read-only: nothing is stored and no alerts fire.
+    """
+    loc, base_week, features = _latest_features(db, state, lga)
+    model = get_model(disease, db)
+    results = model.predict_horizons(features)
+    points = [
+        schemas.TrajectoryPoint(
+            weeks_ahead=h,
+            target_week=base_week + timedelta(weeks=h),
+            risk_score=r["risk_score"],
+            risk_level=r["risk_level"],
+            top_factors=r["top_factors"],
+        )
+        for h, r in sorted(results.items())
+    ]
+    return schemas.TrajectoryOut(state=loc.state, lga=loc.lga, disease=disease, prediction_date=base_week, points=points)
+
+def _latest_predictions(db: Session, disease: str, weeks_ahead: int):
+    # Subquery of stored predictions ranked newest-first per LGA; rank 1 is current
+    P = models.RiskPrediction
+    return (
+        db.query(
+            P.state,
+            P.lga,
+            P.risk_score,
+            P.risk_level,
+            func.row_number().over(
+                partition_by=(P.state, P.lga),
+                order_by=(P.prediction_date.desc(), P.created_at.desc())
+            ).label("rank"),
+        )
+        .filter(P.disease == disease)
+        .filter(P.weeks_ahead == weeks_ahead)
+        .subquery()
+    )
+
 @router.get("/heatmap-data")
-def heatmap_data(disease: str = "cholera", db: Session = Depends(get_db)):
-    # 1. First, try to fetch the LATEST pre-calculated predictions for all locations
-    # This avoids re-running the model for every single request and ensures we see what was just saved
-    
-    # Subquery to find the latest prediction date per LGA
-    # (In a real production app, we might just filter by date > today - 7 days)
-    
-    latest_preds = (
-        db.query(models.RiskPrediction)
-        .filter(models.RiskPrediction.disease == disease)
-        .order_by(models.RiskPrediction.prediction_date.desc())
+def heatmap_data(disease: str = "cholera", weeks_ahead: int = DEFAULT_HORIZON, db: Session = Depends(get_map_db)):
+    """
+    Latest stored prediction per LGA. Pure read: predictions come from the
+    sweep job (and report-driven scoring); LGAs never scored are left out.
+    """
+    _check_horizon(weeks_ahead)
+    ranked = _latest_predictions(db, disease, weeks_ahead)
+    rows = (
+        db.query(models.Location, ranked.c.risk_score, ranked.c.risk_level)
+        .join(ranked, (ranked.c.state == models.Location.state) & (ranked.c.lga == models.Location.lga))
+        .filter(ranked.c.rank == 1)
         .all()
     )
-    
-    # De-duplicate by LGA (take the newest one)
-    # Map (state, lga) -> prediction
-    pred_map = {}
-    for p in latest_preds:
-        key = (p.state, p.lga)
-        if key not in pred_map:
-            pred_map[key] = p
-            
-    items = []
-    locations = db.query(models.Location).all()
-    
-    for loc in locations:
-        key = (loc.state, loc.lga)
-        
-        # If we have a recent prediction, use it
-        if key in pred_map:
-            p = pred_map[key]
-            items.append(
-                schemas.HeatmapItem(
-                    state=loc.state,
-                    lga=loc.lga,
-                    latitude=loc.latitude,
-                    longitude=loc.longitude,
-                    risk_score=p.risk_score,
-                    risk_category=p.risk_level,
-                    disease=disease,
-                )
-            )
-        else:
-            # Fallback: Compute on the fly if no prediction exists (e.g. fresh data or no report yet)
-            # This ensures we don't show empty map if jobs haven't run
-            try:
-                model = get_model(disease, db)
-                features = build_feature_vector(db, loc.id, date.today())
-                score = model.predict_score(features)
-                items.append(
-                    schemas.HeatmapItem(
-                        state=loc.state,
-                        lga=loc.lga,
-                        latitude=loc.latitude,
-                        longitude=loc.longitude,
-                        risk_score=score,
-                        risk_category=risk_category(score),
-                        disease=disease,
-                    )
-                )
-            except Exception:
-                # If model fails (e.g. no data), skip or show low risk
-                pass
-
+    items = [
+        schemas.HeatmapItem(
+            state=loc.state,
+            lga=loc.lga,
+            latitude=loc.latitude,
+            longitude=loc.longitude,
+            risk_score=score,
+            risk_category=level,
+            disease=disease,
+        )
+        for loc, score, level in rows
+    ]
     return schemas.HeatmapResponse(items=items)
+
+def _risk_layer(db: Session, disease: str, weeks_ahead: int):
+    key = (disease, weeks_ahead)
+    risk = spatial.risk_cache.get(key)
+    if risk is None:
+        ranked = _latest_predictions(db, disease, weeks_ahead)
+        risk = {
+            (r.state, r.lga): (r.risk_score, r.risk_level)
+            for r in db.query(ranked.c.state, ranked.c.lga, ranked.c.risk_score, ranked.c.risk_level).filter(ranked.c.rank == 1)
+        }
+        spatial.risk_cache.set(key, risk)
+    return risk
+
+def _map_tile(db: Session, disease: str, weeks_ahead: int, layer: str, z: int, x: int, y: int):
+    key = (disease, weeks_ahead, layer, z, x, y)
+    tile = spatial.tile_cache.get(key)
+    if tile is None:
+        index = spatial.get_index(db)[layer]
+        tile = spatial.render_tile(index, _risk_layer(db, disease, weeks_ahead), z, x, y)
+        spatial.tile_cache.set(key, tile)
+    return tile
+
+def _check_map_params(weeks_ahead: int, layer: str, z: int):
+    _check_horizon(weeks_ahead)
+    if layer not in spatial.LAYERS:
+        raise HTTPException(status_code=400, detail=f"layer must be one of {spatial.LAYERS}")
+    if not 0 <= z <= spatial.MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"zoom must be between 0 and {spatial.MAX_ZOOM}")
+
+@router.get("/viewport", response_model=schemas.ViewportOut)
+def map_viewport(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int,
+    disease: str = "cholera", weeks_ahead: int = DEFAULT_HORIZON, layer: str = "lga",
+    db: Session = Depends(get_map_db)
+):
+    """
+    Map features inside a bbox: individual LGAs/facilities at street-level
+    zooms, clusters below the cluster zoom. Assembled from cached tiles.
+    Viewports too large for the zoom (big displays) are served one or more
+    zooms lower; the response's zoom is the one used.
+    """
+    _check_map_params(weeks_ahead, layer, zoom)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    zoom, tiles = spatial.viewport_tiles(min_lat, min_lon, max_lat, max_lon, zoom)
+    features = [
+        f
+        for x, y in tiles
+        for f in _map_tile(db, disease, weeks_ahead, layer, zoom, x, y)["features"]
+        if spatial.feature_in_bbox(f, min_lat, min_lon, max_lat, max_lon)
+    ]
+    return {
+        "disease": disease,
+        "weeks_ahead": weeks_ahead,
+        "layer": layer,
+        "zoom": zoom,
+        "clustered": zoom < spatial.CLUSTER_MAX_ZOOM,
+        "tiles": len(tiles),
+        "features": features,
+    }
+
+@router.get("/tiles/{disease}/{z}/{x}/{y}", response_model=schemas.MapTileOut)
+def map_tile(disease: str, z: int, x: int, y: int, weeks_ahead: int = DEFAULT_HORIZON, layer: str = "lga", db: Session = Depends(get_map_db)):
+    """
+    One slippy-map tile (z/x/y as in the OSM tile URL) of risk features.
+    """
+    _check_map_params(weeks_ahead, layer, z)
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    tile = _map_tile(db, disease, weeks_ahead, layer, z, x, y)
+    return {"disease": disease, "weeks_ahead": weeks_ahead, "layer": layer, **tile}
@@ -1,15 +1,73 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from datetime import date
-from .. import models, schemas, auth_utils
-from ..db import get_db
-from ..ml.aggregation import aggregate_facility_reports
+from .. import models, schemas, auth_utils, locations, ratelimit, spatial
+from ..cache import feedback_cache
+from ..db import get_db, get_read_db, mark_written, recently_written
+from ..ml.aggregation import aggregate_facility_reports, get_week_start
 from ..routers.predictions import get_model, evaluate_alerts
-from ..ml.model import build_feature_vector
+from ..ml.horizons import DEFAULT_HORIZON
+from ..trends.cubes import refresh_lga_week
+from ..alerts import detectors
 
 router = APIRouter()
 
-@router.post("/", response_model=schemas.DailyReportOut)
+# Per-facility token bucket, then a concurrency slot (app/ratelimit.py)
+INGEST_LIMITS = [Depends(ratelimit.facility_rate_limit), Depends(ratelimit.write_slot)]
+
+def refresh_lga_predictions(db: Session, state: str, lga: str, report_date: date):
+    """
+    Re-scores every disease for the LGA after its weekly aggregate changed,
+    then refreshes the week's trend cube cells for both.
+    """
+    from ..ml.model import build_feature_vector
+    try:
+        location_id = locations.lookup(db, state, lga)
+        
+        if location_id is not None:
+            # We predict for the week containing this report
+            features = build_feature_vector(db, location_id, report_date)
+            
+            # Predict for all diseases
+            for disease in ["cholera", "malaria", "lassa", "meningitis"]:
+                model = get_model(disease, db)
+                result = model.predict_full(features)
+                
+                # Update/Insert Prediction
+                # Check if prediction already exists for this week/disease
+                # For simplicity, we just insert a new one or update latest. 
+                # Ideally, we should have unique constraint on (lga, disease, prediction_date)
+                
+                pred = models.RiskPrediction(
+                    state=state,
+                    lga=lga,
+                    prediction_date=report_date,
+                    weeks_ahead=DEFAULT_HORIZON,
+                    risk_score=result["risk_score"],
+                    risk_level=result["risk_level"],
+                    disease=disease,
+                    top_factors=result["top_factors"]
+                )
+                db.add(pred)
+                
+                evaluate_alerts(db, location_id, disease, report_date, result["risk_score"])
+            
+            db.commit()
+    except Exception as e:
+        # Don't fail the report submission if prediction fails
+        print(f"Error updating risk score: {e}")
+        db.rollback()
+    finally:
+        feedback_cache.invalidate_prefix((state, lga))
+        mark_written(("lga", state, lga))
+        for disease in ["cholera", "malaria", "lassa", "meningitis"]:
+            spatial.invalidate_risk(disease, DEFAULT_HORIZON)
+    # The new aggregate still reaches the cubes when scoring failed
+    refresh_lga_week(db, state, lga, get_week_start(report_date))
+
+@router.post("/", response_model=schemas.DailyReportOut, dependencies=INGEST_LIMITS)
 def submit_report(
     report: schemas.DailyReportCreate,
     current_facility: models.Facility = Depends(auth_utils.get_current_facility),
@@ -21,7 +79,9 @@ def submit_report(
         models.DailyReport.report_date == report.report_date
     ).first()
     
+    previous = None
     if existing:
+        previous = detectors.report_counts(existing)
         # Update existing
         for key, value in report.dict().items():
             setattr(existing, key, value)
@@ -37,79 +97,137 @@ def submit_report(
         db.commit()
         db.refresh(new_report)
     
+    # 0. Same-day outbreak detectors
+    detectors.observe_report(db, current_facility, new_report, previous)
+    
     # 1. Aggregate Reports
-    aggregate_facility_reports(db, current_facility.state, current_facility.lga, report.report_date)
+    aggregate_facility_reports(db, current_facility.state, current_facility.lga, report.report_date, refresh_rollups=False)
     
     # 2. Trigger Real-time Risk Update
-    try:
-        loc = db.query(models.Location).filter(
-            models.Location.state == current_facility.state, 
-            models.Location.lga == current_facility.lga
-        ).first()
-        
-        if loc:
-            # We predict for the week containing this report
-            features = build_feature_vector(db, loc.id, report.report_date)
-            
-            # Predict for all diseases
-            for disease in ["cholera", "malaria", "lassa", "meningitis"]:
-                model = get_model(disease, db)
-                result = model.predict_full(features)
-                
-                # Update/Insert Prediction
-                # Check if prediction already exists for this week/disease
-                # For simplicity, we just insert a new one or update latest. 
-                # Ideally, we should have unique constraint on (lga, disease, prediction_date)
-                
-                pred = models.RiskPrediction(
-                    state=loc.state,
-                    lga=loc.lga,
-                    prediction_date=report.report_date,
-                    weeks_ahead=2,
-                    risk_score=result["risk_score"],
-                    risk_level=result["risk_level"],
-                    disease=disease,
-                    top_factors=result["top_factors"]
-                )
-                db.add(pred)
-                
-                evaluate_alerts(db, loc.id, disease, report.report_date, result["risk_score"])
-            
-            db.commit()
-    except Exception as e:
-        print(f"Error updating risk score: {e}")
-        # Don't fail the report submission if prediction fails
+    refresh_lga_predictions(db, current_facility.state, current_facility.lga, report.report_date)
     
     return new_report
 
-@router.get("/feedback", response_model=schemas.FeedbackOut)
-def get_feedback(
+@router.post("/sync", response_model=schemas.ReportSyncResponse, dependencies=INGEST_LIMITS)
+def sync_reports(
+    payload: schemas.ReportSyncRequest,
     current_facility: models.Facility = Depends(auth_utils.get_current_facility),
     db: Session = Depends(get_db)
 ):
-    # Get latest prediction for this location
-    latest_pred = (
-        db.query(models.RiskPrediction)
-        .filter(models.RiskPrediction.state == current_facility.state)
-        .filter(models.RiskPrediction.lga == current_facility.lga)
-        .order_by(models.RiskPrediction.prediction_date.desc())
-        .first()
+    """
+    Replays reports queued while the facility was offline.
+    All items are upserted in one transaction; aggregation and scoring
+    then run once per affected week instead of once per report.
+    """
+    if not payload.reports:
+        return {"items": []}
+
+    client_ids = {item.client_id for item in payload.reports}
+    seen = {
+        k.client_id: k.report_id
+        for k in db.query(models.ReportSyncKey).filter(
+            models.ReportSyncKey.facility_id == current_facility.id,
+            models.ReportSyncKey.client_id.in_(client_ids)
+        )
+    }
+    
+    report_dates = {item.report_date for item in payload.reports}
+    existing = {
+        r.report_date: r
+        for r in db.query(models.DailyReport).filter(
+            models.DailyReport.facility_id == current_facility.id,
+            models.DailyReport.report_date.in_(report_dates)
+        )
+    }
+    
+    before = {d: detectors.report_counts(r) for d, r in existing.items()}
+    # Items are applied in queue order, so a later edit of the same day wins
+    results = []
+    for item in payload.reports:
+        if item.client_id in seen:
+            results.append((item, "duplicate", seen[item.client_id]))
+            continue
+        
+        data = item.dict(exclude={"client_id"})
+        report = existing.get(item.report_date)
+        if report:
+            for key, value in data.items():
+                setattr(report, key, value)
+            status = "updated"
+        else:
+            report = models.DailyReport(facility_id=current_facility.id, **data)
+            db.add(report)
+            existing[item.report_date] = report
+            status = "created"
+        seen[item.client_id] = report
+        results.append((item, status, report))
+    
+    try:
+        db.flush()
+        for item, status, report in results:
+            if status != "duplicate":
+                db.add(models.ReportSyncKey(
+                    facility_id=current_facility.id,
+                    client_id=item.client_id,
+                    report_id=report.id
+                ))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Conflicting sync in progress, retry later")
+    
+    # Latest report date per affected week drives the risk update for that week
+    affected_weeks = {}
+    for item, status, _ in results:
+        if status != "duplicate":
+            week = get_week_start(item.report_date)
+            affected_weeks[week] = max(affected_weeks.get(week, item.report_date), item.report_date)
+    
+    # Detectors see each affected day once, oldest first, with its final counts
+    for day in sorted({item.report_date for item, status, _ in results if status != "duplicate"}):
+        detectors.observe_report(db, current_facility, existing[day], before.get(day))
+    
+    for week in sorted(affected_weeks):
+        aggregate_facility_reports(db, current_facility.state, current_facility.lga, week, refresh_rollups=False)
+        refresh_lga_predictions(db, current_facility.state, current_facility.lga, affected_weeks[week])
+    
+    items = []
+    for item, status, report in results:
+        report_id = report if isinstance(report, str) else report.id
+        items.append({"client_id": item.client_id, "status": status, "report_id": report_id})
+    return {"items": items}
+
+def _load_lga_feedback(db: Session, state: str, lga: str, day: date) -> dict:
+    # Latest and previous prediction dates for the LGA in one windowed query
+    ranked = (
+        db.query(
+            models.RiskPrediction.risk_level,
+            models.RiskPrediction.risk_score,
+            func.dense_rank().over(
+                order_by=models.RiskPrediction.prediction_date.desc()
+            ).label("date_rank"),
+            func.row_number().over(
+                partition_by=models.RiskPrediction.prediction_date,
+                order_by=models.RiskPrediction.created_at.desc()
+            ).label("row_rank"),
+        )
+        .filter(models.RiskPrediction.state == state)
+        .filter(models.RiskPrediction.lga == lga)
+        .filter(models.RiskPrediction.weeks_ahead == DEFAULT_HORIZON)
+        .subquery()
+    )
+    preds = (
+        db.query(ranked.c.risk_level, ranked.c.risk_score)
+        .filter(ranked.c.date_rank <= 2, ranked.c.row_rank == 1)
+        .order_by(ranked.c.date_rank)
+        .all()
     )
+    latest_pred = preds[0] if preds else None
+    prev_pred = preds[1] if len(preds) > 1 else None
     
     risk_level = latest_pred.risk_level if latest_pred else "Unknown"
     
     # Simple trend logic (compare to previous prediction)
-    prev_pred = None
-    if latest_pred:
-        prev_pred = (
-            db.query(models.RiskPrediction)
-            .filter(models.RiskPrediction.state == current_facility.state)
-            .filter(models.RiskPrediction.lga == current_facility.lga)
-            .filter(models.RiskPrediction.prediction_date < latest_pred.prediction_date)
-            .order_by(models.RiskPrediction.prediction_date.desc())
-            .first()
-        )
-    
     risk_trend = "Stable"
     if latest_pred and prev_pred:
         if latest_pred.risk_score > prev_pred.risk_score + 0.1:
@@ -123,46 +241,84 @@ def get_feedback(
         msg = "High risk of outbreak detected. Ensure ORS and antibiotics stock is sufficient."
     elif risk_level == "Medium" and risk_trend == "Rising":
         msg = "Risk is rising. Monitor fever and diarrhea cases closely."
-        
-    # Comparison Stats (My Facility vs LGA Avg)
-    today = date.today()
-    my_report = db.query(models.DailyReport).filter(
-        models.DailyReport.facility_id == current_facility.id,
-        models.DailyReport.report_date == today
-    ).first()
     
-    lga_reports = (
-        db.query(models.DailyReport)
+    # Every facility's counts for the day plus the LGA averages computed in-database
+    rows = (
+        db.query(
+            models.DailyReport.facility_id,
+            models.DailyReport.fever_cases,
+            models.DailyReport.respiratory_cases,
+            models.DailyReport.diarrhea_cases,
+            models.DailyReport.vomiting_cases,
+            func.avg(models.DailyReport.fever_cases).over().label("avg_fever"),
+            func.avg(models.DailyReport.respiratory_cases).over().label("avg_respiratory"),
+            func.avg(models.DailyReport.diarrhea_cases).over().label("avg_diarrhea"),
+            func.avg(models.DailyReport.vomiting_cases).over().label("avg_vomiting"),
+        )
         .join(models.Facility)
-        .filter(models.Facility.state == current_facility.state)
-        .filter(models.Facility.lga == current_facility.lga)
-        .filter(models.DailyReport.report_date == today)
+        .filter(models.Facility.state == state)
+        .filter(models.Facility.lga == lga)
+        .filter(models.DailyReport.report_date == day)
         .all()
     )
     
-    my_fever = my_report.fever_cases if my_report else 0
-    my_respiratory = my_report.respiratory_cases if my_report else 0
-    my_diarrhea = my_report.diarrhea_cases if my_report else 0
-    my_vomiting = my_report.vomiting_cases if my_report else 0
-
-    count = len(lga_reports)
-    avg_fever = sum(r.fever_cases for r in lga_reports) / count if count else 0
-    avg_respiratory = sum(r.respiratory_cases for r in lga_reports) / count if count else 0
-    avg_diarrhea = sum(r.diarrhea_cases for r in lga_reports) / count if count else 0
-    avg_vomiting = sum(r.vomiting_cases for r in lga_reports) / count if count else 0
+    averages = {"fever": 0, "respiratory": 0, "diarrhea": 0, "vomiting": 0}
+    if rows:
+        averages = {
+            "fever": float(rows[0].avg_fever or 0),
+            "respiratory": float(rows[0].avg_respiratory or 0),
+            "diarrhea": float(rows[0].avg_diarrhea or 0),
+            "vomiting": float(rows[0].avg_vomiting or 0),
+        }
     
     return {
         "risk_level": risk_level,
         "risk_trend": risk_trend,
         "warning_message": msg,
+        "averages": averages,
+        "facilities": {
+            r.facility_id: {
+                "fever": r.fever_cases or 0,
+                "respiratory": r.respiratory_cases or 0,
+                "diarrhea": r.diarrhea_cases or 0,
+                "vomiting": r.vomiting_cases or 0,
+            }
+            for r in rows
+        },
+    }
+
+@router.get("/feedback", response_model=schemas.FeedbackOut)
+def get_feedback(
+    current_facility: models.Facility = Depends(auth_utils.get_current_facility),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    # All facilities in an LGA share the same predictions and averages for the day
+    today = date.today()
+    key = (current_facility.state, current_facility.lga, today)
+    lga_feedback = feedback_cache.get(key)
+    if lga_feedback is None:
+        # Right after a submission in the LGA the replica may not have it yet
+        source = db if recently_written(("lga", current_facility.state, current_facility.lga)) else read_db
+        lga_feedback = _load_lga_feedback(source, current_facility.state, current_facility.lga, today)
+        feedback_cache.set(key, lga_feedback)
+    
+    # Comparison Stats (My Facility vs LGA Avg)
+    mine = lga_feedback["facilities"].get(current_facility.id, {})
+    averages = lga_feedback["averages"]
+    
+    return {
+        "risk_level": lga_feedback["risk_level"],
+        "risk_trend": lga_feedback["risk_trend"],
+        "warning_message": lga_feedback["warning_message"],
         "comparison": {
-            "my_fever": my_fever,
-            "lga_avg_fever": avg_fever,
-            "my_respiratory": my_respiratory,
-            "lga_avg_respiratory": avg_respiratory,
-            "my_diarrhea": my_diarrhea,
-            "lga_avg_diarrhea": avg_diarrhea,
-            "my_vomiting": my_vomiting,
-            "lga_avg_vomiting": avg_vomiting
+            "my_fever": mine.get("fever", 0),
+            "lga_avg_fever": averages["fever"],
+            "my_respiratory": mine.get("respiratory", 0),
+            "lga_avg_respiratory": averages["respiratory"],
+            "my_diarrhea": mine.get("diarrhea", 0),
+            "lga_avg_diarrhea": averages["diarrhea"],
+            "my_vomiting": mine.get("vomiting", 0),
+            "lga_avg_vomiting": averages["vomiting"]
         }
     }
@@ -3,8 +3,12 @@ from sqlalchemy.orm import Session
 from datetime import datetime, date
 import re
 from typing import Optional
-from .. import models, db
+from .. import models, db, idempotency, ratelimit
+from ..db import mark_written
+from ..cache import feedback_cache
+from ..metrics import instrument
 from ..ml.aggregation import aggregate_facility_reports
+from ..alerts import detectors
 
 router = APIRouter()
 
@@ -12,6 +16,7 @@ router = APIRouter()
 # Format: ID#DATE#F..#D..#V..#R..#A..#SD..#BO..#ORS..#AB..
 # Example: PHC123#2026-02-09#F23#D10#V5#R12#A6#SD2#BO78#ORSLOW#ABNORM
 
+@instrument("process_sms_logic")
 def process_sms_logic(text: str, db: Session, background_tasks: BackgroundTasks):
     """
     Shared logic to process SMS text and store report.
@@ -79,7 +84,9 @@ def process_sms_logic(text: str, db: Session, background_tasks: BackgroundTasks)
         models.DailyReport.report_date == report_date
     ).first()
     
+    previous = None
     if existing:
+        previous = detectors.report_counts(existing)
         for k, v in data_map.items():
             setattr(existing, k, v)
         # Append note if it's not already there to avoid dupes
@@ -100,12 +107,24 @@ def process_sms_logic(text: str, db: Session, background_tasks: BackgroundTasks)
         db.add(new_report)
         db.commit()
         
+    feedback_cache.invalidate_prefix((facility.state, facility.lga))
+    mark_written(("lga", facility.state, facility.lga))
+    detectors.observe_report(db, facility, existing or new_report, previous)
+    
     # 4. Trigger Aggregation
     background_tasks.add_task(aggregate_facility_reports, db, facility.state, facility.lga, report_date)
     
     return {"status": "success", "message": "Report processed successfully"}
 
-@router.post("/ingest")
+def _still_processing(message_id: str) -> HTTPException:
+    # A retry raced the first delivery; the provider should try again once it has finished
+    return HTTPException(
+        status_code=503,
+        detail=f"Message {message_id} is still being processed",
+        headers={"Retry-After": str(idempotency.IN_PROGRESS_RETRY_SECONDS)},
+    )
+
+@router.post("/ingest", dependencies=[Depends(ratelimit.write_slot)])
 def ingest_sms(
     body: dict,
     background_tasks: BackgroundTasks,
@@ -113,21 +132,48 @@ def ingest_sms(
 ):
     """
     Ingests a structured SMS message via JSON body (Generic Webhook).
+    An optional "message_id" makes redeliveries no-ops.
     """
     text = body.get("text", "")
-    return process_sms_logic(text, db, background_tasks)
+    message_id = body.get("message_id")
+    duplicate = idempotency.begin(db, "generic", message_id)
+    if duplicate == idempotency.IN_PROGRESS:
+        raise _still_processing(message_id)
+    if duplicate is not None:
+        return {"status": "duplicate", "message": "Message already processed"}
+    try:
+        ratelimit.check_rate(ratelimit.sms_sender(text), "/sms/ingest")
+        result = process_sms_logic(text, db, background_tasks)
+    except Exception:
+        idempotency.abandon(db, "generic", message_id)
+        raise
+    idempotency.finish(db, "generic", message_id, result["message"])
+    return result
 
-@router.post("/twilio")
+@router.post("/twilio", dependencies=[Depends(ratelimit.write_slot)])
 async def ingest_twilio_sms(
     background_tasks: BackgroundTasks,
     From: Optional[str] = Form(None),
     Body: str = Form(...),
+    MessageSid: Optional[str] = Form(None),
     db: Session = Depends(db.get_db)
 ):
     """
     Ingests an SMS message specifically from Twilio Webhook.
     Twilio sends data as application/x-www-form-urlencoded.
+    Retries carry the same MessageSid and get the first response back.
     """
+    duplicate = idempotency.begin(db, "twilio", MessageSid)
+    if duplicate == idempotency.IN_PROGRESS:
+        raise _still_processing(MessageSid)
+    if duplicate is not None:
+        return duplicate
+    try:
+        ratelimit.check_rate(ratelimit.sms_sender(Body, From), "/sms/twilio")
+    except HTTPException:
+        # Release the claim so the provider's retry is processed
+        idempotency.abandon(db, "twilio", MessageSid)
+        raise
     # We can use 'From' to validate sender if we had a registry of phone numbers.
     # For now, we rely on the username in the Body string.
     try:
@@ -136,8 +182,12 @@ async def ingest_twilio_sms(
         # We'll return a simple XML to confirm receipt or just 200.
         # For simplicity, we return plain text which Twilio logs.
         # Ideally return: Response(content="<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response></Response>", media_type="application/xml")
-        return "SMS Received"
+        response = "SMS Received"
     except HTTPException as e:
-        return f"Error: {e.detail}"
+        # Bad message or unknown facility; a retry would get the same answer
+        response = f"Error: {e.detail}"
     except Exception as e:
+        idempotency.abandon(db, "twilio", MessageSid)
         return f"System Error: {str(e)}"
+    idempotency.finish(db, "twilio", MessageSid, response)
+    return response
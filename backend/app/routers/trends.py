@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import Optional
+from ..db import get_db, get_read_db
+from .. import schemas, auth_utils
+from ..trends.cubes import GRAINS, query_trends, rebuild_rollups
+
+router = APIRouter()
+
+def _to_arrow(columns: dict) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Arrow output requires pyarrow to be installed")
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+@router.get("/")
+def get_trends(
+    grain: str = "state_week",
+    state: Optional[str] = None,
+    lga: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    format: str = "json",
+    db: Session = Depends(get_read_db)
+):
+    """
+    Time series of cases, env signals and risk from the pre-rolled cubes.
+    Omit state for national series. Returns columnar JSON, or an Arrow IPC
+    stream with format=arrow.
+    """
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of {GRAINS}")
+    if lga and not state:
+        raise HTTPException(status_code=400, detail="lga requires state")
+    if lga and grain != "lga_week":
+        raise HTTPException(status_code=400, detail="lga series are only available at grain=lga_week")
+    if format not in ("json", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json or arrow")
+
+    columns = query_trends(db, grain, state=state, lga=lga, start=start, end=end)
+
+    if format == "arrow":
+        return Response(content=_to_arrow(columns), media_type="application/vnd.apache.arrow.stream")
+
+    columns["period_start"] = [d.isoformat() for d in columns["period_start"]]
+    return {"grain": grain, "state": state, "lga": lga, "columns": columns}
+
+@router.post("/rebuild")
+def rebuild_trends(payload: schemas.AdminAction, db: Session = Depends(get_db)):
+    auth_utils.verify_admin_secret(payload.admin_secret)
+    counts = rebuild_rollups(db)
+    return {"status": "ok", "cells": counts}
@@ -0,0 +1,124 @@
+"""
+On-demand sampling profiler for a running worker.
+
+A daemon thread snapshots every thread's stack via sys._current_frames() at a
+fixed interval and folds them into collapsed-stack lines ("a;b;c 42") that
+flamegraph.pl / speedscope read directly. Stacks are rooted at the route that
+is executing ("POST /reports/") when an endpoint frame is found on them.
+
+Nothing is hooked while idle, so the only cost outside a capture is the
+import. Under gunicorn a capture only sees the worker serving the request.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# Leaf functions of threads that are parked rather than doing work
+IDLE_FUNCTIONS = {
+    "wait", "select", "poll", "epoll", "accept", "acquire", "get", "sleep",
+    "_wait_for_tstate_lock", "_worker", "readinto", "recv", "recv_into",
+}
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+def _route_tags(app) -> Dict[object, str]:
+    # Endpoint code object -> "METHOD /path"
+    tags = {}
+    for route in getattr(app, "routes", []):
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(endpoint, "__code__", None)
+        if code is None:
+            continue
+        methods = ",".join(sorted(getattr(route, "methods", None) or [])) or "ANY"
+        tags[code] = f"{methods} {route.path}"
+    return tags
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, route_tags: Optional[Dict] = None,
+                 exclude_threads=()):
+        self.interval = interval
+        self.exclude_threads = set(exclude_threads)
+        self.include_idle = include_idle
+        self.route_tags = route_tags or {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or ident in self.exclude_threads:
+                continue
+            if not self.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            labels = []
+            tag = None
+            while frame is not None:
+                code = frame.f_code
+                labels.append(_frame_label(code))
+                if tag is None:
+                    tag = self.route_tags.get(code)
+                frame = frame.f_back
+            labels.reverse()
+            root = tag or f"[{names.get(ident, 'thread')}]"
+            self.stacks[root + ";" + ";".join(labels)] += 1
+        self.samples += 1
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample()
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Fell behind (sampling is slower than the interval); don't burst
+                next_tick = time.perf_counter()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="phip-sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+# One capture per process; overlapping captures would double the overhead
+_capture_lock = threading.Lock()
+
+def capture(seconds: float, interval: float = 0.01, include_idle: bool = False, app=None) -> SamplingProfiler:
+    """
+    Samples all threads for `seconds` and returns the stopped profiler.
+    Blocks the calling thread; raises ProfilerBusy if a capture is running.
+    """
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile capture is already running in this worker")
+    try:
+        # The caller only sleeps; leave it out of the samples
+        profiler = SamplingProfiler(
+            interval, include_idle, _route_tags(app) if app is not None else None,
+            exclude_threads=(threading.get_ident(),),
+        )
+        profiler.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler
+    finally:
+        _capture_lock.release()
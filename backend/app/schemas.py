@@ -22,6 +22,16 @@ class PasswordReset(BaseModel):
 class AdminAction(BaseModel):
     admin_secret: str
 
+class BacktestRequest(AdminAction):
+    disease: Optional[str] = None # all diseases when omitted
+    retrain_every: int = Field(4, ge=1)
+    min_train_weeks: int = Field(52, ge=8)
+
+class ProfileRequest(AdminAction):
+    seconds: float = Field(10.0, gt=0, le=120)
+    interval_ms: float = Field(10.0, ge=1, le=1000)
+    include_idle: bool = False
+
 # --- Facility ---
 class FacilityCreate(BaseModel):
     name: str
@@ -74,6 +84,22 @@ class DailyReportOut(DailyReportCreate):
     class Config:
         from_attributes = True
 
+# --- Offline Sync ---
+class QueuedReportIn(DailyReportCreate):
+    client_id: str = Field(..., min_length=1, max_length=64) # Idempotency key generated offline
+
+class ReportSyncRequest(BaseModel):
+    # Each report is aggregated and scored in the request; bigger queues are sent in batches
+    reports: List[QueuedReportIn] = Field(..., max_length=200)
+
+class ReportSyncItemOut(BaseModel):
+    client_id: str
+    status: str # created / updated / duplicate
+    report_id: Optional[str] = None
+
+class ReportSyncResponse(BaseModel):
+    items: List[ReportSyncItemOut]
+
 class FeedbackOut(BaseModel):
     risk_level: str
     risk_trend: str
@@ -126,6 +152,20 @@ class PredictionOut(BaseModel):
     class Config:
         from_attributes = True
 
+class TrajectoryPoint(BaseModel):
+    weeks_ahead: int
+    target_week: date
+    risk_score: float
+    risk_level: str
+    top_factors: List[Any] = []
+
+class TrajectoryOut(BaseModel):
+    state: str
+    lga: str
+    disease: str
+    prediction_date: date
+    points: List[TrajectoryPoint]
+
 class HeatmapItem(BaseModel):
     state: str
     lga: str
@@ -138,6 +178,38 @@ class HeatmapItem(BaseModel):
 class HeatmapResponse(BaseModel):
     items: List[HeatmapItem]
 
+class MapFeature(BaseModel):
+    kind: str # lga / facility / cluster
+    latitude: float
+    longitude: float
+    state: Optional[str] = None
+    lga: Optional[str] = None
+    name: Optional[str] = None # facility name
+    risk_score: Optional[float] = None # clusters: riskiest member; None if never scored
+    risk_category: Optional[str] = None
+    count: int = 1
+    level_counts: Optional[Dict[str, int]] = None
+    bounds: Optional[List[float]] = None # clusters: [min_lat, min_lon, max_lat, max_lon] of the members
+
+class MapTileOut(BaseModel):
+    disease: str
+    weeks_ahead: int
+    layer: str
+    z: int
+    x: int
+    y: int
+    clustered: bool
+    features: List[MapFeature]
+
+class ViewportOut(BaseModel):
+    disease: str
+    weeks_ahead: int
+    layer: str
+    zoom: int
+    clustered: bool
+    tiles: int
+    features: List[MapFeature]
+
 class AlertOut(BaseModel):
     id: int
     location: LocationOut
@@ -145,7 +217,8 @@ class AlertOut(BaseModel):
     disease: str
     level: str
     message: str
-    risk_score: float
+    # None for Signal alerts from the report detectors, which have no model score
+    risk_score: Optional[float] = None
 
     class Config:
         from_attributes = True
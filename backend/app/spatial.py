@@ -0,0 +1,254 @@
+"""
+Spatial index and map tiles for the risk map.
+
+Location and Facility coordinates are bucketed into an in-memory uniform
+grid, so a bbox query only visits the cells it overlaps. Map data is cut
+into Web Mercator (slippy map) tiles. Every point belongs to exactly one
+tile per zoom level, so a viewport is the union of its tiles and each tile
+can be rendered and cached on its own. Below CLUSTER_MAX_ZOOM the points
+of a tile are merged per CLUSTER_CELLS x CLUSTER_CELLS sub-cell into
+clusters.
+
+Rendered tiles and the per-disease risk layer they are coloured from are
+cached per process. They are dropped when predictions for that disease and
+horizon are written (invalidate_risk) or when coordinates change
+(invalidate_index). The TTLs bound staleness across workers. With read
+replicas, map reads stay on the primary for a moment after either, so a
+lagging replica can't refill the caches with the old data.
+"""
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from . import models
+from .cache import TTLCache
+from .db import mark_written
+
+LAYERS = ["lga", "facility"]
+MAX_ZOOM = 18
+# Zoom levels below this return clusters instead of individual points
+CLUSTER_MAX_ZOOM = int(os.getenv("PHIP_CLUSTER_MAX_ZOOM", "9"))
+# Each tile is split into CLUSTER_CELLS^2 cluster cells (32px on a 256px tile)
+CLUSTER_CELLS = 8
+# Grid cell size of the spatial index, in degrees
+INDEX_CELL_DEGREES = 0.25
+INDEX_TTL_SECONDS = float(os.getenv("PHIP_SPATIAL_INDEX_TTL", "300"))
+# Viewports spanning more tiles than this are served from a lower zoom.
+# A 5K display (5120x2880) spans up to 21x12 tiles of 256px.
+MAX_VIEWPORT_TILES = int(os.getenv("PHIP_MAX_VIEWPORT_TILES", "256"))
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+# Read-your-writes key (db.read_db) for map reads right after an invalidation
+MAP_KEY = ("map",)
+
+# (disease, weeks_ahead) -> {(state, lga): (risk_score, risk_level)}
+risk_cache = TTLCache(ttl_seconds=300, max_entries=64)
+# (disease, weeks_ahead, layer, z, x, y) -> rendered tile
+tile_cache = TTLCache(ttl_seconds=300, max_entries=20_000)
+
+class MapPoint:
+    __slots__ = ("kind", "lat", "lon", "state", "lga", "name")
+
+    def __init__(self, kind: str, lat: float, lon: float, state: str, lga: str, name: Optional[str] = None):
+        self.kind = kind
+        self.lat = lat
+        self.lon = lon
+        self.state = state
+        self.lga = lga
+        self.name = name
+
+class GridIndex:
+    """
+    Points bucketed by (lat, lon) grid cell; query() visits only the cells
+    a bbox overlaps and then checks each candidate exactly.
+    """
+    def __init__(self, points: List[MapPoint], cell_degrees: float = INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.size = len(points)
+        self._cells: Dict[Tuple[int, int], List[MapPoint]] = defaultdict(list)
+        for p in points:
+            self._cells[self._cell(p.lat, p.lon)].append(p)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def query(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[MapPoint]:
+        lo_r, lo_c = self._cell(min_lat, min_lon)
+        hi_r, hi_c = self._cell(max_lat, max_lon)
+        if (hi_r - lo_r + 1) * (hi_c - lo_c + 1) > len(self._cells):
+            # Large boxes: scanning the occupied cells is cheaper than the range
+            candidates = [
+                p for (r, c), cell in self._cells.items()
+                if lo_r <= r <= hi_r and lo_c <= c <= hi_c for p in cell
+            ]
+        else:
+            candidates = [
+                p for r in range(lo_r, hi_r + 1) for c in range(lo_c, hi_c + 1)
+                for p in self._cells.get((r, c), ())
+            ]
+        return [p for p in candidates if min_lat <= p.lat <= max_lat and min_lon <= p.lon <= max_lon]
+
+def build_index(db: Session) -> Dict[str, GridIndex]:
+    lgas = [
+        MapPoint("lga", l.latitude, l.longitude, l.state, l.lga)
+        for l in db.query(models.Location.state, models.Location.lga, models.Location.latitude, models.Location.longitude)
+        if l.latitude is not None and l.longitude is not None
+    ]
+    facilities = [
+        MapPoint("facility", f.latitude, f.longitude, f.state, f.lga, f.name)
+        for f in db.query(models.Facility.name, models.Facility.state, models.Facility.lga, models.Facility.latitude, models.Facility.longitude)
+        if f.latitude is not None and f.longitude is not None
+    ]
+    return {"lga": GridIndex(lgas), "facility": GridIndex(facilities)}
+
+_index: Optional[Dict[str, GridIndex]] = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+def get_index(db: Session) -> Dict[str, GridIndex]:
+    global _index, _index_built_at
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built_at > INDEX_TTL_SECONDS:
+            _index = build_index(db)
+            _index_built_at = time.monotonic()
+        return _index
+
+def invalidate_index():
+    global _index
+    with _index_lock:
+        _index = None
+    tile_cache.clear()
+    mark_written(MAP_KEY)
+
+def invalidate_risk(disease: Optional[str] = None, weeks_ahead: Optional[int] = None):
+    """
+    Drops the cached risk layer and tiles for one disease (and horizon),
+    or everything when called without arguments.
+    """
+    mark_written(MAP_KEY)
+    prefix = tuple(v for v in (disease, weeks_ahead) if v is not None)
+    if not prefix:
+        risk_cache.clear()
+        tile_cache.clear()
+        return
+    risk_cache.invalidate_prefix(prefix)
+    tile_cache.invalidate_prefix(prefix)
+
+# --- Tile math (Web Mercator, 2^z x 2^z tiles, y grows southwards) ---
+
+def tile_coords(lat: float, lon: float, z: int) -> Tuple[float, float]:
+    """
+    Fractional tile coordinates of a point; the integer parts are its tile.
+    """
+    n = 2 ** z
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    # The antimeridian and the clamp latitude belong to the last tile
+    return min(x, n - 1e-9), min(max(y, 0.0), n - 1e-9)
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, min_lon, max_lat, max_lon) of a tile.
+    """
+    n = 2 ** z
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+def _tile_range(min_lat: float, min_lon: float, max_lat: float, max_lon: float, z: int) -> Tuple[range, range]:
+    x0, y0 = tile_coords(max_lat, min_lon, z)
+    x1, y1 = tile_coords(min_lat, max_lon, z)
+    return range(int(x0), int(x1) + 1), range(int(y0), int(y1) + 1)
+
+def tiles_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, z: int) -> List[Tuple[int, int]]:
+    xs, ys = _tile_range(min_lat, min_lon, max_lat, max_lon, z)
+    return [(x, y) for x in xs for y in ys]
+
+def viewport_tiles(min_lat: float, min_lon: float, max_lat: float, max_lon: float, z: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    The zoom to serve a bbox at and its tiles: z, or the highest lower zoom
+    whose tiles number at most MAX_VIEWPORT_TILES. Each step down quarters
+    the tile count and, below CLUSTER_MAX_ZOOM, merges points into clusters.
+    """
+    # Counted from the tile range, so a huge bbox at a deep zoom isn't listed out
+    while z > 0:
+        xs, ys = _tile_range(min_lat, min_lon, max_lat, max_lon, z)
+        if len(xs) * len(ys) <= MAX_VIEWPORT_TILES:
+            break
+        z -= 1
+    return z, tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, z)
+
+def feature_in_bbox(f: Dict[str, Any], min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> bool:
+    """
+    Points by position; clusters when their members' bounds overlap the
+    bbox, since the centroid can fall outside while members are inside.
+    """
+    lo_lat, lo_lon, hi_lat, hi_lon = f.get("bounds") or (f["latitude"], f["longitude"], f["latitude"], f["longitude"])
+    return lo_lat <= max_lat and hi_lat >= min_lat and lo_lon <= max_lon and hi_lon >= min_lon
+
+# --- Rendering ---
+
+def _point_feature(p: MapPoint, risk: Optional[Tuple[float, str]]) -> Dict[str, Any]:
+    return {
+        "kind": p.kind,
+        "latitude": p.lat,
+        "longitude": p.lon,
+        "state": p.state,
+        "lga": p.lga,
+        "name": p.name,
+        "risk_score": risk[0] if risk else None,
+        "risk_category": risk[1] if risk else None,
+        "count": 1,
+    }
+
+def _cluster_feature(members: List[MapPoint], risks: List[Optional[Tuple[float, str]]]) -> Dict[str, Any]:
+    scored = [r for r in risks if r]
+    top = max(scored, key=lambda r: r[0]) if scored else None
+    level_counts: Dict[str, int] = defaultdict(int)
+    for r in scored:
+        level_counts[r[1]] += 1
+    return {
+        "kind": "cluster",
+        "latitude": sum(p.lat for p in members) / len(members),
+        "longitude": sum(p.lon for p in members) / len(members),
+        # A cluster is as risky as its riskiest member
+        "risk_score": top[0] if top else None,
+        "risk_category": top[1] if top else None,
+        "count": len(members),
+        "level_counts": dict(level_counts),
+        # [min_lat, min_lon, max_lat, max_lon] of the members
+        "bounds": [
+            min(p.lat for p in members), min(p.lon for p in members),
+            max(p.lat for p in members), max(p.lon for p in members),
+        ],
+    }
+
+def render_tile(index: GridIndex, risk: Dict[Tuple[str, str], Tuple[float, str]], z: int, x: int, y: int) -> Dict[str, Any]:
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    pad = 1e-9
+    points = []
+    for p in index.query(min_lat - pad, min_lon - pad, max_lat + pad, max_lon + pad):
+        tx, ty = tile_coords(p.lat, p.lon, z)
+        # Points on a shared edge belong to one tile only
+        if int(tx) == x and int(ty) == y:
+            points.append((p, tx - x, ty - y))
+
+    clustered = z < CLUSTER_MAX_ZOOM
+    if not clustered:
+        features = [_point_feature(p, risk.get((p.state, p.lga))) for p, _, _ in points]
+    else:
+        cells = defaultdict(list)
+        for p, fx, fy in points:
+            cells[(int(fx * CLUSTER_CELLS), int(fy * CLUSTER_CELLS))].append(p)
+        features = []
+        for members in cells.values():
+            risks = [risk.get((p.state, p.lga)) for p in members]
+            if len(members) == 1:
+                features.append(_point_feature(members[0], risks[0]))
+            else:
+                features.append(_cluster_feature(members, risks))
+    return {"z": z, "x": x, "y": y, "clustered": clustered, "features": features}
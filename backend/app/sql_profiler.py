@@ -0,0 +1,174 @@
+"""
+Opt-in SQL profiler: counts and times statements per request, groups them by
+normalized shape and flags shapes repeated within one request as N+1 suspects.
+
+Enable the middleware with PHIP_SQL_PROFILE=1. Each response then carries an
+X-SQL-Profile header and a summary is logged to the "phip.sql" logger.
+query_budget() is the test-mode helper used by the benchmark suite.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+
+ENABLED = os.getenv("PHIP_SQL_PROFILE", "0") == "1"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("PHIP_SQL_PROFILE_N1_THRESHOLD", "5"))
+
+logger = logging.getLogger("phip.sql")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NAMED_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+")
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(?:\((?:[^()]*)\)\s*,?\s*)+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(statement: str) -> str:
+    """
+    Reduces a statement to its shape: literals and parameters become ?,
+    IN/VALUES lists collapse, whitespace is squashed.
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _NAMED_PARAM.sub("?", sql)
+    sql = _POSTCOMPILE.sub("(?)", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?)", sql)
+    sql = _VALUES_LIST.sub("VALUES (?) ", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+class QueryLog:
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.statements: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            self.statements.append((statement, duration))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(d for _, d in self.statements)
+
+    def shapes(self) -> Dict[str, Dict[str, float]]:
+        groups = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        for statement, duration in self.statements:
+            g = groups[normalize_sql(statement)]
+            g["count"] += 1
+            g["seconds"] += duration
+        return dict(groups)
+
+    def n_plus_one_suspects(self) -> Dict[str, Dict[str, float]]:
+        return {
+            shape: g for shape, g in self.shapes().items()
+            if g["count"] >= self.n_plus_one_threshold and shape.upper().startswith("SELECT")
+        }
+
+    def header_value(self) -> str:
+        return f"queries={self.count}; time_ms={self.total_seconds * 1000:.1f}; n_plus_one={len(self.n_plus_one_suspects())}"
+
+    def summary(self, top: int = 5) -> str:
+        lines = [self.header_value()]
+        suspects = self.n_plus_one_suspects()
+        for shape, g in sorted(suspects.items(), key=lambda kv: -kv[1]["count"])[:top]:
+            lines.append(f"  N+1 suspect x{g['count']} ({g['seconds'] * 1000:.1f} ms): {shape[:200]}")
+        return "\n".join(lines)
+
+_request_log: ContextVar[Optional[QueryLog]] = ContextVar("phip_sql_request_log", default=None)
+
+# Captures opened by query_budget(); engine-wide because test clients run
+# the app on another thread, where the caller's context is not visible.
+_active_captures: List[QueryLog] = []
+_captures_lock = threading.Lock()
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("phip_query_start", []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("phip_query_start")
+    duration = time.perf_counter() - starts.pop() if starts else 0.0
+    log = _request_log.get()
+    if log is not None:
+        log.record(statement, duration)
+    if _active_captures:
+        with _captures_lock:
+            for capture in _active_captures:
+                capture.record(statement, duration)
+
+_installed_engines = set()
+
+def install(engine):
+    if id(engine) in _installed_engines:
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    _installed_engines.add(id(engine))
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextmanager
+def query_budget(max_queries: int, engine=None, allow_n_plus_one: bool = True):
+    """
+    Fails with QueryBudgetExceeded when the block issues more than max_queries
+    statements (or any N+1 suspect, if allow_n_plus_one is False).
+
+        with query_budget(20):
+            client.get("/predictions/heatmap-data")
+    """
+    if engine is None:
+        from .db import engine
+    install(engine)
+    log = QueryLog()
+    with _captures_lock:
+        _active_captures.append(log)
+    try:
+        yield log
+    finally:
+        with _captures_lock:
+            _active_captures.remove(log)
+    if log.count > max_queries:
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} exceeded:\n{log.summary()}")
+    if not allow_n_plus_one and log.n_plus_one_suspects():
+        raise QueryBudgetExceeded(f"N+1 query pattern detected:\n{log.summary()}")
+
+class SQLProfilerMiddleware:
+    """
+    Pure ASGI middleware attaching a QueryLog to each request.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _request_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-profile", log.header_value().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_log.reset(token)
+            if log.count:
+                level = logging.WARNING if log.n_plus_one_suspects() else logging.INFO
+                logger.log(level, "%s %s %s", scope["method"], scope["path"], log.summary())
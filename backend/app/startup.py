@@ -0,0 +1,98 @@
+"""
+App startup: schema creation, ML warm-up and readiness.
+
+Importing app.main no longer pulls in pandas, numpy or sklearn, and no
+longer touches the database. The ML stack is imported on first use, and
+the schema is created by the lifespan, or by scripts/migrate.py when
+PHIP_AUTO_MIGRATE=0. That keeps cold starts and gunicorn worker boots
+short.
+
+PHIP_WARMUP chooses what happens to the models:
+  background  (default) serve at once; a thread loads the location map,
+              imports the ML stack, loads the feature store and fits every
+              disease model
+  eager       do the same before the first request is accepted
+  off         everything loads on first use
+GET /ready answers 503 until the models are warm, whatever the mode.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from .db import Base, engine, SessionLocal
+from . import locations
+
+WARMUP_MODES = ["background", "eager", "off"]
+WARMUP_MODE = os.getenv("PHIP_WARMUP", "background")
+AUTO_MIGRATE = os.getenv("PHIP_AUTO_MIGRATE", "1") == "1"
+
+# Filled in by the lifespan and the warm-up; read by GET /ready
+status: Dict[str, Any] = {
+    "schema": None,
+    "warmup": None,
+    "warmup_seconds": None,
+    "error": None,
+}
+
+def migrate():
+    """
+    Creates missing tables (and their indexes). Existing tables are not
+    altered.
+    """
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    status["schema"] = "created"
+    print(f"Schema checked in {time.perf_counter() - started:.2f}s")
+
+def warm_up(get_model: Callable, diseases: List[str]):
+    status["warmup"] = "running"
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        locations.warm(db)
+        from .ml import feature_store
+        feature_store.get_store(db)
+        for disease in diseases:
+            get_model(disease, db)
+        status["warmup"] = "done"
+    except Exception as e:
+        status["warmup"] = "failed"
+        status["error"] = str(e)
+        print(f"Warm-up failed: {e}")
+    finally:
+        db.close()
+    status["warmup_seconds"] = time.perf_counter() - started
+    print(f"Warm-up {status['warmup']} in {status['warmup_seconds']:.1f}s")
+
+def start(get_model: Callable, diseases: List[str], after_warmup: Optional[Callable] = None) -> Optional[threading.Thread]:
+    """
+    Runs the startup steps for WARMUP_MODE. after_warmup (the sweep
+    scheduler) runs once the models are warm, or right away when warm-up
+    is off. Returns the background thread, if any.
+    """
+    if AUTO_MIGRATE:
+        migrate()
+    else:
+        status["schema"] = "external"
+
+    def run():
+        if WARMUP_MODE != "off":
+            warm_up(get_model, diseases)
+        if after_warmup:
+            after_warmup()
+
+    if WARMUP_MODE == "background":
+        thread = threading.Thread(target=run, name="phip-warmup", daemon=True)
+        thread.start()
+        return thread
+    run()
+    return None
+
+def readiness(models_cache: Dict[str, Any], diseases: List[str]) -> Dict[str, Any]:
+    models = {d: d in models_cache for d in diseases}
+    return {
+        "ready": all(models.values()),
+        "mode": WARMUP_MODE,
+        **status,
+        "models": models,
+    }
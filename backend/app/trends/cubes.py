@@ -0,0 +1,271 @@
+from bisect import bisect_right, insort
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional, Dict, List, Any
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from .. import models
+from ..ml.horizons import DEFAULT_HORIZON
+
+GRAINS = ["lga_week", "state_week", "state_month"]
+DISEASES = ["cholera", "malaria", "lassa", "meningitis"]
+
+CASE_COLUMNS = [
+    "fever_cases", "diarrhea_cases", "respiratory_cases", "admissions",
+    "cholera_cases", "malaria_cases", "lassa_cases", "meningitis_cases",
+]
+ENV_COLUMNS = ["rainfall_sum", "temperature_sum", "humidity_sum", "flood_risk_sum"]
+SUM_COLUMNS = CASE_COLUMNS + ENV_COLUMNS + ["env_weeks"]
+RISK_COLUMNS = [f"{d}_risk" for d in DISEASES]
+
+# Output name -> stored sum column, averaged over env_weeks when served
+ENV_OUTPUTS = {
+    "rainfall_mm": "rainfall_sum",
+    "temperature_c": "temperature_sum",
+    "humidity_pct": "humidity_sum",
+    "flood_risk": "flood_risk_sum",
+}
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _empty_cell() -> Dict[str, Any]:
+    cell = dict.fromkeys(SUM_COLUMNS, 0)
+    cell.update(dict.fromkeys(RISK_COLUMNS))
+    return cell
+
+def _merge_cell(target: Dict[str, Any], source: Dict[str, Any]):
+    for col in SUM_COLUMNS:
+        target[col] += source[col] or 0
+    for col in RISK_COLUMNS:
+        if source[col] is not None and (target[col] is None or source[col] > target[col]):
+            target[col] = source[col]
+
+def _apply_agg(cell, agg):
+    cell["fever_cases"] = agg.total_fever_cases or 0
+    cell["diarrhea_cases"] = agg.total_diarrhea_cases or 0
+    cell["respiratory_cases"] = agg.total_respiratory_cases or 0
+    cell["admissions"] = agg.total_admissions or 0
+
+def _apply_env(cell, env):
+    cell["rainfall_sum"] = env.rainfall_mm or 0.0
+    cell["temperature_sum"] = env.temperature_c or 0.0
+    cell["humidity_sum"] = env.humidity_pct or 0.0
+    cell["flood_risk_sum"] = env.flood_risk or 0.0
+    cell["env_weeks"] = 1
+
+def _apply_disease(cell, dis):
+    for d in DISEASES:
+        cell[f"{d}_cases"] = getattr(dis, f"{d}_cases") or 0
+
+def _upsert_cell(db: Session, grain: str, state: str, lga: str, period_start: date, values: Dict[str, Any]):
+    row = db.query(models.TrendRollup).filter(
+        models.TrendRollup.grain == grain,
+        models.TrendRollup.state == state,
+        models.TrendRollup.lga == lga,
+        models.TrendRollup.period_start == period_start
+    ).first()
+    if not row:
+        row = models.TrendRollup(grain=grain, state=state, lga=lga, period_start=period_start)
+        db.add(row)
+    for col, val in values.items():
+        setattr(row, col, val)
+
+def _rolled_values(db: Session, *filters) -> Dict[str, Any]:
+    T = models.TrendRollup
+    aggregates = [func.coalesce(func.sum(getattr(T, c)), 0) for c in SUM_COLUMNS]
+    aggregates += [func.max(getattr(T, c)) for c in RISK_COLUMNS]
+    row = db.query(*aggregates).filter(*filters).one()
+    return dict(zip(SUM_COLUMNS + RISK_COLUMNS, row))
+
+def refresh_lga_week(db: Session, state: str, lga: str, week_start: date):
+    """
+    Recomputes one LGA x week cell from its source rows and rolls the change
+    up into the state-week and state-month cells. Cheap enough to call on
+    every aggregate, upload or prediction write.
+    """
+    cell = _empty_cell()
+
+    agg = db.query(models.LGAWeeklyAggregate).filter(
+        models.LGAWeeklyAggregate.state == state,
+        models.LGAWeeklyAggregate.lga == lga,
+        models.LGAWeeklyAggregate.week_start_date == week_start
+    ).first()
+    if agg:
+        _apply_agg(cell, agg)
+
+    loc = db.query(models.Location).filter(models.Location.state == state, models.Location.lga == lga).first()
+    if loc:
+        env = db.query(models.EnvMetric).filter(
+            models.EnvMetric.location_id == loc.id,
+            models.EnvMetric.week_start == week_start
+        ).first()
+        if env:
+            _apply_env(cell, env)
+        dis = db.query(models.DiseaseHistory).filter(
+            models.DiseaseHistory.location_id == loc.id,
+            models.DiseaseHistory.week_start == week_start
+        ).first()
+        if dis:
+            _apply_disease(cell, dis)
+
+    risks = (
+        db.query(models.RiskPrediction.disease, func.max(models.RiskPrediction.risk_score))
+        .filter(models.RiskPrediction.state == state)
+        .filter(models.RiskPrediction.lga == lga)
+        .filter(models.RiskPrediction.weeks_ahead == DEFAULT_HORIZON)
+        .filter(models.RiskPrediction.prediction_date >= week_start)
+        .filter(models.RiskPrediction.prediction_date < week_start + timedelta(days=7))
+        .group_by(models.RiskPrediction.disease)
+        .all()
+    )
+    for disease, score in risks:
+        if disease in DISEASES:
+            cell[f"{disease}_risk"] = score
+
+    T = models.TrendRollup
+    _upsert_cell(db, "lga_week", state, lga, week_start, cell)
+    db.flush()
+
+    state_week = _rolled_values(db, T.grain == "lga_week", T.state == state, T.period_start == week_start)
+    _upsert_cell(db, "state_week", state, "", week_start, state_week)
+    db.flush()
+
+    month = _month_start(week_start)
+    state_month = _rolled_values(
+        db, T.grain == "state_week", T.state == state,
+        T.period_start >= month, T.period_start < _next_month(month)
+    )
+    _upsert_cell(db, "state_month", state, "", month, state_month)
+    db.commit()
+
+def rebuild_rollups(db: Session, chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    Rebuilds every cube from scratch. Used for backfills and after bulk loads;
+    day-to-day maintenance goes through refresh_lga_week.
+    """
+    # aggregation imports this module
+    from ..ml.aggregation import get_week_start
+
+    locs = {l.id: (l.state, l.lga) for l in db.query(models.Location.id, models.Location.state, models.Location.lga)}
+    cells = defaultdict(_empty_cell)
+
+    for agg in db.query(models.LGAWeeklyAggregate).yield_per(chunk_size):
+        _apply_agg(cells[(agg.state, agg.lga, agg.week_start_date)], agg)
+    for env in db.query(models.EnvMetric).yield_per(chunk_size):
+        if env.location_id in locs:
+            _apply_env(cells[locs[env.location_id] + (env.week_start,)], env)
+    for dis in db.query(models.DiseaseHistory).yield_per(chunk_size):
+        if dis.location_id in locs:
+            _apply_disease(cells[locs[dis.location_id] + (dis.week_start,)], dis)
+
+    # Predictions land in the LGA cell whose week contains the prediction date.
+    # Weeks with predictions but no data get a cell of their own, as
+    # refresh_lga_week creates one when a prediction is written.
+    weeks_by_lga = defaultdict(list)
+    for state, lga, week in cells:
+        weeks_by_lga[(state, lga)].append(week)
+    for weeks in weeks_by_lga.values():
+        weeks.sort()
+
+    risks = (
+        db.query(
+            models.RiskPrediction.state,
+            models.RiskPrediction.lga,
+            models.RiskPrediction.disease,
+            models.RiskPrediction.prediction_date,
+            func.max(models.RiskPrediction.risk_score)
+        )
+        .filter(models.RiskPrediction.weeks_ahead == DEFAULT_HORIZON)
+        .group_by(
+            models.RiskPrediction.state,
+            models.RiskPrediction.lga,
+            models.RiskPrediction.disease,
+            models.RiskPrediction.prediction_date
+        )
+    )
+    for state, lga, disease, pred_date, score in risks:
+        if disease not in DISEASES:
+            continue
+        weeks = weeks_by_lga[(state, lga)]
+        i = bisect_right(weeks, pred_date) - 1
+        if i >= 0 and pred_date < weeks[i] + timedelta(days=7):
+            week = weeks[i]
+        else:
+            week = get_week_start(pred_date)
+            insort(weeks, week)
+        cell = cells[(state, lga, week)]
+        col = f"{disease}_risk"
+        if cell[col] is None or score > cell[col]:
+            cell[col] = score
+
+    state_weeks = defaultdict(_empty_cell)
+    for (state, lga, week), cell in cells.items():
+        _merge_cell(state_weeks[(state, "", week)], cell)
+    state_months = defaultdict(_empty_cell)
+    for (state, lga, week), cell in state_weeks.items():
+        _merge_cell(state_months[(state, "", _month_start(week))], cell)
+
+    db.query(models.TrendRollup).delete()
+    counts = {}
+    for grain, grain_cells in [("lga_week", cells), ("state_week", state_weeks), ("state_month", state_months)]:
+        rows = [
+            dict(grain=grain, state=state, lga=lga, period_start=period, **values)
+            for (state, lga, period), values in grain_cells.items()
+        ]
+        for i in range(0, len(rows), chunk_size):
+            db.execute(insert(models.TrendRollup), rows[i:i + chunk_size])
+        counts[grain] = len(rows)
+    db.commit()
+    return counts
+
+def query_trends(
+    db: Session,
+    grain: str,
+    state: Optional[str] = None,
+    lga: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Returns a columnar time series (column name -> list of values).
+    Without a state the cells are summed nationally per period in-database.
+    """
+    T = models.TrendRollup
+    filters = [T.grain == grain]
+    if grain != "lga_week":
+        filters.append(T.lga == "")
+    if state:
+        filters.append(T.state == state)
+    if lga:
+        filters.append(T.lga == lga)
+    if start:
+        filters.append(T.period_start >= start)
+    if end:
+        filters.append(T.period_start <= end)
+
+    stored = SUM_COLUMNS + RISK_COLUMNS
+    if state:
+        keys = [T.period_start, T.lga] if grain == "lga_week" and not lga else [T.period_start]
+        q = db.query(*keys, *[getattr(T, c) for c in stored]).filter(*filters).order_by(*keys)
+    else:
+        keys = [T.period_start]
+        aggregates = [func.sum(getattr(T, c)) for c in SUM_COLUMNS] + [func.max(getattr(T, c)) for c in RISK_COLUMNS]
+        q = db.query(T.period_start, *aggregates).filter(*filters).group_by(T.period_start).order_by(T.period_start)
+    rows = q.all()
+
+    key_names = [k.key for k in keys]
+    columns = {name: [r[i] for r in rows] for i, name in enumerate(key_names)}
+    offset = len(key_names)
+    raw = {name: [r[offset + i] for r in rows] for i, name in enumerate(stored)}
+
+    for col in CASE_COLUMNS:
+        columns[col] = [int(v or 0) for v in raw[col]]
+    for out, col in ENV_OUTPUTS.items():
+        columns[out] = [(s or 0) / n if n else None for s, n in zip(raw[col], raw["env_weeks"])]
+    for col in RISK_COLUMNS:
+        columns[col] = raw[col]
+    return columns
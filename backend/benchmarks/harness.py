@@ -0,0 +1,96 @@
+import json
+import math
+import time
+from typing import Callable, Dict, Any, List
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(latencies: List[float], errors: int, wall_time: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    n = len(values)
+    return {
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": n / wall_time if wall_time > 0 else 0.0,
+        "mean_ms": sum(values) / n * 1000 if n else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p90_ms": percentile(values, 90) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if n else 0.0,
+    }
+
+def run_scenario(send: Callable[[int], Any], iterations: int, warmup: int = 2) -> Dict[str, Any]:
+    """
+    Calls send(i) for each iteration and records per-request latency.
+    send returns an HTTP response; non-2xx responses are counted as errors.
+    """
+    for i in range(warmup):
+        send(-1 - i)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        response = send(i)
+        latencies.append(time.perf_counter() - t)
+        if not 200 <= response.status_code < 300:
+            errors += 1
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+def save_results(path: str, results: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2,
+            metrics=("p50_ms", "p99_ms")) -> List[Dict[str, Any]]:
+    """
+    Compares scenario latencies against a saved baseline. A scenario regresses
+    when a metric is more than `threshold` (fractional) slower than baseline.
+    """
+    rows = []
+    for name, result in current.get("scenarios", {}).items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in metrics:
+            before, after = base.get(metric, 0.0), result.get(metric, 0.0)
+            change = (after - before) / before if before else 0.0
+            rows.append({
+                "scenario": name,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": change,
+                "regressed": change > threshold,
+            })
+    return rows
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'scenario':<24} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for r in rows:
+        flag = "  REGRESSION" if r["regressed"] else ""
+        lines.append(
+            f"{r['scenario']:<24} {r['metric']:<8} {r['baseline']:>10.2f} {r['current']:>10.2f} "
+            f"{r['change'] * 100:>7.1f}%{flag}"
+        )
+    return "\n".join(lines)
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [f"{'scenario':<24} {'n':>5} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}"]
+    for name, r in results.get("scenarios", {}).items():
+        queries = f"{r['queries']}/{r['query_budget']}" if "queries" in r else "-"
+        lines.append(
+            f"{name:<24} {r['requests']:>5} {r['errors']:>4} {r['throughput_rps']:>8.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {queries:>8}"
+        )
+    return "\n".join(lines)
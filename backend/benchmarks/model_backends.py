@@ -0,0 +1,117 @@
+"""
+Compares RiskModel backends (PHIP_MODEL_BACKEND) on identical data and the
+same TimeSeriesSplit folds: mean fold AUC/F1 and fit time per disease.
+
+    cd backend
+    python -m benchmarks.model_backends --lgas 100 --weeks 260 --out backends.json
+    python -m benchmarks.model_backends --db-url postgresql://... --skip-seed
+
+Seeding and the throwaway database work as in benchmarks.run.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.harness import save_results  # noqa: E402
+from benchmarks.run import DISEASES, configure_environment, git_revision, seed  # noqa: E402
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare RiskModel backends on the same CV folds")
+    parser.add_argument("--lgas", type=int, default=50, help="LGAs to seed")
+    parser.add_argument("--facilities", type=int, default=1, help="Synthetic facilities per LGA")
+    parser.add_argument("--weeks", type=int, default=260, help="Weeks of history to seed")
+    parser.add_argument("--report-weeks", type=int, default=0, help="Recent weeks with daily facility reports")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", default="gbc,hgb", help="Comma-separated backends to compare")
+    parser.add_argument("--diseases", default=",".join(DISEASES))
+    parser.add_argument("--splits", type=int, default=3, help="TimeSeriesSplit folds")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL"), help="Postgres URL (default: temp SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in --db-url")
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    return parser.parse_args(argv)
+
+def format_table(rows) -> str:
+    lines = [f"{'disease':<12} {'backend':<8} {'rows':>8} {'auc':>7} {'f1':>7} {'fit s':>8} {'speedup':>8}"]
+    for r in rows:
+        speedup = f"{r['speedup']:.1f}x" if r.get("speedup") else "-"
+        lines.append(
+            f"{r['disease']:<12} {r['backend']:<8} {r['rows']:>8} {r['auc']:>7.3f} {r['f1']:>7.3f} "
+            f"{r['fit_seconds']:>8.2f} {speedup:>8}"
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    args = parse_args(argv)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="phip-bench-") as workdir:
+        configure_environment(args, workdir)
+
+        from app.db import SessionLocal
+        from app.ml.model import RiskModel, DEFAULT_HORIZON
+        # Compared on the default (t+2) horizon's target
+        target = f"target_h{DEFAULT_HORIZON}"
+
+        if not args.skip_seed:
+            # Initial predictions would train the default backend; not needed here
+            seed(args, predict=False)
+
+        db = SessionLocal()
+        try:
+            loader = RiskModel(args.diseases.split(",")[0])
+            raw_df = loader._load_training_frame(db)
+        finally:
+            db.close()
+        if raw_df.empty:
+            sys.exit("No training data; run without --skip-seed")
+
+        rows = []
+        for disease in args.diseases.split(","):
+            baseline_fit = None
+            for backend in backends:
+                model = RiskModel(disease, backend=backend)
+                df = model._feature_engineering(raw_df.copy(), loader.neighbours)
+                features = model._feature_columns(df)
+                labelled = df[target].notna()
+                X, y = df.loc[labelled, features].values, df.loc[labelled, target].values
+                print(f"Fitting {disease}/{backend} on {len(X)} rows...", flush=True)
+                started = time.perf_counter()
+                folds = model.cross_validate(X, y, n_splits=args.splits)
+                total = time.perf_counter() - started
+                fit_seconds = sum(f["fit_seconds"] for f in folds)
+                if baseline_fit is None:
+                    baseline_fit = fit_seconds
+                rows.append({
+                    "disease": disease,
+                    "backend": backend,
+                    "rows": len(X),
+                    "auc": sum(f["auc"] for f in folds) / len(folds),
+                    "f1": sum(f["f1"] for f in folds) / len(folds),
+                    "fit_seconds": fit_seconds,
+                    # Includes scoring
+                    "total_seconds": total,
+                    "speedup": baseline_fit / fit_seconds if fit_seconds else None,
+                    "folds": folds,
+                })
+
+    print(format_table(rows))
+    if args.out:
+        save_results(args.out, {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "splits": args.splits,
+                "dataset": {"lgas": args.lgas, "weeks": args.weeks, "seed": args.seed},
+            },
+            "results": rows,
+        })
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+End-to-end benchmarks for PHIP's hot endpoints.
+
+Seeds a deterministic dataset, drives the app in-process through the ASGI
+test client and reports throughput and p50/p90/p99 latency per endpoint.
+
+    cd backend
+    python -m benchmarks.run --lgas 50 --weeks 156 --out bench.json
+    python -m benchmarks.run --lgas 50 --weeks 156 --baseline bench.json
+
+A throwaway SQLite file is used unless --db-url (or BENCH_DATABASE_URL)
+points at a local Postgres database dedicated to benchmarking. With
+--baseline the run exits non-zero when any scenario's p50/p99 is more than
+--threshold slower than the saved results. Each scenario also replays one
+request under sql_profiler.query_budget(); going over QUERY_BUDGETS fails
+the run unless --no-query-budgets is given.
+"""
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.harness import (  # noqa: E402
+    run_scenario, save_results, load_results, compare, format_comparison, format_results,
+)
+
+DISEASES = ["cholera", "malaria", "lassa", "meningitis"]
+SCENARIOS = [
+    "submit_report", "sms_ingest", "predictions_lga", "heatmap_data", "map_viewport", "feedback", "retrain",
+]
+# Max DB statements per request; a scenario over budget fails the run
+QUERY_BUDGETS = {
+    "submit_report": 80,
+    "sms_ingest": 40,
+    "predictions_lga": 20,
+    "heatmap_data": 2,
+    # Cold tile cache: spatial index (2) + risk layer (1)
+    "map_viewport": 3,
+    "feedback": 10,
+    "retrain": 60,
+}
+BENCH_USER = "bench_facility"
+BENCH_PASSWORD = "bench_password"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PHIP's hot endpoints in-process")
+    parser.add_argument("--lgas", type=int, default=25, help="LGAs to seed")
+    parser.add_argument("--facilities", type=int, default=3, help="Synthetic facilities per LGA")
+    parser.add_argument("--weeks", type=int, default=156, help="Weeks of history to seed")
+    parser.add_argument("--report-weeks", type=int, default=4, help="Recent weeks with daily facility reports")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests per scenario")
+    parser.add_argument("--retrain-requests", type=int, default=2, help="Measured /predictions/retrain calls")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset to run")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL"), help="Postgres URL (default: temp SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in --db-url")
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed fractional slowdown vs baseline")
+    parser.add_argument("--no-query-budgets", action="store_true", help="Don't fail on per-request query budgets")
+    return parser.parse_args(argv)
+
+def configure_environment(args, workdir: str):
+    # Must run before the app is imported: db.py and the model dir read env at import
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["PHIP_MODEL_DIR"] = os.path.join(workdir, "models")
+    os.environ["PHIP_CACHE_DIR"] = os.path.join(workdir, "cache")
+    # One benchmark facility sends every write; measure the endpoints, not admission control
+    os.environ.setdefault("PHIP_RATE_LIMIT", "0")
+    os.makedirs(os.environ["PHIP_MODEL_DIR"], exist_ok=True)
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+def seed(args, predict: bool = True):
+    from app.db import SessionLocal
+    from scripts.generate_data import generate
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        generate(
+            db,
+            n_lgas=args.lgas,
+            facilities_per_lga=args.facilities,
+            n_weeks=args.weeks,
+            report_weeks=args.report_weeks,
+            seed=args.seed,
+            predict=predict,
+        )
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+def login(client, state: str, lga: str) -> dict:
+    client.post("/auth/register", json={
+        "name": "Benchmark PHC", "type": "PHC", "state": state, "lga": lga,
+        "username": BENCH_USER, "password": BENCH_PASSWORD,
+    })
+    res = client.post("/auth/login", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def build_scenarios(client, headers: dict, locations: list):
+    today = date.today()
+
+    def report_date(i):
+        return today - timedelta(days=i % 28)
+
+    def submit_report(i):
+        return client.post("/reports/", headers=headers, json={
+            "report_date": str(report_date(i)),
+            "fever_cases": 10 + i % 7,
+            "diarrhea_cases": 4 + i % 5,
+            "respiratory_cases": 6,
+            "hospital_admissions": 1,
+            "bed_occupancy_rate": 55.0,
+        })
+
+    def sms_ingest(i):
+        text = f"{BENCH_USER}#{report_date(i)}#F{12 + i % 9}#D{5 + i % 4}#R7#A2#BO60#ORSNORM#ABNORM"
+        return client.post("/sms/ingest", json={"text": text})
+
+    def predictions_lga(i):
+        state, lga = locations[i % len(locations)]
+        return client.get(f"/predictions/{quote(state)}/{quote(lga)}", params={"disease": DISEASES[i % 4]})
+
+    def heatmap_data(i):
+        return client.get("/predictions/heatmap-data", params={"disease": DISEASES[i % 4]})
+
+    def map_viewport(i):
+        # Whole-country view at the frontend's initial zoom
+        return client.get("/predictions/viewport", params={
+            "min_lat": 4.0, "min_lon": 2.5, "max_lat": 14.0, "max_lon": 15.0, "zoom": 6,
+            "disease": DISEASES[i % 4],
+        })
+
+    def feedback(i):
+        return client.get("/reports/feedback", headers=headers)
+
+    def retrain(i):
+        return client.post("/predictions/retrain")
+
+    return {
+        "submit_report": submit_report,
+        "sms_ingest": sms_ingest,
+        "predictions_lga": predictions_lga,
+        "heatmap_data": heatmap_data,
+        "map_viewport": map_viewport,
+        "feedback": feedback,
+        "retrain": retrain,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {sorted(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="phip-bench-") as workdir:
+        configure_environment(args, workdir)
+
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.db import SessionLocal, engine
+        from app import models
+        from app.sql_profiler import query_budget, QueryBudgetExceeded
+
+        seed_seconds = 0.0 if args.skip_seed else seed(args)
+
+        db = SessionLocal()
+        try:
+            locations = [(l.state, l.lga) for l in db.query(models.Location).order_by(models.Location.id)]
+        finally:
+            db.close()
+        if not locations:
+            sys.exit("No locations seeded; run without --skip-seed")
+
+        client = TestClient(app)
+        headers = login(client, *locations[-1])
+        scenarios = build_scenarios(client, headers, locations)
+
+        results = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "database": engine.dialect.name,
+                "dataset": {
+                    "lgas": len(locations),
+                    "facilities_per_lga": args.facilities,
+                    "weeks": args.weeks,
+                    "report_weeks": args.report_weeks,
+                    "seed": args.seed,
+                },
+                "seed_seconds": seed_seconds,
+            },
+            "scenarios": {},
+        }
+        for name in selected:
+            iterations = args.retrain_requests if name == "retrain" else args.requests
+            warmup = 0 if name == "retrain" else 2
+            print(f"Running {name} ({iterations} requests)...", flush=True)
+            results["scenarios"][name] = result = run_scenario(scenarios[name], iterations, warmup=warmup)
+
+            # One extra profiled request to check the scenario's query budget
+            try:
+                with query_budget(QUERY_BUDGETS[name], engine) as log:
+                    scenarios[name](iterations)
+                result["budget_exceeded"] = False
+            except QueryBudgetExceeded as e:
+                print(e)
+                result["budget_exceeded"] = True
+            result["queries"] = log.count
+            result["query_budget"] = QUERY_BUDGETS[name]
+            result["n_plus_one_suspects"] = len(log.n_plus_one_suspects())
+
+    print(format_results(results))
+    if args.out:
+        save_results(args.out, results)
+        print(f"Results written to {args.out}")
+
+    failed = False
+    if args.baseline:
+        rows = compare(results, load_results(args.baseline), args.threshold)
+        print(format_comparison(rows))
+        failed = any(r["regressed"] for r in rows)
+    if not args.no_query_budgets:
+        over = [n for n, r in results["scenarios"].items() if r["budget_exceeded"]]
+        if over:
+            print(f"Query budget exceeded: {', '.join(over)}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
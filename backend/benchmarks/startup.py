@@ -0,0 +1,176 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app,
+run its lifespan, answer /health, turn /ready and serve a first prediction,
+for each PHIP_WARMUP mode.
+
+    cd backend
+    python -m benchmarks.startup --lgas 25 --out startup.json
+    python -m benchmarks.startup --modes background,off --runs 5
+
+Every run is a new interpreter, so imports are genuinely cold (modulo the
+OS page cache). Seeding and the throwaway database work as in
+benchmarks.run. A worker fits each disease model on first use, so "ready"
+includes those fits and grows with --lgas and --weeks.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.harness import save_results  # noqa: E402
+from benchmarks.run import configure_environment, git_revision, seed  # noqa: E402
+
+MODES = ["background", "eager", "off"]
+# The heavy modules a cold import used to pull in
+HEAVY_MODULES = ["pandas", "numpy", "sklearn", "scipy"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure PHIP cold-start time per warm-up mode")
+    parser.add_argument("--lgas", type=int, default=25, help="LGAs to seed")
+    parser.add_argument("--facilities", type=int, default=1, help="Synthetic facilities per LGA")
+    parser.add_argument("--weeks", type=int, default=156, help="Weeks of history to seed")
+    parser.add_argument("--report-weeks", type=int, default=0, help="Recent weeks with daily facility reports")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated PHIP_WARMUP modes")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per mode")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for /ready")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DATABASE_URL"), help="Postgres URL (default: temp SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in --db-url")
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def cold_start(mode: str, ready_timeout: float) -> dict:
+    """
+    Runs in the child process: times each startup milestone from the moment
+    the interpreter reaches this function.
+    """
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    from fastapi.testclient import TestClient
+    client = TestClient(app)
+    client.__enter__()
+    try:
+        lifespan = time.perf_counter()
+        client.get("/health").raise_for_status()
+        health = time.perf_counter()
+
+        ready = None
+        # With warm-up off nothing loads until a request needs it
+        while mode != "off" and time.perf_counter() - started < ready_timeout:
+            if client.get("/ready").status_code == 200:
+                ready = time.perf_counter()
+                break
+            time.sleep(0.05)
+
+        from app import models
+        from app.db import SessionLocal
+        db = SessionLocal()
+        try:
+            loc = db.query(models.Location.state, models.Location.lga).first()
+        finally:
+            db.close()
+        prediction_ms = None
+        if loc:
+            t = time.perf_counter()
+            # off mode: this request is the one that loads the ML stack and model
+            client.get(f"/predictions/{quote(loc[0])}/{quote(loc[1])}").raise_for_status()
+            prediction_ms = (time.perf_counter() - t) * 1000
+    finally:
+        client.__exit__(None, None, None)
+
+    return {
+        "import_s": imported - started,
+        "heavy_on_import": heavy,
+        "lifespan_s": lifespan - started,
+        "health_s": health - started,
+        "ready_s": ready - started if ready is not None else None,
+        "first_prediction_ms": prediction_ms,
+    }
+
+def run_child(mode: str, ready_timeout: float) -> dict:
+    env = dict(os.environ, PHIP_WARMUP=mode)
+    # The sweep scheduler would add its own work to the measurement
+    env.pop("PHIP_SWEEP_INTERVAL_MINUTES", None)
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-m", "benchmarks.startup",
+         "--child", mode, "--ready-timeout", str(ready_timeout)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    # The app prints progress; the result is the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+def format_table(rows) -> str:
+    def cell(value, fmt):
+        return format(value, fmt) if value is not None else "-"
+
+    lines = [f"{'mode':<12} {'import s':>9} {'lifespan s':>11} {'health s':>9} {'ready s':>8} {'1st pred ms':>12}"]
+    for r in rows:
+        lines.append(
+            f"{r['mode']:<12} {cell(r['import_s'], '.2f'):>9} {cell(r['lifespan_s'], '.2f'):>11} "
+            f"{cell(r['health_s'], '.2f'):>9} {cell(r['ready_s'], '.2f'):>8} "
+            f"{cell(r['first_prediction_ms'], '.0f'):>12}"
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(cold_start(args.child, args.ready_timeout)))
+        return
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    with tempfile.TemporaryDirectory(prefix="phip-bench-") as workdir:
+        configure_environment(args, workdir)
+        if not args.skip_seed:
+            print(f"Seeding {args.lgas} LGAs x {args.weeks} weeks...", flush=True)
+            seed(args)
+
+        rows = []
+        for mode in modes:
+            runs = []
+            for i in range(args.runs):
+                print(f"Cold start {mode} #{i + 1}...", flush=True)
+                runs.append(run_child(mode, args.ready_timeout))
+            heavy = sorted({m for r in runs for m in r["heavy_on_import"]})
+            if heavy:
+                print(f"  warning: importing app.main loaded {', '.join(heavy)}")
+            rows.append({
+                "mode": mode,
+                **{key: median(r[key] for r in runs)
+                   for key in ("import_s", "lifespan_s", "health_s", "ready_s", "first_prediction_ms")},
+                "heavy_on_import": heavy,
+                "runs": runs,
+            })
+
+    print(format_table(rows))
+    if args.out:
+        save_results(args.out, {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "python": sys.version.split()[0],
+                "runs": args.runs,
+                "dataset": {"lgas": args.lgas, "weeks": args.weeks, "seed": args.seed},
+            },
+            "results": rows,
+        })
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+import os
+import argparse
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.ml import export
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PHIP training data to Parquet / Arrow IPC")
+    parser.add_argument("out_dir", help="Directory to write the files into")
+    parser.add_argument("--dataset", choices=export.DATASETS, action="append",
+                        help="Dataset to export (repeatable). Defaults to all.")
+    parser.add_argument("--format", choices=export.FORMATS, default="parquet")
+    parser.add_argument("--disease", default="cholera", help="Disease for the features dataset")
+    parser.add_argument("--batch-size", type=int, default=export.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    ext = "arrows" if args.format == "arrow" else "parquet"
+    db = SessionLocal()
+    try:
+        for dataset in args.dataset or export.DATASETS:
+            name = f"features_{args.disease}" if dataset == "features" else dataset
+            path = os.path.join(args.out_dir, f"{name}.{ext}")
+            batches = export.iter_dataset_batches(db, dataset, disease=args.disease, batch_size=args.batch_size)
+            rows = export.write_batches(batches, path, args.format)
+            print(f"{dataset}: {rows} rows -> {path}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,18 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-import random
-from datetime import date, timedelta
+import io
+import time
+import uuid
+import argparse
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.db import SessionLocal, Base, engine
-from app import models
+from app import models, auth_utils, locations
+from app.ml.aggregation import get_week_start
 
 N_WEEKS = 260  # 5 years
 STATES_LGAS = [
@@ -22,168 +29,364 @@ STATES_LGAS = [
     ("Rivers", "Port Harcourt", 4.8242, 7.0336),
     ("Kano", "Nassarawa", 12.0100, 8.5300), # Adding the location of our test user
 ]
+NIGERIA_STATES = [
+    "Abia", "Adamawa", "Akwa Ibom", "Anambra", "Bauchi", "Bayelsa", "Benue", "Borno",
+    "Cross River", "Delta", "Ebonyi", "Edo", "Ekiti", "Enugu", "FCT", "Gombe", "Imo",
+    "Jigawa", "Kaduna", "Kano", "Katsina", "Kebbi", "Kogi", "Kwara", "Lagos", "Nasarawa",
+    "Niger", "Ogun", "Ondo", "Osun", "Oyo", "Plateau", "Rivers", "Sokoto", "Taraba",
+    "Yobe", "Zamfara",
+]
+# Rough bounding box of Nigeria for synthetic coordinates
+LAT_RANGE = (4.3, 13.9)
+LON_RANGE = (2.7, 14.6)
+
+SYNTHETIC_USER_PREFIX = "synth_"
+SYNTHETIC_PASSWORD = "phip_synthetic_2026"
+DEFAULT_CHUNK_SIZE = 50_000
+
+def _log(msg: str):
+    print(msg, flush=True)
 
-def seed_locations(db: Session):
-    for state, lga, lat, lon in STATES_LGAS:
-        existing = db.query(models.Location).filter(models.Location.state == state, models.Location.lga == lga).first()
-        if not existing:
-            loc = models.Location(state=state, lga=lga, latitude=lat, longitude=lon)
-            db.add(loc)
+def _uuids(rng: np.random.Generator, n: int) -> list:
+    # Seeded UUID4s so repeated runs produce identical ids
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    return [str(uuid.UUID(bytes=row.tobytes(), version=4)) for row in raw]
+
+def bulk_insert(db: Session, model, df: pd.DataFrame, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Writes a frame in chunks: COPY on Postgres, executemany elsewhere.
+    Column defaults are not applied by COPY, so callers pass every column.
+    """
+    if df.empty:
+        return 0
+    table = model.__table__
+    cols = list(df.columns)
+    use_copy = db.bind.dialect.name == "postgresql"
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        if use_copy:
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cursor = db.connection().connection.cursor()
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv, NULL '')", buf
+            )
+        else:
+            db.execute(insert(table), chunk.to_dict("records"))
     db.commit()
+    return len(df)
 
-def generate(db: Session):
-    Base.metadata.create_all(bind=engine)
-    seed_locations(db)
-    
+def seed_locations(db: Session, n_lgas: int = 0, rng: np.random.Generator = None):
+    """
+    Ensures the named demo LGAs exist, plus n_lgas synthetic ones spread across
+    the states (e.g. 774 for a national-scale dataset).
+    """
+    rng = rng if rng is not None else np.random.default_rng(42)
+    wanted = list(STATES_LGAS)
+    for i in range(max(0, n_lgas - len(STATES_LGAS))):
+        state = NIGERIA_STATES[i % len(NIGERIA_STATES)]
+        wanted.append((
+            state,
+            f"{state} LGA {i // len(NIGERIA_STATES) + 1:02d}",
+            float(rng.uniform(*LAT_RANGE)),
+            float(rng.uniform(*LON_RANGE)),
+        ))
+
+    ids = locations.resolve_many(db, [(w[0], w[1]) for w in wanted], {(w[0], w[1]): (w[2], w[3]) for w in wanted})
+    return db.query(models.Location).filter(models.Location.id.in_(ids.values())).order_by(models.Location.id).all()
+
+def simulate_weekly(rng: np.random.Generator, n_locs: int, n_weeks: int) -> dict:
+    """
+    Vectorized weekly series for every location at once, shape (n_locs, n_weeks).
+    """
+    shape = (n_locs, n_weeks)
+    week_of_year = np.arange(n_weeks) % 52
+    is_rainy = (week_of_year >= 15) & (week_of_year <= 40)
+
+    # Rain: higher in rainy season; Temp: cooler in rainy season
+    rainfall = np.maximum(0, rng.normal(np.where(is_rainy, 150, 10), 30, size=shape))
+    temperature = np.maximum(15, rng.normal(np.where(is_rainy, 25, 32), 3, size=shape))
+    humidity = np.clip(rainfall * 0.4 + 40 + rng.uniform(-5, 5, size=shape), 20, 100)
+    flood_risk = np.minimum(1.0, rainfall / 250.0)
+
+    # Community signals influenced by environment
+    fever = np.floor(np.maximum(0, rng.normal(20, 5, size=shape) + rainfall / 20)).astype(np.int64)
+    respiratory = np.floor(np.maximum(0, rng.normal(15, 4, size=shape))).astype(np.int64)
+    diarrhea = np.floor(np.maximum(0, rng.normal(10, 3, size=shape) + fever / 30 + rainfall / 50)).astype(np.int64)
+    vomiting = np.floor(np.maximum(0, rng.normal(5, 2, size=shape))).astype(np.int64)
+    admissions = np.floor(np.maximum(0, fever * 0.05 + rng.uniform(0, 2, size=shape))).astype(np.int64)
+    bed_occupancy = np.clip(40 + fever / 2, 20, 100)
+    low_stock = rng.choice([0, 0, 0, 1, 2], size=shape)
+
+    # Disease outcomes
+    # Cholera spikes with high rain and diarrhea
+    c_risk = (rainfall > 100) & (diarrhea > 20)
+    cholera = np.where(c_risk, rng.normal(50, 15, size=shape), rng.normal(2, 2, size=shape))
+    # Malaria follows fever and rain
+    malaria = fever * 0.6 + rng.normal(0, 5, size=shape)
+    # Lassa random but seasonal (dry season usually)
+    lassa = np.where(rainfall < 50, rng.normal(10, 3, size=shape), rng.normal(1, 1, size=shape))
+    # Meningitis (dry season, heat)
+    hot_dry = (temperature > 30) & (rainfall < 20)
+    meningitis = np.where(hot_dry, rng.normal(20, 5, size=shape), rng.normal(0, 1, size=shape))
+
+    as_cases = lambda a: np.floor(np.maximum(0, a)).astype(np.int64)
+    return {
+        "rainfall": rainfall, "temperature": temperature, "humidity": humidity, "flood_risk": flood_risk,
+        "fever": fever, "respiratory": respiratory, "diarrhea": diarrhea, "vomiting": vomiting,
+        "admissions": admissions, "bed_occupancy": bed_occupancy, "low_stock": low_stock,
+        "cholera": as_cases(cholera), "malaria": as_cases(malaria),
+        "lassa": as_cases(lassa), "meningitis": as_cases(meningitis),
+    }
+
+def seed_facilities(db: Session, rng: np.random.Generator, locs: list, per_lga: int) -> np.ndarray:
+    """
+    Creates per_lga synthetic facilities (with one login each) per LGA.
+    Returns facility ids shaped (n_locs, per_lga).
+    """
+    n = len(locs) * per_lga
+    ids = _uuids(rng, n)
+    now = datetime.utcnow()
+    loc_idx = np.repeat(np.arange(len(locs)), per_lga)
+    slot = np.tile(np.arange(per_lga), len(locs))
+    lat = np.array([l.latitude or 9.0820 for l in locs])[loc_idx] + rng.normal(0, 0.05, n)
+    lon = np.array([l.longitude or 8.6753 for l in locs])[loc_idx] + rng.normal(0, 0.05, n)
+
+    facilities = pd.DataFrame({
+        "id": ids,
+        "name": [f"Synthetic {'PHC' if s else 'Hospital'} {locs[i].lga} {s + 1}" for i, s in zip(loc_idx, slot)],
+        "type": np.where(slot == 0, "Hospital", "PHC"),
+        "state": [locs[i].state for i in loc_idx],
+        "lga": [locs[i].lga for i in loc_idx],
+        "latitude": lat,
+        "longitude": lon,
+        "created_at": now,
+    })
+    # Hashing is deliberately slow, so every synthetic login shares one hash
+    password_hash = auth_utils.get_password_hash(SYNTHETIC_PASSWORD)
+    users = pd.DataFrame({
+        "id": _uuids(rng, n),
+        "facility_id": ids,
+        "username": [f"{SYNTHETIC_USER_PREFIX}{locs[i].id}_{s + 1}" for i, s in zip(loc_idx, slot)],
+        "password_hash": password_hash,
+        "role": "facility_user",
+        "created_at": now,
+    })
+    bulk_insert(db, models.Facility, facilities)
+    bulk_insert(db, models.FacilityUser, users)
+    return np.array(ids, dtype=object).reshape(len(locs), per_lga)
+
+def seed_daily_reports(
+    db: Session,
+    rng: np.random.Generator,
+    facility_ids: np.ndarray,
+    weeks: list,
+    series: dict,
+    week_offset: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    locs_per_chunk: int = 25,
+) -> int:
+    """
+    Splits each LGA's weekly totals across its facilities and the 7 days of the
+    week, so facility reports add up exactly to the weekly aggregates. Also
+    rewrites the weekly bed occupancy / low-stock series from the daily rows.
+    """
+    n_locs, per_lga = facility_ids.shape
+    n_weeks = len(weeks)
+    slots = per_lga * 7
+    pvals = np.full(slots, 1.0 / slots)
+    day_offsets = np.array([timedelta(days=d) for d in range(7)], dtype=object)
+    now = datetime.utcnow()
+    written = 0
+
+    for lo in range(0, n_locs, locs_per_chunk):
+        hi = min(n_locs, lo + locs_per_chunk)
+        w = slice(week_offset, week_offset + n_weeks)
+        # (locs, weeks, facilities * 7 days)
+        split = {
+            col: rng.multinomial(series[src][lo:hi, w], pvals)
+            for col, src in [
+                ("fever_cases", "fever"), ("diarrhea_cases", "diarrhea"),
+                ("respiratory_cases", "respiratory"), ("hospital_admissions", "admissions"),
+                ("vomiting_cases", "vomiting"),
+            ]
+        }
+        shape = split["fever_cases"].shape
+        split["severe_dehydration_cases"] = rng.poisson(split["diarrhea_cases"] * 0.05)
+        split["unexplained_deaths"] = rng.poisson(0.01, size=shape)
+        split["bed_occupancy_rate"] = np.clip(
+            series["bed_occupancy"][lo:hi, w][..., None] + rng.normal(0, 8, size=shape), 0, 100
+        ).round(1)
+        ors = rng.choice(np.array(["Normal", "Low", "Out"]), p=[0.85, 0.12, 0.03], size=shape)
+        antibiotics = rng.choice(np.array(["Normal", "Low", "Out"]), p=[0.88, 0.1, 0.02], size=shape)
+
+        series["bed_occupancy"][lo:hi, w] = split["bed_occupancy_rate"].mean(axis=2)
+        series["low_stock"][lo:hi, w] = ((ors != "Normal") | (antibiotics != "Normal")).sum(axis=2)
+
+        n_rows = int(np.prod(shape))
+        fac = np.broadcast_to(np.repeat(facility_ids[lo:hi], 7, axis=1)[:, None, :], shape)
+        week_dates = np.array(weeks, dtype=object)
+        dates = week_dates[None, :, None] + np.tile(day_offsets, per_lga)[None, None, :]
+        dates = np.broadcast_to(dates, shape)
+
+        df = pd.DataFrame({"id": _uuids(rng, n_rows), "facility_id": fac.ravel(), "report_date": dates.ravel()})
+        for col, values in split.items():
+            df[col] = values.ravel()
+        df["ors_stock_level"] = ors.ravel()
+        df["antibiotics_stock_level"] = antibiotics.ravel()
+        df["notes"] = None
+        df["created_at"] = now
+        written += bulk_insert(db, models.DailyReport, df, chunk_size)
+    return written
+
+def clear_generated_data(db: Session):
     # Clear existing data to avoid conflicts when regenerating
     db.query(models.EnvMetric).delete()
     db.query(models.LGAWeeklyAggregate).delete() # Updated from CommunitySignal
     db.query(models.DiseaseHistory).delete()
     db.query(models.RiskPrediction).delete() # Updated from Prediction
     db.query(models.Alert).delete()
-    db.commit()
+    db.query(models.TrendRollup).delete()
 
-    today = date.today()
-    start_week = today - timedelta(days=7 * N_WEEKS)
-    
-    for loc in db.query(models.Location).all():
-        # Generate base signals
-        rainfall = []
-        temperature = []
-        
-        # Simple seasonality simulation
-        for i in range(N_WEEKS):
-            week_of_year = (i % 52)
-            is_rainy = 15 <= week_of_year <= 40
-            
-            # Rain: higher in rainy season
-            base_rain = 150 if is_rainy else 10
-            rain_val = max(0, random.gauss(base_rain, 30))
-            rainfall.append(rain_val)
-            
-            # Temp: cooler in rainy season
-            base_temp = 25 if is_rainy else 32
-            temp_val = max(15, random.gauss(base_temp, 3))
-            temperature.append(temp_val)
-
-        humidity = [min(100, max(20, r * 0.4 + 40 + random.uniform(-5, 5))) for r in rainfall]
-        flood_risk = [min(1.0, r / 250.0) for r in rainfall]
-
-        # Community signals influenced by environment
-        fever = [int(max(0, random.gauss(20, 5) + (r / 20))) for r in rainfall] 
-        respiratory = [int(max(0, random.gauss(15, 4))) for _ in range(N_WEEKS)] # Renamed from cough
-        diarrhea = [int(max(0, random.gauss(10, 3) + (f / 30) + (r/50))) for f, r in zip(fever, rainfall)] 
-        vomiting = [int(max(0, random.gauss(5, 2))) for _ in range(N_WEEKS)]
-        
-        # New aggregates for LGAWeeklyAggregate
-        admissions = [int(max(0, f * 0.05 + random.uniform(0, 2))) for f in fever]
-        bed_occupancy = [min(100, max(20, 40 + (f/2))) for f in fever]
-        low_stock = [int(max(0, random.choice([0, 0, 0, 1, 2]))) for _ in range(N_WEEKS)]
-
-        # Disease outcomes
-        cholera = []
-        malaria = []
-        lassa = []
-        meningitis = []
-        
-        for i in range(N_WEEKS):
-            # Cholera spikes with high rain and diarrhea
-            c_risk = (rainfall[i] > 100) and (diarrhea[i] > 20)
-            c_cases = int(random.gauss(50, 15)) if c_risk else int(max(0, random.gauss(2, 2)))
-            cholera.append(c_cases)
-            
-            # Malaria follows fever and rain
-            m_cases = int(max(0, fever[i] * 0.6 + random.gauss(0, 5)))
-            malaria.append(m_cases)
-            
-            # Lassa random but seasonal (dry season usually)
-            is_dry = rainfall[i] < 50
-            l_cases = int(max(0, random.gauss(10, 3))) if is_dry else int(max(0, random.gauss(1, 1)))
-            lassa.append(l_cases)
-            
-            # Meningitis (dry season, heat)
-            is_hot_dry = (temperature[i] > 30) and (rainfall[i] < 20)
-            men_cases = int(max(0, random.gauss(20, 5))) if is_hot_dry else int(max(0, random.gauss(0, 1)))
-            meningitis.append(men_cases)
-
-        # Bulk insert
-        for i in range(N_WEEKS):
-            week = start_week + timedelta(days=7 * i)
-
-            db.add(models.EnvMetric(
-                location_id=loc.id,
-                week_start=week,
-                rainfall_mm=float(rainfall[i]),
-                temperature_c=float(temperature[i]),
-                humidity_pct=float(humidity[i]),
-                flood_risk=float(flood_risk[i]),
-            ))
-            
-            # Populate new LGAWeeklyAggregate instead of CommunitySignal
-            db.add(models.LGAWeeklyAggregate(
-                lga=loc.lga,
-                state=loc.state,
-                week_start_date=week,
-                total_fever_cases=int(fever[i]),
-                total_respiratory_cases=int(respiratory[i]),
-                total_diarrhea_cases=int(diarrhea[i]),
-                # total_vomiting_cases=int(vomiting[i]), # Removed as it's not in the model
-                total_admissions=int(admissions[i]),
-                avg_bed_occupancy=float(bed_occupancy[i]),
-                low_stock_alerts=int(low_stock[i])
-            ))
-            
-            db.add(models.DiseaseHistory(
-                location_id=loc.id,
-                week_start=week,
-                cholera_cases=int(cholera[i]),
-                malaria_cases=int(malaria[i]),
-                lassa_cases=int(lassa[i]),
-                meningitis_cases=int(meningitis[i]),
-            ))
-        db.commit()
-
-    # Run initial prediction for the latest week so the heatmap is populated immediately
-    from app.routers.predictions import get_model, evaluate_alerts
-    from app.ml.model import build_feature_vector, risk_category
-    
-    print("Generating initial predictions...")
-    for loc in db.query(models.Location).all():
-        latest_week_rec = (
-            db.query(models.DiseaseHistory.week_start)
-            .filter(models.DiseaseHistory.location_id == loc.id)
-            .order_by(models.DiseaseHistory.week_start.desc())
-            .first()
-        )
-        base_week = latest_week_rec[0] if latest_week_rec else date.today()
-        features = build_feature_vector(db, loc.id, base_week)
-        
-        for disease in ["cholera", "malaria", "lassa", "meningitis"]:
-            model = get_model(disease, db)
-            result = model.predict_full(features)
-            
-            pred = models.RiskPrediction(
-                state=loc.state,
-                lga=loc.lga,
-                prediction_date=base_week,
-                weeks_ahead=2,
-                risk_score=result["risk_score"],
-                risk_level=result["risk_level"],
-                disease=disease,
-                top_factors=result["top_factors"]
-            )
-            db.add(pred)
-            evaluate_alerts(db, loc.id, disease, base_week, result["risk_score"])
-            
+    synthetic = [
+        fid for (fid,) in db.query(models.FacilityUser.facility_id)
+        .filter(models.FacilityUser.username.like(f"{SYNTHETIC_USER_PREFIX}%"))
+    ]
+    for i in range(0, len(synthetic), 500):
+        ids = synthetic[i:i + 500]
+        db.query(models.ReportSyncKey).filter(models.ReportSyncKey.facility_id.in_(ids)).delete(synchronize_session=False)
+        db.query(models.DailyReport).filter(models.DailyReport.facility_id.in_(ids)).delete(synchronize_session=False)
+        db.query(models.FacilityUser).filter(models.FacilityUser.facility_id.in_(ids)).delete(synchronize_session=False)
+        db.query(models.Facility).filter(models.Facility.id.in_(ids)).delete(synchronize_session=False)
     db.commit()
-    print("Initial predictions generated.")
 
-if __name__ == "__main__":
+def generate_initial_predictions(db: Session):
+    # Score every LGA for the latest week so the heatmap is populated immediately
+    from app.routers.predictions import get_model
+    from app.ml.sweep import run_sweep
+
+    # Cubes are rebuilt from scratch right after seeding
+    stats = run_sweep(db, get_model, alerts=True, refresh_rollups=False)
+    _log(f"Sweep wrote {stats['rows_written']} predictions")
+
+def generate(
+    db: Session,
+    n_lgas: int = 0,
+    facilities_per_lga: int = 0,
+    n_weeks: int = N_WEEKS,
+    report_weeks: int = None,
+    seed: int = 42,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    predict: bool = True,
+):
+    """
+    Seeds a reproducible synthetic dataset. With the defaults this is the
+    small demo dataset behind /data/seed; raise n_lgas / facilities_per_lga /
+    n_weeks for load testing (e.g. 774 LGAs x 10 facilities x 520 weeks).
+    """
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+
+    clear_generated_data(db)
+    locs = seed_locations(db, n_lgas, rng)
+
+    # Weeks start on Sunday so they line up with facility report aggregation
+    start_week = get_week_start(date.today()) - timedelta(weeks=n_weeks)
+    weeks = [start_week + timedelta(weeks=i) for i in range(n_weeks)]
+    series = simulate_weekly(rng, len(locs), n_weeks)
+    _log(f"Simulated {len(locs)} locations x {n_weeks} weeks in {time.perf_counter() - t0:.1f}s")
+
+    if facilities_per_lga > 0:
+        t = time.perf_counter()
+        facility_ids = seed_facilities(db, rng, locs, facilities_per_lga)
+        report_weeks = n_weeks if report_weeks is None else min(report_weeks, n_weeks)
+        offset = n_weeks - report_weeks
+        n_reports = seed_daily_reports(db, rng, facility_ids, weeks[offset:], series, offset, chunk_size)
+        _log(f"Facilities: {facility_ids.size}, daily reports: {n_reports} in {time.perf_counter() - t:.1f}s")
+
+    t = time.perf_counter()
+    n_locs = len(locs)
+    loc_ids = np.repeat([l.id for l in locs], n_weeks)
+    week_col = np.tile(np.array(weeks, dtype=object), n_locs)
+    flat = {k: v.ravel() for k, v in series.items()}
+    now = datetime.utcnow()
+
+    env = pd.DataFrame({
+        "location_id": loc_ids, "week_start": week_col,
+        "rainfall_mm": flat["rainfall"], "temperature_c": flat["temperature"],
+        "humidity_pct": flat["humidity"], "flood_risk": flat["flood_risk"],
+    })
+    dis = pd.DataFrame({
+        "location_id": loc_ids, "week_start": week_col,
+        "cholera_cases": flat["cholera"], "malaria_cases": flat["malaria"],
+        "lassa_cases": flat["lassa"], "meningitis_cases": flat["meningitis"],
+    })
+    # Populate LGAWeeklyAggregate instead of CommunitySignal
+    agg = pd.DataFrame({
+        "id": _uuids(rng, n_locs * n_weeks),
+        "lga": np.repeat([l.lga for l in locs], n_weeks),
+        "state": np.repeat([l.state for l in locs], n_weeks),
+        "week_start_date": week_col,
+        "total_fever_cases": flat["fever"],
+        "total_diarrhea_cases": flat["diarrhea"],
+        "total_respiratory_cases": flat["respiratory"],
+        "total_admissions": flat["admissions"],
+        "avg_bed_occupancy": flat["bed_occupancy"],
+        "low_stock_alerts": flat["low_stock"],
+        "created_at": now,
+    })
+    rows = bulk_insert(db, models.EnvMetric, env, chunk_size)
+    rows += bulk_insert(db, models.DiseaseHistory, dis, chunk_size)
+    rows += bulk_insert(db, models.LGAWeeklyAggregate, agg, chunk_size)
+    _log(f"Weekly tables: {rows} rows in {time.perf_counter() - t:.1f}s")
+    # Bulk inserts bypass the feature store's write hooks
+    from app.ml import feature_store
+    feature_store.invalidate()
+
+    if predict:
+        t = time.perf_counter()
+        _log("Generating initial predictions...")
+        generate_initial_predictions(db)
+        _log(f"Initial predictions generated in {time.perf_counter() - t:.1f}s")
+
+    from app.trends.cubes import rebuild_rollups
+    _log(f"Trend cubes rebuilt: {rebuild_rollups(db)}")
+    # Seeded coordinates and risk reach the map when this runs in the API (/data/seed)
+    from app import spatial
+    spatial.invalidate_index()
+    spatial.invalidate_risk()
+    _log(f"Total: {time.perf_counter() - t0:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed PHIP with reproducible synthetic data")
+    parser.add_argument("--lgas", type=int, default=0, help="Total LGAs to seed (e.g. 774); demo LGAs are always included")
+    parser.add_argument("--facilities", type=int, default=0, help="Synthetic facilities per LGA (0 = no facility data)")
+    parser.add_argument("--weeks", type=int, default=N_WEEKS, help="Weeks of history (520 = 10 years)")
+    parser.add_argument("--report-weeks", type=int, default=None, help="Most recent weeks that get daily facility reports (default: all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--no-predict", action="store_true", help="Skip training and the initial prediction pass")
+    args = parser.parse_args()
+
     db = SessionLocal()
     try:
-        generate(db)
+        generate(
+            db,
+            n_lgas=args.lgas,
+            facilities_per_lga=args.facilities,
+            n_weeks=args.weeks,
+            report_weeks=args.report_weeks,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            predict=not args.no_predict,
+        )
         print("Data generation completed successfully.")
     except Exception as e:
         print(f"Error generating data: {e}")
     finally:
         db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import sys
+import os
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from app.db import Base, engine
+from app import models  # noqa: F401  (registers the tables on Base)
+from app.startup import migrate
+
+def main():
+    """
+    Creates any missing tables. Run before starting the API with
+    PHIP_AUTO_MIGRATE=0 (e.g. as a release/pre-deploy command).
+    """
+    before = set(inspect(engine).get_table_names())
+    migrate()
+    created = sorted(set(Base.metadata.tables) - before)
+    print(f"Created tables: {', '.join(created)}" if created else "Schema up to date")
+
+if __name__ == "__main__":
+    main()
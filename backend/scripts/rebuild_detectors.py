@@ -0,0 +1,34 @@
+import sys
+import os
+import argparse
+from datetime import date
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal, Base, engine
+from app import models
+from app.alerts import detectors
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the online outbreak detector states by replaying stored daily reports")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="Only replay reports from this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        q = (
+            db.query(models.Facility, models.DailyReport)
+            .join(models.DailyReport, models.DailyReport.facility_id == models.Facility.id)
+            .order_by(models.DailyReport.report_date)
+        )
+        if args.since:
+            q = q.filter(models.DailyReport.report_date >= args.since)
+        stats = detectors.rebuild_states(db, q.yield_per(5000))
+    finally:
+        db.close()
+    print(f"Replayed {stats['reports']} reports into {stats['states']} detector states")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import sys
+import os
+import argparse
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.ml import backtest
+from app.ml.model import HORIZONS, MODEL_BACKENDS
+
+DISEASES = ["cholera", "malaria", "lassa", "meningitis"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay history week by week and write per-disease backtest reports")
+    parser.add_argument("--disease", choices=DISEASES, action="append", help="Disease to backtest (repeatable). Defaults to all.")
+    parser.add_argument("--horizon", type=int, choices=HORIZONS, action="append", help="Horizon in weeks (repeatable). Defaults to all.")
+    parser.add_argument("--start", help="First origin week (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last origin week (YYYY-MM-DD)")
+    parser.add_argument("--min-train-weeks", type=int, default=52)
+    parser.add_argument("--retrain-every", type=int, default=4, help="Origins between warm-start refreshes")
+    parser.add_argument("--warm-trees", type=int, default=20, help="Trees added per refresh")
+    parser.add_argument("--threshold", type=float, default=backtest.ALERT_THRESHOLD)
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for disease in args.disease or DISEASES:
+            report = backtest.run_backtest(
+                db, disease, horizons=args.horizon, start=args.start, end=args.end,
+                min_train_weeks=args.min_train_weeks, retrain_every=args.retrain_every,
+                warm_trees=args.warm_trees, threshold=args.threshold, backend=args.backend,
+            )
+            lead = report["lead_time"]
+            print(f"{disease}: {report['origins']['count']} origins in {report['seconds']:.1f}s, "
+                  f"onsets detected {lead.get('detected')}/{lead.get('onsets')}, mean lead {lead.get('mean_lead_weeks')}")
+            for h, stats in sorted(report["horizons"].items()):
+                print(f"  t+{h}: auc {stats['auc']}, false alarm rate {stats['false_alarm_rate']}, alerts {stats['alerts']}/{stats['predictions']}")
+            print(f"  report: {backtest.report_path(disease)}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import sys
+import os
+import argparse
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.ml import sweep
+from app.ml.model import HORIZONS
+from app.routers.predictions import get_model
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every LGA for every disease and horizon and store the predictions (run from cron)")
+    parser.add_argument("--disease", choices=sweep.DISEASES, action="append", help="Disease to score (repeatable). Defaults to all.")
+    parser.add_argument("--horizon", type=int, choices=HORIZONS, action="append", help="Horizon in weeks (repeatable). Defaults to all.")
+    parser.add_argument("--alerts", action="store_true", help="Also run the alert rules on the default horizon")
+    parser.add_argument("--no-rollups", action="store_true", help="Skip refreshing the trend cube cells")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = sweep.run_sweep(
+            db, get_model, diseases=args.disease, horizons=args.horizon,
+            alerts=args.alerts, refresh_rollups=not args.no_rollups,
+        )
+    finally:
+        db.close()
+
+    print(f"features: {stats['feature_seconds']:.2f}s, rollups: {stats['rollup_seconds']:.2f}s")
+    for disease, result in stats["diseases"].items():
+        if "error" in result:
+            print(f"  {disease}: FAILED ({result['error']})")
+        else:
+            print(f"  {disease}: {result['rows']} rows in {result['seconds']:.2f}s")
+    if any("error" in r for r in stats["diseases"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
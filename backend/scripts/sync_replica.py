@@ -0,0 +1,56 @@
+import sys
+import os
+import argparse
+import time
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from app.db import Base, engine, replica_engines
+from app import models  # noqa: F401  (registers the tables on Base)
+
+def copy_database(source, target, chunk_size: int = 10_000) -> int:
+    """
+    Replaces every table in target with the rows in source.
+    """
+    Base.metadata.create_all(bind=target)
+    copied = 0
+    with source.connect() as src, target.begin() as dst:
+        # Children first on delete, parents first on insert, for the foreign keys
+        for table in reversed(Base.metadata.sorted_tables):
+            dst.execute(table.delete())
+        for table in Base.metadata.sorted_tables:
+            result = src.execution_options(stream_results=True).execute(select(table))
+            while True:
+                rows = result.mappings().fetchmany(chunk_size)
+                if not rows:
+                    break
+                dst.execute(insert(table), [dict(r) for r in rows])
+                copied += len(rows)
+    return copied
+
+def main():
+    """
+    Snapshots the primary into each DATABASE_REPLICA_URLS database. This is
+    for trying replica routing locally (two SQLite files or two local
+    Postgres databases). Real replicas are fed by streaming replication.
+    Each snapshot behaves like a replica that lags until the next sync.
+    """
+    parser = argparse.ArgumentParser(description="Copy the primary database into the configured read replicas (local testing)")
+    parser.add_argument("--every", type=float, default=0, help="Repeat every N seconds (simulates replication lag)")
+    args = parser.parse_args()
+    if not replica_engines:
+        sys.exit("Set DATABASE_REPLICA_URLS to the replica database(s) first")
+
+    while True:
+        for replica in replica_engines:
+            started = time.perf_counter()
+            rows = copy_database(engine, replica)
+            print(f"Copied {rows} rows to {replica.url.render_as_string(hide_password=True)} in {time.perf_counter() - started:.1f}s")
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import sys
+import os
+import argparse
+
+# Allow running from the backend directory or inside the container
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.ml import tuning
+from app.ml.model import RiskModel, MODEL_BACKEND, MODEL_BACKENDS, DEFAULT_HORIZON, REGISTRY_PATH, save_tuned_params
+
+DISEASES = ["cholera", "malaria", "lassa", "meningitis"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune risk model hyperparameters and record the winners in the model registry")
+    parser.add_argument("--disease", choices=DISEASES, action="append", help="Disease to tune (repeatable). Defaults to all.")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND)
+    parser.add_argument("--candidates", type=int, default=27, help="Random configurations in the first rung")
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the candidates per rung")
+    parser.add_argument("--min-budget", type=int, default=25, help="Trees per candidate in the first rung")
+    parser.add_argument("--max-budget", type=int, default=400, help="Trees per candidate in the last rung")
+    parser.add_argument("--splits", type=int, default=3, help="TimeSeriesSplit folds")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dry-run", action="store_true", help="Report results without updating the registry")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        loader = RiskModel(DISEASES[0])
+        raw_df = loader._load_training_frame(db)
+    finally:
+        db.close()
+    if raw_df.empty:
+        sys.exit("No training data")
+
+    # Parameters are shared by all horizons; tune on the default horizon's target
+    target = f"target_h{DEFAULT_HORIZON}"
+    for disease in args.disease or DISEASES:
+        model = RiskModel(disease, backend=args.backend)
+        df = model._feature_engineering(raw_df.copy(), loader.neighbours)
+        # Week order, so the TimeSeriesSplit folds run forward in time rather than across LGAs
+        df = df[df[target].notna()].sort_values('week_start', kind='stable')
+        X, y = df[model._feature_columns(df)].values, df[target].values
+        print(f"Tuning {disease}/{args.backend} on {len(X)} rows...", flush=True)
+        result = tuning.tune(
+            X, y, args.backend,
+            n_candidates=args.candidates, n_splits=args.splits, eta=args.eta,
+            min_budget=args.min_budget, max_budget=args.max_budget, n_jobs=args.jobs, seed=args.seed,
+        )
+        print(tuning.format_summary(disease, result))
+        if args.dry_run:
+            continue
+        if result["auc"] <= result["baseline_auc"]:
+            print(f"  {disease}: no improvement over defaults; registry unchanged")
+            continue
+        save_tuned_params(disease, args.backend, result["params"], {
+            "auc": result["auc"], "baseline_auc": result["baseline_auc"], "rows": len(X), "rungs": result["rungs"],
+        })
+        print(f"  written to {REGISTRY_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -16,9 +16,11 @@ export default function AlertCard({ alert }) {
           <div>
             <div className="flex items-center space-x-2">
               <h3 className="font-bold text-lg">{alert.level.toUpperCase()} RISK ALERT</h3>
-              <span className="text-xs bg-gray-100 px-2 py-0.5 rounded text-gray-600">
-                Score: {alert.risk_score.toFixed(2)}
-              </span>
+              {alert.risk_score != null && (
+                <span className="text-xs bg-gray-100 px-2 py-0.5 rounded text-gray-600">
+                  Score: {alert.risk_score.toFixed(2)}
+                </span>
+              )}
             </div>
             <div className="text-gray-600 font-medium mt-1">
               {alert.location?.lga}, {alert.location?.state}
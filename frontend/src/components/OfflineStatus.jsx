@@ -4,6 +4,9 @@ import axios from 'axios';
 import { offlineStorage } from '../utils/offlineStorage';
 import { API_BASE } from '../config';
 
+// Matches the server's limit on reports per /reports/sync request
+const SYNC_BATCH_SIZE = 200;
+
 export default function OfflineStatus() {
   const [isOnline, setIsOnline] = useState(navigator.onLine);
   const [pendingCount, setPendingCount] = useState(0);
@@ -40,22 +43,30 @@ export default function OfflineStatus() {
     setSyncing(true);
     const token = localStorage.getItem('token');
     
-    // Process sequentially
-    for (const report of reports) {
-      try {
-        // Remove offline-specific fields before sending
-        const { id, createdAt, status, ...payload } = report;
-        
-        await axios.post(`${API_BASE}/reports/`, payload, {
+    // Replay the queue in batches the server accepts; it dedupes on clientId
+    const items = reports.map(({ id, clientId, createdAt, status, ...payload }) => ({
+      ...payload,
+      client_id: clientId || `legacy-${id}-${createdAt}`
+    }));
+
+    try {
+      for (let start = 0; start < items.length; start += SYNC_BATCH_SIZE) {
+        const batch = items.slice(start, start + SYNC_BATCH_SIZE);
+        const res = await axios.post(`${API_BASE}/reports/sync`, { reports: batch }, {
           headers: { Authorization: `Bearer ${token}` }
         });
-        
-        // Remove from offline store if successful
-        await offlineStorage.deleteReport(id);
-      } catch (err) {
-        console.error("Sync failed for report:", report, err);
-        // Keep in store to retry later
+
+        // Remove from offline store once the server has acknowledged the item
+        const acked = new Set(res.data.items.map((it) => it.client_id));
+        for (let i = start; i < start + batch.length; i++) {
+          if (acked.has(items[i].client_id)) {
+            await offlineStorage.deleteReport(reports[i].id);
+          }
+        }
       }
+    } catch (err) {
+      console.error("Sync failed for queued reports:", err);
+      // Keep in store to retry later
     }
     
     await checkPending();
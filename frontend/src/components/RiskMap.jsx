@@ -1,8 +1,51 @@
-import { MapContainer, TileLayer, CircleMarker, Popup } from 'react-leaflet';
+import { useEffect, useRef, useState } from 'react';
+import { MapContainer, TileLayer, CircleMarker, Popup, Tooltip, useMapEvents } from 'react-leaflet';
+import axios from 'axios';
 import 'leaflet/dist/leaflet.css';
+import { API_BASE } from '../config';
 
-export default function RiskMap({ items }) {
+const riskColor = (category) =>
+  category === 'High' ? 'red' : category === 'Medium' ? 'orange' : category === 'Low' ? 'green' : 'gray';
+
+// Fetches only the features inside the visible bounds whenever the map settles
+function ViewportLoader({ disease, layer, onLoad }) {
+  const requestId = useRef(0);
+
+  const load = (map) => {
+    const bounds = map.getBounds();
+    const id = ++requestId.current;
+    axios.get(`${API_BASE}/predictions/viewport`, {
+      params: {
+        disease,
+        layer,
+        zoom: map.getZoom(),
+        min_lat: bounds.getSouth(),
+        min_lon: bounds.getWest(),
+        max_lat: bounds.getNorth(),
+        max_lon: bounds.getEast(),
+      },
+    })
+      .then(res => {
+        // Ignore responses for viewports the user already left
+        if (id === requestId.current) onLoad(res.data.features || []);
+      })
+      .catch(err => console.error(err));
+  };
+
+  const map = useMapEvents({
+    moveend: () => load(map),
+  });
+
+  useEffect(() => {
+    load(map);
+  }, [disease, layer]);
+
+  return null;
+}
+
+export default function RiskMap({ disease, layer = 'lga' }) {
   const center = [9.0820, 8.6753]; // Nigeria Center
+  const [features, setFeatures] = useState([]);
 
   return (
     <div className="h-full w-full rounded-lg overflow-hidden border bg-gray-100 relative z-0">
@@ -11,42 +54,65 @@ export default function RiskMap({ items }) {
           attribution='&copy; OpenStreetMap contributors'
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
         />
-        {items.map((it, idx) => {
-          const color = it.risk_category === 'High' ? 'red' : it.risk_category === 'Medium' ? 'orange' : 'green';
-          const lat = it.latitude ?? center[0];
-          const lon = it.longitude ?? center[1];
+        <ViewportLoader disease={disease} layer={layer} onLoad={setFeatures} />
+        {features.map((it) => {
+          const color = riskColor(it.risk_category);
+          const key = `${it.kind}-${it.state}-${it.lga}-${it.name}-${it.latitude}-${it.longitude}`;
+          if (it.kind === 'cluster') {
+            return (
+              <CircleMarker
+                key={key}
+                center={[it.latitude, it.longitude]}
+                radius={12 + Math.min(18, Math.sqrt(it.count) * 3)}
+                pathOptions={{ color, fillColor: color, fillOpacity: 0.5 }}
+              >
+                <Tooltip permanent direction="center" className="bg-transparent border-0 shadow-none font-bold">
+                  {it.count}
+                </Tooltip>
+                <Popup>
+                  <div className="min-w-[180px]">
+                    <div className="font-bold text-base mb-1">{it.count} locations</div>
+                    {it.risk_score != null && (
+                      <div className="text-sm mb-2">
+                        Highest risk: <span className="font-medium">{it.risk_score.toFixed(2)} ({it.risk_category})</span>
+                      </div>
+                    )}
+                    <ul className="text-xs space-y-1">
+                      {Object.entries(it.level_counts || {}).map(([level, n]) => (
+                        <li key={level}>{level}: {n}</li>
+                      ))}
+                    </ul>
+                    <div className="text-xs text-gray-500 mt-2">Zoom in for individual locations</div>
+                  </div>
+                </Popup>
+              </CircleMarker>
+            );
+          }
           return (
             <CircleMarker 
-              key={idx} 
-              center={[lat, lon]} 
-              radius={12} 
+              key={key} 
+              center={[it.latitude, it.longitude]} 
+              radius={it.kind === 'facility' ? 6 : 12} 
               pathOptions={{ color, fillColor: color, fillOpacity: 0.6 }}
             >
               <Popup>
                 <div className="min-w-[200px]">
-                  <div className="font-bold text-base mb-1">{it.lga}, {it.state}</div>
-                  <div className="text-sm text-gray-600 mb-2">Disease: <span className="font-medium">{it.disease}</span></div>
+                  <div className="font-bold text-base mb-1">{it.name ? `${it.name} - ` : ''}{it.lga}, {it.state}</div>
+                  <div className="text-sm text-gray-600 mb-2">Disease: <span className="font-medium">{disease}</span></div>
                   
                   <div className="flex items-center justify-between bg-gray-50 p-2 rounded mb-2">
                     <span className="text-sm">Risk Score:</span>
-                    <span className={`font-bold ${
-                      it.risk_category === 'High' ? 'text-red-600' : 
-                      it.risk_category === 'Medium' ? 'text-yellow-600' : 'text-green-600'
-                    }`}>
-                      {it.risk_score.toFixed(2)} ({it.risk_category})
-                    </span>
+                    {it.risk_score != null ? (
+                      <span className={`font-bold ${
+                        it.risk_category === 'High' ? 'text-red-600' : 
+                        it.risk_category === 'Medium' ? 'text-yellow-600' : 'text-green-600'
+                      }`}>
+                        {it.risk_score.toFixed(2)} ({it.risk_category})
+                      </span>
+                    ) : (
+                      <span className="text-gray-500">Not scored yet</span>
+                    )}
                   </div>
-
-                  {it.top_factors && it.top_factors.length > 0 && (
-                    <div>
-                      <div className="text-xs font-semibold text-gray-500 mb-1">Top Drivers:</div>
-                      <ul className="text-xs list-disc pl-4 space-y-1">
-                        {it.top_factors.map((f, i) => (
-                          <li key={i}>{f}</li>
-                        ))}
-                      </ul>
-                    </div>
-                  )}
                 </div>
               </Popup>
             </CircleMarker>
@@ -1,25 +1,9 @@
-import { useState, useEffect } from 'react';
-import axios from 'axios';
+import { useState } from 'react';
 import RiskMap from '../components/RiskMap';
-import { API_BASE } from '../config';
 
 export default function MapPage() {
-  const [heatmap, setHeatmap] = useState([]);
-  const [loading, setLoading] = useState(true);
   const [disease, setDisease] = useState('cholera');
-
-  useEffect(() => {
-    setLoading(true);
-    axios.get(`${API_BASE}/predictions/heatmap-data?disease=${disease}`)
-      .then(res => {
-        setHeatmap(res.data.items || []);
-        setLoading(false);
-      })
-      .catch(err => {
-        console.error(err);
-        setLoading(false);
-      });
-  }, [disease]);
+  const [layer, setLayer] = useState('lga');
 
   return (
     <div className="flex flex-col h-[calc(100vh-100px)]">
@@ -37,15 +21,20 @@ export default function MapPage() {
             <option value="lassa">Lassa Fever</option>
             <option value="meningitis">Meningitis</option>
           </select>
+          <span className="text-sm text-gray-600">Show:</span>
+          <select 
+            value={layer} 
+            onChange={e => setLayer(e.target.value)} 
+            className="border rounded px-3 py-1 bg-white"
+          >
+            <option value="lga">LGAs</option>
+            <option value="facility">Facilities</option>
+          </select>
         </div>
       </div>
       
       <div className="flex-1 bg-white rounded-lg border shadow-sm p-1">
-        {loading ? (
-          <div className="h-full flex items-center justify-center">Loading map data...</div>
-        ) : (
-          <RiskMap items={heatmap} />
-        )}
+        <RiskMap disease={disease} layer={layer} />
       </div>
     </div>
   );
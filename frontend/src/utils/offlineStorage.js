@@ -14,6 +14,7 @@ export const offlineStorage = {
     const db = await dbPromise;
     return db.add(STORE_NAME, {
       ...report,
+      clientId: crypto.randomUUID(), // Idempotency key for /reports/sync
       createdAt: new Date().toISOString(),
       status: 'pending'
     });